@@ -0,0 +1,82 @@
+"""
+Measures the JWT work done per authenticated request: the router level
+`deps.check_jwt`, the endpoint's scope check and reading the subject.
+
+    $ python -m backend.benchmarks.auth_overhead --requests 20000
+"""
+import argparse
+import time
+
+from fastapi_jwt_auth import AuthJWT
+from starlette.requests import Request
+
+from backend.benchmarks.common import load_bench_jwt_config, report
+from backend.users import auth
+
+
+class UncachedAuthJWTScoped(auth.AuthJWTScoped):
+    """
+    Decodes and verifies the token on every call, as before the cache.
+    """
+
+    def _verified_token(self, encoded_token, issuer=None):
+        return AuthJWT._verified_token(self, encoded_token, issuer)
+
+
+def make_request(token: str) -> Request:
+    headers = [(b"authorization", f"Bearer {token}".encode())]
+    return Request({"type": "http", "headers": headers})
+
+
+def authenticated_request(auth_class, request: Request):
+    Authorize = auth_class(req=request)
+    Authorize.jwt_required()  # deps.check_jwt
+    Authorize.jwt_required("users:me")  # The endpoint's scope check.
+    return Authorize.get_jwt_subject()
+
+
+def measure(auth_class, request: Request, requests: int) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        authenticated_request(auth_class, request)
+    return (time.perf_counter() - start) / requests * 1_000_000
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20_000)
+    args = parser.parse_args()
+
+    load_bench_jwt_config()
+    token = AuthJWT().create_access_token(
+        subject="bench", user_claims={"scopes": ["users:me"]}
+    )
+    request = make_request(token)
+    lru_size = auth.verified_tokens.maxsize
+
+    results = {
+        "uncached_us": measure(UncachedAuthJWTScoped, request, args.requests)
+    }
+
+    auth.verified_tokens.maxsize = 0
+    results["per_request_cache_us"] = measure(
+        auth.AuthJWTScoped, request, args.requests
+    )
+
+    auth.verified_tokens.maxsize = lru_size
+    auth.verified_tokens.clear()
+    results["per_request_and_lru_cache_us"] = measure(
+        auth.AuthJWTScoped, request, args.requests
+    )
+
+    report(
+        "auth_overhead",
+        {
+            "requests": args.requests,
+            **{key: round(value, 2) for key, value in results.items()},
+        },
+    )
+
+
+if __name__ == "__main__":
+    run()
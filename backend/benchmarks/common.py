@@ -0,0 +1,80 @@
+import json
+import statistics
+import sys
+from os import getenv
+from typing import Dict, Iterable, List
+
+from fastapi_jwt_auth import AuthJWT
+from pydantic import BaseModel
+
+
+class BenchJWTSettings(BaseModel):
+    authjwt_secret_key: str = getenv("SECRET_KEY", "bench-secret-key")
+    authjwt_algorithm: str = "HS256"
+    authjwt_access_token_expires: int = 60 * 60
+
+
+def load_bench_jwt_config():
+    AuthJWT.load_config(BenchJWTSettings)
+
+
+def get_bench_engine():
+    """
+    Engine of the scratch database the benchmarks seed. It is wiped on
+    every run, so it must not be the one in DATABASE_URI.
+    """
+    uri = getenv("BENCH_DATABASE_URI")
+    if not uri:
+        sys.exit("Set BENCH_DATABASE_URI to a scratch database to wipe.")
+    if uri == getenv("DATABASE_URI"):
+        sys.exit("BENCH_DATABASE_URI must differ from DATABASE_URI.")
+    from backend.db import create_engine
+
+    return create_engine(uri)
+
+
+async def reset_schema(engine):
+    from backend import dbrel  # noqa: F401, registers every model.
+    from backend.db import Base
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+
+def percentiles(samples: Iterable[float]) -> Dict[str, float]:
+    """
+    Summary of latency samples, in milliseconds.
+    """
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+        "max_ms": round(samples[-1] * 1000, 3),
+    }
+
+
+def plan_nodes(plan: Dict) -> List[str]:
+    """
+    Flattens an EXPLAIN (FORMAT JSON) plan into its node types, ie:
+    ["Limit", "Index Scan on reviews using ix_reviews_..."].
+    """
+    node = plan["Node Type"]
+    if "Index Name" in plan:
+        node = f"{node} using {plan['Index Name']}"
+    elif "Relation Name" in plan:
+        node = f"{node} on {plan['Relation Name']}"
+    nodes = [node]
+    for subplan in plan.get("Plans", []):
+        nodes.extend(plan_nodes(subplan))
+    return nodes
+
+
+def report(name: str, results: Dict):
+    print(json.dumps({"benchmark": name, "results": results}, indent=2))
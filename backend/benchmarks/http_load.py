@@ -0,0 +1,365 @@
+"""
+Load test of the hot endpoints of the API: restaurant list and its first
+page, area search, restaurant detail, review list, review create and
+login. Each scenario runs for a few seconds with concurrent async
+clients, and reports its throughput and latency percentiles as JSON, to
+compare branches.
+
+By default the clients call the app in this process, through ASGI, with
+the seeded bench database in place of DATABASE_URI. Pass --url to load
+a running server instead, started with DATABASE_URI pointing at the
+database the benchmark seeds and the same SECRET_KEY:
+
+    $ export BENCH_DATABASE_URI=postgresql+asyncpg://.../revrest_bench
+    $ python -m backend.benchmarks.http_load --restaurants 2000 \\
+        --concurrency 16 --seconds 10 --output before.json
+    $ python -m backend.benchmarks.http_load --url http://localhost:8000
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+from hashlib import md5
+from typing import Callable, Dict, List
+from uuid import UUID
+
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+from backend.benchmarks.common import (
+    get_bench_engine,
+    load_bench_jwt_config,
+    percentiles,
+    report,
+    reset_schema,
+)
+from backend.config import get_settings
+from backend.db import get_db, request_transaction
+from backend.main import app
+from backend.reviews.crud import rebuild_review_stats
+from backend.users import auth
+
+
+PASSWORD = "secret"
+
+
+def uuid4_sql(key: str) -> str:
+    """
+    SQL expression of the md5 hash of the key made a version 4 UUID, as
+    the API and its models validate them. `Dataset.restaurant_id`
+    computes the same ones in Python.
+    """
+    return (
+        "overlay(overlay(md5(%s) placing '4' from 13) placing '8' from 17)"
+        "::uuid" % key
+    )
+
+
+IDS = {
+    "scope_id": uuid4_sql("name"),
+    "user_id": uuid4_sql("'user' || i"),
+    "me_scope_id": uuid4_sql("'users:me'"),
+    "restaurant_id": uuid4_sql("'restaurant' || i"),
+    "review_id": uuid4_sql("'review' || i || '-' || j"),
+    "reviewer_id": uuid4_sql("'user' || (i + j) % :users"),
+}
+
+SEED_SQL = [
+    """
+    INSERT INTO security_scopes (id, name, description)
+    SELECT {scope_id}, name, description
+    FROM json_each_text(CAST(:scopes AS json)) AS s(name, description)
+    """,
+    """
+    INSERT INTO users (id, username, hashed_password, disabled)
+    SELECT {user_id}, 'user' || i, :hashed_password, false
+    FROM generate_series(0, :users - 1) AS i
+    """,
+    """
+    INSERT INTO user_security_scopes (user_id, security_scope_id)
+    SELECT {user_id}, {me_scope_id}
+    FROM generate_series(0, :users - 1) AS i
+    """,
+    """
+    INSERT INTO restaurants (
+        id, name, description, country, postal_code, address, webpage,
+        phone_number, disabled, avg_rating, created_at
+    )
+    SELECT
+        {restaurant_id},
+        'Restaurant ' || i,
+        'Tasty food.',
+        'DE',
+        (10000 + i % :areas)::text,
+        'Street ' || i,
+        'https://restaurant-' || i || '.de/',
+        '089 ' || i,
+        false,
+        0,
+        now() - i * interval '1 minute'
+    FROM generate_series(0, :restaurants - 1) AS i
+    """,
+    """
+    INSERT INTO reviews (id, restaurant_id, user_id, created_at, review,
+                         rating)
+    SELECT
+        {review_id},
+        {restaurant_id},
+        {reviewer_id},
+        now() - (i + j) * interval '1 minute',
+        'Review ' || j || ' of restaurant ' || i,
+        1 + (i * 7 + j * 3) % 5
+    FROM generate_series(0, :restaurants - 1) AS i,
+         generate_series(0, :reviews - 1) AS j
+    """,
+]
+
+
+class Dataset:
+    def __init__(self, args):
+        self.restaurants = args.restaurants
+        self.areas = args.areas
+        self.users = args.users
+
+    def restaurant_id(self, rng: random.Random) -> str:
+        i = rng.randrange(self.restaurants)
+        digest = md5(b"restaurant%d" % i).hexdigest()
+        return str(UUID(digest[:12] + "4" + digest[13:16] + "8" + digest[17:]))
+
+    def postcode(self, rng: random.Random) -> str:
+        return str(10000 + rng.randrange(min(self.areas, self.restaurants)))
+
+    def username(self, rng: random.Random) -> str:
+        return "user%d" % rng.randrange(self.users)
+
+
+async def seed(engine, args):
+    await reset_schema(engine)
+    params = {
+        "scopes": json.dumps(get_settings().security_scopes),
+        "hashed_password": auth.get_password_hash(PASSWORD),
+        "users": args.users,
+        "restaurants": args.restaurants,
+        "areas": args.areas,
+        "reviews": args.reviews,
+    }
+    async with engine.begin() as conn:
+        for sql in SEED_SQL:
+            await conn.execute(text(sql.format(**IDS)), params)
+    bench_session = sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+    async with bench_session() as session:
+        # Also sets the avg_rating of the restaurants.
+        await rebuild_review_stats(session)
+    async with engine.begin() as conn:
+        await conn.execute(text("ANALYZE"))
+    return bench_session
+
+
+# Scenarios: requests built from the dataset and a random generator,
+# with the status they are expected to answer.
+
+
+def restaurant_list(data: Dataset, rng: random.Random):
+    offset = rng.randrange(0, min(data.restaurants, 1000), 10)
+    url = "/api/v1/restaurants?offset=%d&limit=10" % offset
+    return "GET", url, None, 200
+
+
+def top_restaurants(data: Dataset, rng: random.Random):
+    return "GET", "/api/v1/restaurants?limit=10", None, 200
+
+
+def area_search(data: Dataset, rng: random.Random):
+    url = "/api/v1/restaurants/DE/%s?limit=10" % data.postcode(rng)
+    return "GET", url, None, 200
+
+
+def restaurant_detail(data: Dataset, rng: random.Random):
+    url = "/api/v1/restaurant/%s" % data.restaurant_id(rng)
+    return "GET", url, None, 200
+
+
+def review_list(data: Dataset, rng: random.Random):
+    url = "/api/v1/reviews/%s?limit=10" % data.restaurant_id(rng)
+    return "GET", url, None, 200
+
+
+def review_create(data: Dataset, rng: random.Random):
+    url = "/api/v1/review/%s" % data.restaurant_id(rng)
+    body = {"review": "Benchmark review.", "rating": rng.randint(1, 5)}
+    return "POST", url, body, 201
+
+
+def login(data: Dataset, rng: random.Random):
+    body = {"username": data.username(rng), "password": PASSWORD}
+    return "POST", "/api/v1/login", body, 200
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "restaurant_list": restaurant_list,
+    "top_restaurants": top_restaurants,
+    "area_search": area_search,
+    "restaurant_detail": restaurant_detail,
+    "review_list": review_list,
+    "review_create": review_create,
+    "login": login,
+}
+
+
+async def client_loop(
+    client: AsyncClient,
+    scenario: Callable,
+    data: Dataset,
+    rng: random.Random,
+    deadline: float,
+    samples: List[float],
+    errors: Dict[str, int],
+):
+    while time.perf_counter() < deadline:
+        method, url, body, expected = scenario(data, rng)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, json=body)
+        except Exception as exc:
+            key = type(exc).__name__
+        else:
+            if response.status_code == expected:
+                samples.append(time.perf_counter() - start)
+                continue
+            key = str(response.status_code)
+        errors[key] = errors.get(key, 0) + 1
+
+
+async def run_scenario(client, name: str, data: Dataset, args) -> Dict:
+    scenario = SCENARIOS[name]
+    if args.warmup:
+        deadline = time.perf_counter() + args.warmup
+        await asyncio.gather(
+            *(
+                client_loop(
+                    client,
+                    scenario,
+                    data,
+                    random.Random(args.seed - i - 1),
+                    deadline,
+                    [],
+                    {},
+                )
+                for i in range(args.concurrency)
+            )
+        )
+
+    samples: List[float] = []
+    errors: Dict[str, int] = {}
+    start = time.perf_counter()
+    deadline = start + args.seconds
+    await asyncio.gather(
+        *(
+            client_loop(
+                client,
+                scenario,
+                data,
+                random.Random(args.seed + i),
+                deadline,
+                samples,
+                errors,
+            )
+            for i in range(args.concurrency)
+        )
+    )
+    elapsed = time.perf_counter() - start
+    return {
+        "throughput_rps": round(len(samples) / elapsed, 1),
+        "errors": errors,
+        **percentiles(samples),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+async def main(args):
+    engine = get_bench_engine()
+    bench_session = await seed(engine, args)
+
+    if args.url:
+        client = AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        # Sessions as `db.get_db` makes them, on the bench database.
+        async def get_bench_db(request: Request):
+            async with bench_session() as session:
+                async with request_transaction(session, request):
+                    yield session
+
+        app.dependency_overrides[get_db] = get_bench_db
+        load_bench_jwt_config()
+        client = AsyncClient(
+            app=app, base_url="http://bench", timeout=args.timeout
+        )
+
+    data = Dataset(args)
+    results = {}
+    async with client:
+        response = await client.post(
+            "/api/v1/login", json={"username": "user0", "password": PASSWORD}
+        )
+        response.raise_for_status()
+        token = response.json()["access_token"]
+        client.headers["Authorization"] = "Bearer %s" % token
+        for name in args.scenarios:
+            results[name] = await run_scenario(client, name, data, args)
+
+    auth.password_hasher.shutdown()
+    await engine.dispose()
+    params = {
+        key: value for key, value in vars(args).items() if key != "output"
+    }
+    output = {"params": params, "revision": git_revision(), **results}
+    report("http_load", output)
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump({"benchmark": "http_load", "results": output}, fp)
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="Server to load (default: in process).")
+    parser.add_argument("--restaurants", type=int, default=2000)
+    parser.add_argument("--areas", type=int, default=100)
+    parser.add_argument(
+        "--reviews", type=int, default=20, help="Reviews per restaurant."
+    )
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=list(SCENARIOS),
+        default=list(SCENARIOS),
+    )
+    parser.add_argument("--output", help="Also write the JSON to this file.")
+    asyncio.run(main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    run()
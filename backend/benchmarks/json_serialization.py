@@ -0,0 +1,112 @@
+"""
+Compares the CPU time of a restaurant list page, query plus JSON, when
+served from ORM objects through `jsonable_encoder` and when served from
+row mappings encoded with orjson (Settings.fast_json_responses).
+
+    $ export BENCH_DATABASE_URI=postgresql+asyncpg://.../revrest_bench
+    $ python -m backend.benchmarks.json_serialization --limit 100
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from backend.benchmarks.common import get_bench_engine, report, reset_schema
+from backend.pagination import CountMode
+from backend.responses import FastJSONResponse
+from backend.restaurants import crud
+
+
+SEED_SQL = """
+    INSERT INTO restaurants (
+        id, name, description, country, postal_code, address, webpage,
+        phone_number, disabled, avg_rating, created_at
+    )
+    SELECT
+        md5('restaurant' || i)::uuid,
+        'Restaurant ' || i,
+        repeat('Tasty food. ', 10),
+        'DE',
+        (80000 + i % 1000)::text,
+        'Street ' || i,
+        'https://restaurant-' || i || '.de/',
+        '089 ' || i,
+        false,
+        round((1 + random() * 4)::numeric, 1),
+        now() - i * interval '1 minute'
+    FROM generate_series(1, :restaurants) AS i
+"""
+
+
+async def orm_page(db: AsyncSession, limit: int) -> bytes:
+    items, total = await crud.list_restaurants(
+        db, 0, limit, count=CountMode.exact
+    )
+    content = {"data": items, "count": total}
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+async def fast_page(db: AsyncSession, limit: int) -> bytes:
+    items, total = await crud.list_restaurants(
+        db, 0, limit, count=CountMode.exact, as_mappings=True
+    )
+    return FastJSONResponse({"data": items, "count": total}).body
+
+
+async def measure(session_factory, page, limit: int, requests: int):
+    cpu = wall = 0.0
+    for _ in range(requests):
+        async with session_factory() as db:
+            cpu_start, wall_start = time.process_time(), time.perf_counter()
+            body = await page(db, limit)
+            cpu += time.process_time() - cpu_start
+            wall += time.perf_counter() - wall_start
+    return {
+        "cpu_ms_per_request": round(cpu / requests * 1000, 3),
+        "wall_ms_per_request": round(wall / requests * 1000, 3),
+        "bytes": len(body),
+    }
+
+
+async def main(args):
+    engine = get_bench_engine()
+    await reset_schema(engine)
+    async with engine.begin() as conn:
+        await conn.execute(text(SEED_SQL), {"restaurants": args.restaurants})
+        await conn.execute(text("ANALYZE restaurants"))
+
+    session_factory = sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+    results = {"params": vars(args)}
+    for page in (orm_page, fast_page):
+        await measure(session_factory, page, args.limit, 20)  # Warm up.
+        results[page.__name__] = await measure(
+            session_factory, page, args.limit, args.requests
+        )
+    await engine.dispose()
+
+    results["cpu_saved"] = "%.0f%%" % (
+        100
+        - results["fast_page"]["cpu_ms_per_request"]
+        / results["orm_page"]["cpu_ms_per_request"]
+        * 100
+    )
+    report("json_serialization", results)
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--restaurants", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=500)
+    asyncio.run(main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,142 @@
+"""
+Measures the latency of a read endpoint while a storm of logins runs in
+the same worker, with bcrypt inline in the event loop and in the thread
+and process pools of `auth.PasswordHasher`.
+
+    $ export BENCH_DATABASE_URI=postgresql+asyncpg://.../revrest_bench
+    $ python -m backend.benchmarks.login_storm --logins 32 --seconds 5
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi_jwt_auth import AuthJWT
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from backend.benchmarks.common import (
+    get_bench_engine,
+    load_bench_jwt_config,
+    percentiles,
+    report,
+    reset_schema,
+)
+from backend.db import get_db
+from backend.main import app
+from backend.users import auth
+
+
+SEED_SQL = [
+    """
+    INSERT INTO users (id, username, hashed_password, disabled)
+    SELECT md5('user' || i)::uuid, 'user' || i, :hashed_password, false
+    FROM generate_series(0, :users - 1) AS i
+    """,
+    """
+    INSERT INTO restaurants (id, name, country, postal_code, avg_rating)
+    SELECT md5('restaurant' || i)::uuid, 'Restaurant ' || i, 'DE',
+           '82211', (i % 50) / 10.0
+    FROM generate_series(0, 99) AS i
+    """,
+]
+
+
+async def storm(client: AsyncClient, users: int, stop: asyncio.Event):
+    logins = 0
+    while not stop.is_set():
+        body = {"username": f"user{logins % users}", "password": "secret"}
+        response = await client.post("/api/v1/login", json=body)
+        assert response.status_code == 200, response.text
+        logins += 1
+    return logins
+
+
+async def probe(client: AsyncClient, headers, seconds: float, interval: float):
+    samples = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get(
+            "/api/v1/restaurants?limit=10", headers=headers
+        )
+        assert response.status_code == 200, response.text
+        samples.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+    return samples
+
+
+async def measure(client, headers, args, executor: str, logins: int):
+    auth.password_hasher.shutdown()
+    auth.password_hasher = auth.PasswordHasher(
+        executor, args.workers, args.max_pending
+    )
+    stop = asyncio.Event()
+    stormers = [
+        asyncio.create_task(storm(client, args.users, stop))
+        for _ in range(logins)
+    ]
+    samples = await probe(client, headers, args.seconds, args.interval)
+    stop.set()
+    login_count = sum(await asyncio.gather(*stormers))
+    return {
+        "read_latency": percentiles(samples),
+        "logins_per_s": round(login_count / args.seconds, 1),
+    }
+
+
+async def main(args):
+    engine = get_bench_engine()
+    await reset_schema(engine)
+    params = {
+        "users": args.users,
+        "hashed_password": auth.get_password_hash("secret"),
+    }
+    async with engine.begin() as conn:
+        for sql in SEED_SQL:
+            await conn.execute(text(sql), params)
+
+    bench_session = sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    async def get_bench_db():
+        async with bench_session() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = get_bench_db
+    load_bench_jwt_config()
+    headers = {
+        "Authorization": "Bearer %s"
+        % AuthJWT().create_access_token(
+            subject="user0", user_claims={"scopes": ["users:me"]}
+        )
+    }
+
+    results = {}
+    async with AsyncClient(app=app, base_url="http://bench") as client:
+        results["idle"] = await measure(client, headers, args, "inline", 0)
+        for executor in ("inline", "thread", "process"):
+            results[executor] = await measure(
+                client, headers, args, executor, args.logins
+            )
+
+    auth.password_hasher.shutdown()
+    await engine.dispose()
+    report("login_storm", {"params": vars(args), **results})
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--interval", type=float, default=0.01)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-pending", type=int, default=32)
+    asyncio.run(main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    run()
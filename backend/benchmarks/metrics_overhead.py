@@ -0,0 +1,89 @@
+"""
+Measures what `metrics.MetricsMiddleware` adds to a request, calling a
+trivial ASGI app with and without it, and the time to render `/metrics`
+once every route has series.
+
+    $ python -m backend.benchmarks.metrics_overhead --requests 100000
+"""
+import argparse
+import asyncio
+import time
+
+from backend import metrics
+from backend.benchmarks.common import report
+from backend.cache import MemoryCache
+from backend.db import create_engine
+from backend.main import app as main_app
+from backend.users.auth import password_hasher
+
+
+def make_scope(route) -> dict:
+    return {
+        "type": "http",
+        "method": "GET",
+        "path": route.path,
+        "app": main_app,
+        "endpoint": route.endpoint,
+    }
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def endpoint(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def measure(app, scopes, requests: int) -> float:
+    start = time.perf_counter()
+    for i in range(requests):
+        await app(scopes[i % len(scopes)], receive, send)
+    return (time.perf_counter() - start) / requests * 1_000_000
+
+
+async def main(requests: int):
+    routes = [
+        route for route in main_app.router.routes if hasattr(route, "methods")
+    ]
+    scopes = [make_scope(route) for route in routes]
+    request_metrics = metrics.RequestMetrics()
+    instrumented = metrics.MetricsMiddleware(endpoint, request_metrics)
+
+    # Warm up the route lookups and the series.
+    await measure(instrumented, scopes, len(scopes))
+    bare_us = await measure(endpoint, scopes, requests)
+    instrumented_us = await measure(instrumented, scopes, requests)
+
+    # The engine doesn't connect, its pool is only read.
+    engine = create_engine("postgresql+asyncpg://bench@localhost/bench")
+    caches = [MemoryCache("bench", 1 << 20)]
+    start = time.perf_counter()
+    body = metrics.render(engine, caches, password_hasher, request_metrics)
+    render_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "requests": requests,
+        "routes": len(routes),
+        "bare_us": round(bare_us, 3),
+        "instrumented_us": round(instrumented_us, 3),
+        "overhead_us": round(instrumented_us - bare_us, 3),
+        "render_ms": round(render_ms, 3),
+        "render_bytes": len(body),
+    }
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=100_000)
+    args = parser.parse_args()
+    report("metrics_overhead", asyncio.run(main(args.requests)))
+
+
+if __name__ == "__main__":
+    run()
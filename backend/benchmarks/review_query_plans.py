@@ -0,0 +1,142 @@
+"""
+Shows the query plans of the review access paths on a table with
+millions of reviews, without and with the review indexes.
+
+    $ export BENCH_DATABASE_URI=postgresql+asyncpg://.../revrest_bench
+    $ python -m backend.benchmarks.review_query_plans --reviews 2000000
+"""
+import argparse
+import asyncio
+import json
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg
+from sqlalchemy.future import select
+
+from backend.benchmarks.common import (
+    get_bench_engine,
+    plan_nodes,
+    report,
+    reset_schema,
+)
+from backend.pagination import explain
+from backend.reviews.dbrel import Review
+
+
+SEED_SQL = [
+    """
+    INSERT INTO users (id, username, hashed_password, disabled)
+    SELECT md5('user' || i)::uuid, 'user' || i, '', false
+    FROM generate_series(0, :users - 1) AS i
+    """,
+    """
+    INSERT INTO restaurants (id, name, country, postal_code, avg_rating)
+    SELECT md5('restaurant' || i)::uuid, 'Restaurant ' || i, 'DE',
+           (80000 + i % 100)::text, 0
+    FROM generate_series(0, :restaurants - 1) AS i
+    """,
+    """
+    INSERT INTO reviews (id, restaurant_id, user_id, created_at, review,
+                         rating)
+    SELECT md5('review' || i)::uuid,
+           md5('restaurant' || (i % :restaurants))::uuid,
+           md5('user' || (i % :users))::uuid,
+           now() - i * interval '1 second',
+           'Benchmark review',
+           1 + (i::bigint * 7919) % 5
+    FROM generate_series(0, :reviews - 1) AS i
+    """,
+    "ANALYZE",
+]
+
+
+def access_paths(restaurant_id):
+    """
+    The statements of reviews.crud, with the same filters and order.
+    """
+    newest_first = (Review.created_at.desc(), Review.id.desc())
+    by_restaurant = select(Review).where(Review.restaurant_id == restaurant_id)
+    return {
+        "list_reviews": by_restaurant.order_by(*newest_first).limit(10),
+        "list_reviews_by_rating": by_restaurant.where(Review.rating == 4)
+        .order_by(*newest_first)
+        .limit(10),
+        "get_best_review": by_restaurant.order_by(
+            Review.rating.desc(), Review.created_at.desc()
+        ).limit(1),
+        "get_worst_review": by_restaurant.order_by(
+            Review.rating, Review.created_at.desc()
+        ).limit(1),
+        "get_last_review": by_restaurant.order_by(
+            Review.created_at.desc()
+        ).limit(1),
+        "rebuild_review_stats": select(
+            Review.restaurant_id,
+            func.count(Review.id),
+            array_agg(
+                aggregate_order_by(
+                    Review.id, Review.rating.desc(), Review.created_at.desc()
+                )
+            )[1],
+        )
+        .where(Review.restaurant_id == restaurant_id)
+        .group_by(Review.restaurant_id),
+    }
+
+
+async def explain_paths(conn, restaurant_id):
+    results = {}
+    for name, stmt in access_paths(restaurant_id).items():
+        result = await conn.execute(explain(stmt, analyze=True))
+        plan = result.scalar_one()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        results[name] = {
+            "nodes": plan_nodes(plan[0]["Plan"]),
+            "execution_ms": plan[0]["Execution Time"],
+        }
+    return results
+
+
+async def main(args):
+    engine = get_bench_engine()
+    await reset_schema(engine)
+    params = {
+        "users": args.users,
+        "restaurants": args.restaurants,
+        "reviews": args.reviews,
+    }
+    async with engine.begin() as conn:
+        for sql in SEED_SQL:
+            await conn.execute(text(sql), params)
+        restaurant_id = (
+            await conn.execute(text("SELECT md5('restaurant0')::uuid"))
+        ).scalar_one()
+
+    indexes = list(Review.__table__.indexes)
+    results = {}
+    async with engine.begin() as conn:
+        for index in indexes:
+            await conn.run_sync(index.drop)
+        await conn.execute(text("ANALYZE reviews"))
+        results["without_indexes"] = await explain_paths(conn, restaurant_id)
+
+        for index in indexes:
+            await conn.run_sync(index.create)
+        await conn.execute(text("ANALYZE reviews"))
+        results["with_indexes"] = await explain_paths(conn, restaurant_id)
+
+    await engine.dispose()
+    report("review_query_plans", {"params": params, **results})
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--reviews", type=int, default=2_000_000)
+    parser.add_argument("--restaurants", type=int, default=1_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    asyncio.run(main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    run()
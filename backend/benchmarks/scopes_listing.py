@@ -0,0 +1,125 @@
+"""
+Lists the security scopes with 100k users associated to them, loading
+the users of each scope as `get_security_scopes` used to, and the lean
+way it does now, with and without user counts.
+
+    $ export BENCH_DATABASE_URI=postgresql+asyncpg://.../revrest_bench
+    $ python -m backend.benchmarks.scopes_listing --users 100000
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload, sessionmaker
+
+from backend.benchmarks.common import get_bench_engine, report, reset_schema
+from backend.users import crud, dbrel
+
+
+SEED_SQL = [
+    """
+    INSERT INTO security_scopes (id, name, description)
+    VALUES (md5('users:me')::uuid, 'users:me', ''),
+           (md5('users:read')::uuid, 'users:read', ''),
+           (md5('users:write')::uuid, 'users:write', '')
+    """,
+    """
+    INSERT INTO users (id, username, hashed_password, disabled)
+    SELECT md5('user' || i)::uuid, 'user' || i, '', false
+    FROM generate_series(0, :users - 1) AS i
+    """,
+    """
+    INSERT INTO user_security_scopes (user_id, security_scope_id)
+    SELECT md5('user' || i)::uuid, md5('users:me')::uuid
+    FROM generate_series(0, :users - 1) AS i
+    UNION ALL
+    SELECT md5('user' || i)::uuid, md5('users:read')::uuid
+    FROM generate_series(0, :users - 1, 100) AS i
+    """,
+    "ANALYZE",
+]
+
+
+async def eager_scopes(db: AsyncSession):
+    """
+    The loading `get_security_scopes` did before: every user of every
+    scope, and the scopes of each of those users.
+    """
+    async with db.begin():
+        result = await db.execute(
+            select(dbrel.SecurityScope).options(
+                selectinload(dbrel.SecurityScope.users).selectinload(
+                    dbrel.User.scopes
+                )
+            )
+        )
+        return result.scalars().all()
+
+
+async def lean_scopes(db: AsyncSession):
+    return await crud.get_security_scopes(db)
+
+
+async def lean_scopes_with_user_count(db: AsyncSession):
+    return await crud.get_security_scopes(db, with_user_count=True)
+
+
+async def measure(session_factory, statements, list_scopes, repeat: int):
+    timings = []
+    loaded = 0
+    statements.clear()
+    for _ in range(repeat):
+        async with session_factory() as db:
+            start = time.perf_counter()
+            await list_scopes(db)
+            timings.append(time.perf_counter() - start)
+            loaded = len(db.identity_map)
+    return {
+        "best_ms": round(min(timings) * 1000, 3),
+        "statements": len(statements) // repeat,
+        "loaded_objects": loaded,
+    }
+
+
+async def main(args):
+    engine = get_bench_engine()
+    await reset_schema(engine)
+    async with engine.begin() as conn:
+        for sql in SEED_SQL:
+            await conn.execute(text(sql), {"users": args.users})
+
+    statements = []
+    event.listen(
+        engine.sync_engine,
+        "before_cursor_execute",
+        lambda *args: statements.append(args[2]),
+    )
+    session_factory = sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+    results = {}
+    for list_scopes in (
+        eager_scopes,
+        lean_scopes,
+        lean_scopes_with_user_count,
+    ):
+        results[list_scopes.__name__] = await measure(
+            session_factory, statements, list_scopes, args.repeat
+        )
+
+    await engine.dispose()
+    report("scopes_listing", {"params": vars(args), **results})
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,355 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from itertools import count
+from typing import Any, Dict, Optional
+
+from backend.config import get_settings
+
+
+LOGGER = logging.getLogger()
+
+# Keys whose generation a MemoryCache keeps, and seconds a RedisCache
+# keeps it, longer than any fill takes.
+MAX_GENERATIONS = 100_000
+GENERATION_TTL = 3600
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(vars(self))
+
+
+class ResponseCache:
+    """
+    Cache of serialized responses. Backends implement `_get`, `_set` and
+    `_delete`, the counters of hits and misses are kept here, per
+    process. A backend that fails counts as a miss, the response is then
+    served from the database.
+
+    Entries expire after `ttl` seconds (0 never expires), that bounds how
+    long a response read while a write was committing can be served
+    after the write invalidated it.
+
+    With `reinvalidate_after`, invalidated keys are deleted again after
+    that many seconds, in case a read replica that had not replayed the
+    write yet filled them meanwhile.
+
+    Each invalidation also changes the `generation` of the key, that
+    fills read before their query, so that `set` drops a value read
+    before a write that invalidated the key meanwhile. Backends
+    implement `_generation`, `_bump_generation` and
+    `_bump_all_generation` for it.
+    """
+
+    def __init__(self, namespace: str, ttl: int = 0):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.reinvalidate_after = 0.0
+        self.stats = CacheStats()
+
+    def _key(self, key: str) -> str:
+        return "%s:%s" % (self.namespace, key)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        try:
+            value = await self._get(self._key(key))
+        except Exception:
+            LOGGER.exception("Failed to read '%s' from the cache", key)
+            self.stats.errors += 1
+            value = None
+        if value is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return value
+
+    async def generation(self, key: str) -> Any:
+        """
+        Generation of the key, to read before the query that fills it
+        takes its snapshot of the database, and pass to `set`.
+        """
+        try:
+            return await self._generation(key)
+        except Exception:
+            LOGGER.exception("Failed to read the generation of '%s'", key)
+            self.stats.errors += 1
+            return object()  # Matches no generation, the fill is dropped.
+
+    async def set(
+        self, key: str, value: bytes, generation: Any = None
+    ) -> None:
+        try:
+            await self._set(self._key(key), value)
+            # Checked after the value is set, as the invalidations bump
+            # the generation before they delete the key.
+            if (
+                generation is not None
+                and await self._generation(key) != generation
+            ):
+                await self._delete(self._key(key))
+        except Exception:
+            LOGGER.exception("Failed to write '%s' to the cache", key)
+            self.stats.errors += 1
+
+    async def invalidate(self, key: str) -> None:
+        self.stats.invalidations += 1
+        await self._invalidate(key)
+        if self.reinvalidate_after:
+            loop = asyncio.get_running_loop()
+            loop.call_later(
+                self.reinvalidate_after,
+                lambda: loop.create_task(self._invalidate(key)),
+            )
+
+    async def _invalidate(self, key: str) -> None:
+        try:
+            await self._bump_generation(key)
+            await self._delete(self._key(key))
+        except Exception:
+            LOGGER.exception("Failed to invalidate '%s' in the cache", key)
+            self.stats.errors += 1
+
+    async def invalidate_all(self) -> None:
+        """Invalidates every key of the namespace, after bulk writes."""
+        self.stats.invalidations += 1
+        await self._invalidate_all()
+        if self.reinvalidate_after:
+            loop = asyncio.get_running_loop()
+            loop.call_later(
+                self.reinvalidate_after,
+                lambda: loop.create_task(self._invalidate_all()),
+            )
+
+    async def _invalidate_all(self) -> None:
+        try:
+            await self._bump_all_generation()
+            await self._delete_all()
+        except Exception:
+            LOGGER.exception("Failed to invalidate '%s'", self.namespace)
+            self.stats.errors += 1
+
+    def info(self) -> Dict[str, int]:
+        return self.stats.as_dict()
+
+    async def _get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def _set(self, key: str, value: bytes) -> None:
+        raise NotImplementedError
+
+    async def _delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def _delete_all(self) -> None:
+        raise NotImplementedError
+
+    async def _generation(self, key: str) -> Any:
+        raise NotImplementedError
+
+    async def _bump_generation(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def _bump_all_generation(self) -> None:
+        raise NotImplementedError
+
+
+class MemoryCache(ResponseCache):
+    """
+    In-process LRU cache holding at most `max_bytes` of keys and values.
+    Each worker process has its own, so use it with a single worker.
+    """
+
+    def __init__(self, namespace: str, max_bytes: int, ttl: int = 0):
+        super().__init__(namespace, ttl)
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict = OrderedDict()
+        # Generations are unique numbers, never reused.
+        self._counter = count(1)
+        self._all_generation = 0
+        self._generations: Dict[str, int] = {}
+
+    def info(self) -> Dict[str, int]:
+        return {
+            **super().info(),
+            "entries": len(self._entries),
+            "bytes": self.size,
+        }
+
+    async def _get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires and expires < time.monotonic():
+            self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def _set(self, key: str, value: bytes) -> None:
+        self._pop(key)
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else 0
+        self._entries[key] = (value, expires)
+        self.size += size
+        while self.size > self.max_bytes:
+            self._pop(next(iter(self._entries)))
+            self.stats.evictions += 1
+
+    async def _delete(self, key: str) -> None:
+        self._pop(key)
+
+    async def _delete_all(self) -> None:
+        self.clear()
+
+    async def _generation(self, key: str) -> Any:
+        return (self._all_generation, self._generations.get(key, 0))
+
+    async def _bump_generation(self, key: str) -> None:
+        if len(self._generations) >= MAX_GENERATIONS:
+            # Forgetting them changes every generation, as this does.
+            self._generations.clear()
+            self._all_generation = next(self._counter)
+        self._generations[key] = next(self._counter)
+
+    async def _bump_all_generation(self) -> None:
+        self._all_generation = next(self._counter)
+
+    def _pop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(key) + len(entry[0])
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+
+class RedisCache(ResponseCache):
+    """
+    Cache shared by all the workers in a Redis compatible server, through
+    a client with the async API of `redis.asyncio.Redis`. The memory
+    budget and the LRU eviction are those of the server (`maxmemory`
+    and `maxmemory-policy allkeys-lru`).
+    """
+
+    def __init__(self, namespace: str, client, ttl: int = 0):
+        super().__init__(namespace, ttl)
+        self.client = client
+
+    @classmethod
+    def from_url(cls, namespace: str, url: str, ttl: int = 0):
+        try:
+            from redis import asyncio as aioredis
+        except ImportError:
+            raise RuntimeError(
+                "The redis cache backend requires the 'redis' package."
+            )
+        return cls(namespace, aioredis.from_url(url), ttl)
+
+    async def _get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def _set(self, key: str, value: bytes) -> None:
+        await self.client.set(key, value, ex=self.ttl or None)
+
+    async def _delete(self, key: str) -> None:
+        await self.client.delete(key)
+
+    def _generation_key(self, name: str) -> str:
+        # Out of the namespace's keys, that `_delete_all` deletes.
+        return "%s#%s" % (self.namespace, name)
+
+    async def _generation(self, key: str) -> Any:
+        return tuple(
+            await self.client.mget(
+                self._generation_key("all"),
+                self._generation_key("key:" + key),
+            )
+        )
+
+    async def _bump_generation(self, key: str) -> None:
+        generation = await self.client.incr(self._generation_key("counter"))
+        # Expired, the generation changes too, to None.
+        await self.client.set(
+            self._generation_key("key:" + key),
+            generation,
+            ex=GENERATION_TTL,
+        )
+
+    async def _bump_all_generation(self) -> None:
+        generation = await self.client.incr(self._generation_key("counter"))
+        await self.client.set(self._generation_key("all"), generation)
+
+    async def _delete_all(self) -> None:
+        keys = []
+        async for key in self.client.scan_iter(match=self._key("*")):
+            keys.append(key)
+            if len(keys) == 1000:
+                await self.client.delete(*keys)
+                keys = []
+        if keys:
+            await self.client.delete(*keys)
+
+
+class NullCache(ResponseCache):
+    """Disables the cache: every lookup is a miss."""
+
+    async def _get(self, key: str) -> Optional[bytes]:
+        return None
+
+    async def _set(self, key: str, value: bytes) -> None:
+        pass
+
+    async def _delete(self, key: str) -> None:
+        pass
+
+    async def _delete_all(self) -> None:
+        pass
+
+    async def _generation(self, key: str) -> Any:
+        return None
+
+    async def _bump_generation(self, key: str) -> None:
+        pass
+
+    async def _bump_all_generation(self) -> None:
+        pass
+
+
+def make_cache(namespace: str) -> ResponseCache:
+    """
+    Returns the response cache for the namespace, with the backend set in
+    `Settings.response_cache_backend`.
+    """
+    settings = get_settings()
+    backend = settings.response_cache_backend
+    ttl = settings.response_cache_ttl
+    if backend == "memory":
+        cache = MemoryCache(namespace, settings.response_cache_max_bytes, ttl)
+    elif backend == "redis":
+        url = settings.response_cache_url
+        cache = RedisCache.from_url(namespace, url, ttl)
+    elif backend == "none":
+        cache = NullCache(namespace)
+    else:
+        raise ValueError("Unknown response cache backend '%s'" % backend)
+    if settings.db_replica_uris:
+        # Replicas lag at most max_lag, plus the time until the next check
+        # finds out they lag more.
+        cache.reinvalidate_after = (
+            settings.db_replica_max_lag + settings.db_replica_check_interval
+        )
+    return cache
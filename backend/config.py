@@ -1,6 +1,6 @@
 from functools import lru_cache
 from os import getenv
-from typing import Dict
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, BaseSettings
 
@@ -20,12 +20,63 @@ class JWTAuthSettings(BaseModel):
 
 class Settings(BaseSettings):
     app_name: str = "Review Restaurants"
+    # Connection pool of the database engine, see `db.create_engine`. The
+    # recycle time is in seconds (-1 never recycles). The prepared
+    # statement cache is per connection, 0 disables it (ie: pgbouncer).
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = -1
+    db_pool_pre_ping: bool = False
+    db_prepared_statement_cache_size: int = 100
+    # Serve GET requests in one read only transaction, see `db.get_db`.
+    db_unit_of_work: bool = True
+    # Read replicas that serve the GET requests, see `db.ReplicaSet`, ie:
+    # DB_REPLICA_URIS='["postgresql+asyncpg://...", ...]'. A write pins
+    # the client to the primary for pin_seconds, with a cookie. Replicas
+    # lagging more than max_lag seconds, or failing, are skipped for
+    # retry_seconds.
+    db_replica_uris: List[str] = []
+    db_replica_pin_seconds: float = 5
+    db_replica_max_lag: float = 5
+    db_replica_retry_seconds: float = 30
+    db_replica_check_interval: float = 5
+    # Count the statements of each request and their time, report them in
+    # a Server-Timing header and log the requests over budget. The time
+    # budget is of the whole request, in milliseconds.
+    sql_timing: bool = False
+    sql_timing_max_statements: int = 20
+    sql_timing_max_ms: float = 500
+    # Count the requests per route and their latency, see `/metrics`.
+    request_metrics: bool = True
     jwt_auth_setting = JWTAuthSettings()
     security_scopes: Dict[str, str] = {
         "users:me": "Read data about the currently logged in user.",
         "users:read": "Read data about users.",
         "users:write": "Create, update and delete users.",
+        "metrics:read": "Read the metrics of the service.",
     }
+    # Number of verified JWTs whose claims are kept in memory (0 disables).
+    jwt_cache_size: int = 1024
+    # Where bcrypt runs: "thread" or "process" pool, or "inline" to run it
+    # in the event loop. Hashes beyond max_pending wait for a free slot.
+    password_hash_executor: str = "thread"
+    password_hash_workers: int = 4
+    password_hash_max_pending: int = 32
+    # Cache of the restaurant detail responses: "memory" (per process, at
+    # most max_bytes), "redis" (shared, at response_cache_url) or "none".
+    response_cache_backend: str = "memory"
+    response_cache_max_bytes: int = 32 * 1024 * 1024
+    response_cache_ttl: int = 300
+    response_cache_url: Optional[str] = None
+    # Best restaurants kept in memory per listing, the global one and
+    # those of the last max_areas areas, to serve their first pages
+    # without querying the database (0 disables).
+    leaderboard_size: int = 100
+    leaderboard_max_areas: int = 256
+    # Lists select plain columns and encode them with orjson, skipping the
+    # ORM objects and `jsonable_encoder`.
+    fast_json_responses: bool = False
 
 
 @lru_cache()
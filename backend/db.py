@@ -1,11 +1,197 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import AsyncExitStack, asynccontextmanager
+from contextvars import ContextVar
 from os import getenv
+from typing import Dict, List, Optional
 
+from sqlalchemy import event, exc, text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.requests import Request
 
+from backend.config import get_settings
 
-engine = create_async_engine(getenv("DATABASE_URI"))
+
+LOGGER = logging.getLogger()
+
+
+class PoolStats:
+    """
+    Time requests wait to check out a connection from the pool, opening
+    it when none is idle. Together with the pool's checked out and
+    overflow counts, it tells a starved pool (long waits, every
+    connection checked out) apart from slow queries (short waits).
+    """
+
+    # Upper bounds, in seconds, of the wait time histogram buckets.
+    buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.wait_buckets = [0] * (len(self.buckets) + 1)
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            self.wait_buckets[bisect_left(self.buckets, seconds)] += 1
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Queue pool of the async engine that records how long each checkout
+    waited for a connection, in `stats`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record_wait(time.perf_counter() - start, True)
+            raise
+        self.stats.record_wait(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class QueryStats:
+    """
+    Statements a request executed and the time it spent in them. Round
+    trips count the statements plus the BEGIN, COMMIT and ROLLBACK of
+    each transaction, that go to the server on their own.
+    """
+
+    def __init__(self):
+        self.statements = 0
+        self.round_trips = 0
+        self.db_seconds = 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            "statements": self.statements,
+            "round_trips": self.round_trips,
+            "db_ms": round(self.db_seconds * 1000, 3),
+        }
+
+
+# Stats of the request being served, set by `main.SQLTimingMiddleware`.
+query_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    "query_stats", default=None
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, params, context, many):
+    if query_stats.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, params, context, many):
+    _statement_done(conn)
+
+
+def _handle_error(context):
+    # Failed statements don't fire after_cursor_execute.
+    if context.connection is not None:
+        _statement_done(context.connection)
+
+
+def _statement_done(conn):
+    stats = query_stats.get()
+    if stats is None or not conn.info.get("query_start"):
+        return
+    stats.statements += 1
+    stats.round_trips += 1
+    stats.db_seconds += time.perf_counter() - conn.info["query_start"].pop()
+
+
+def _transaction_control(conn):
+    stats = query_stats.get()
+    if stats is not None:
+        stats.round_trips += 1
+
+
+def instrument_engine(engine):
+    """
+    Counts the statements of the engine in the `query_stats` of the
+    current request, if any. The events fire from the greenlet that runs
+    the sync engine, which gets a copy of the context of the task.
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+    for name in ("begin", "commit", "rollback"):
+        event.listen(sync_engine, name, _transaction_control)
+    return engine
+
+
+def create_engine(uri: Optional[str] = None):
+    """
+    Async engine with the pool configured in the `Settings.db_*` fields,
+    instrumented with `instrument_engine`.
+    """
+    settings = get_settings()
+    engine = create_async_engine(
+        uri or getenv("DATABASE_URI"),
+        poolclass=InstrumentedPool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        connect_args={
+            "prepared_statement_cache_size": (
+                settings.db_prepared_statement_cache_size
+            ),
+        },
+    )
+    return instrument_engine(engine)
+
+
+def pool_status(engine) -> Dict:
+    pool = engine.sync_engine.pool
+    stats = pool.stats
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool._max_overflow,
+        "checkouts": stats.checkouts,
+        "timeouts": stats.timeouts,
+        "wait_seconds_total": round(stats.wait_seconds_total, 6),
+        "wait_seconds_max": round(stats.wait_seconds_max, 6),
+        "wait_buckets": dict(
+            zip([*map(str, stats.buckets), "+Inf"], stats.wait_buckets)
+        ),
+    }
+
+
+engine = create_engine()
 
 async_session = sessionmaker(
     engine,
@@ -18,7 +204,253 @@ async_session = sessionmaker(
 Base = declarative_base()
 
 
-async def get_db():
-    async with async_session() as session:
-        yield session
-        await session.close()
+# Seconds the replica is behind the primary, 0 when it has replayed all
+# the WAL it received (an idle primary sends none) or is no standby, and
+# NULL when it receives none: its WAL receiver is down, so the WAL it
+# replayed may be far behind.
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (SELECT FROM pg_stat_wal_receiver) THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+# Cookie that pins a client to the primary, until the Unix time it holds.
+PIN_COOKIE = "db_primary_until"
+
+
+class Replica:
+    def __init__(self, engine):
+        self.engine = engine
+        self.down_until = 0.0
+        self.lag: Optional[float] = None
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def status(self) -> Dict:
+        return {
+            "url": self.engine.url.render_as_string(hide_password=True),
+            "available": self.available,
+            "lag_seconds": self.lag,
+            "pool": pool_status(self.engine),
+        }
+
+
+class ReplicaSet:
+    """
+    Read replicas of the database, set in `Settings.db_replica_uris`.
+    `get_db` serves GET and HEAD requests from them, in turns, and the
+    rest from the primary.
+
+    A write pins its client to the primary for `pin_seconds`, so that the
+    user reads their own writes, with a cookie that any worker reads
+    (see `main.ReplicaPinMiddleware`). Clients that don't keep cookies
+    may read from a replica that has not replayed their write yet.
+
+    A replica that fails to connect, lags more than `max_lag` seconds
+    behind the primary, or doesn't receive its WAL, is skipped for
+    `retry_seconds`. With no replica available the reads go to the
+    primary.
+    """
+
+    def __init__(
+        self,
+        engines: List,
+        pin_seconds: float = 5,
+        max_lag: float = 5,
+        retry_seconds: float = 30,
+    ):
+        self.replicas = [Replica(engine) for engine in engines]
+        self.pin_seconds = pin_seconds
+        self.max_lag = max_lag
+        self.retry_seconds = retry_seconds
+        self._next = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.replicas)
+
+    def choose(self) -> Optional[Replica]:
+        count = len(self.replicas)
+        for i in range(count):
+            replica = self.replicas[(self._next + i) % count]
+            if replica.available:
+                self._next = (self._next + i + 1) % count
+                return replica
+        return None
+
+    def mark_down(self, replica: Replica, reason: str):
+        if replica.available:
+            LOGGER.warning(
+                "Replica %s is down for %ss: %s",
+                replica.engine.url.render_as_string(hide_password=True),
+                self.retry_seconds,
+                reason,
+            )
+        replica.down_until = time.monotonic() + self.retry_seconds
+
+    def pin_cookie(self) -> str:
+        """`Set-Cookie` header of the response to a write."""
+        until = time.time() + self.pin_seconds
+        return "%s=%.3f; Max-Age=%d; Path=/; HttpOnly; SameSite=Lax" % (
+            PIN_COOKIE,
+            until,
+            math.ceil(self.pin_seconds),
+        )
+
+    def pinned(self, request: Request) -> bool:
+        try:
+            until = float(request.cookies.get(PIN_COOKIE, 0))
+        except ValueError:
+            return False
+        # Clients can only pin themselves for as long as a write does.
+        now = time.time()
+        return now < until <= now + self.pin_seconds
+
+    def route(self, request: Request) -> Optional[Replica]:
+        """
+        Replica to serve the request from, or None for the primary.
+        """
+        if not self.replicas or request.method not in READ_ONLY_METHODS:
+            return None
+        if self.pinned(request):
+            return None
+        return self.choose()
+
+    async def check(self):
+        """
+        Marks down the replicas that fail to connect or lag behind, and
+        back up the ones that recovered.
+        """
+        for replica in self.replicas:
+            try:
+                async with replica.engine.connect() as conn:
+                    lag = (await conn.execute(text(REPLICA_LAG_SQL))).scalar()
+            except Exception as error:
+                replica.lag = None
+                self.mark_down(replica, str(error).splitlines()[0])
+                continue
+            if lag is None:
+                replica.lag = None
+                self.mark_down(replica, "not receiving WAL")
+                continue
+            replica.lag = float(lag)
+            if replica.lag > self.max_lag:
+                self.mark_down(replica, "%.1fs behind" % replica.lag)
+            else:
+                replica.down_until = 0.0
+
+    async def monitor(self, interval: float):
+        while True:
+            try:
+                await self.check()
+            except Exception:
+                LOGGER.exception("Failed to check the replicas")
+            await asyncio.sleep(interval)
+
+
+def create_replica_set() -> ReplicaSet:
+    settings = get_settings()
+    return ReplicaSet(
+        [create_engine(uri) for uri in settings.db_replica_uris],
+        settings.db_replica_pin_seconds,
+        settings.db_replica_max_lag,
+        settings.db_replica_retry_seconds,
+    )
+
+
+replica_set = create_replica_set()
+
+
+# Requests served in a read only unit of work.
+READ_ONLY_METHODS = ("GET", "HEAD")
+
+
+@asynccontextmanager
+async def transaction(db: AsyncSession):
+    """
+    Transaction of a CRUD function. It joins the unit of work of the
+    request when there is one, or else begins and commits its own.
+    """
+    if db.info.get("unit_of_work"):
+        yield
+    else:
+        async with db.begin():
+            yield
+
+
+@asynccontextmanager
+async def request_transaction(db: AsyncSession, request: Request):
+    """
+    Unit of work of a request, if `Settings.db_unit_of_work` is set.
+    GET and HEAD requests run in a single read only, repeatable read
+    transaction, so their CRUD calls share one BEGIN/COMMIT pair and see
+    the same snapshot of the database.
+
+    Other requests get no unit of work: their CRUD functions commit on
+    their own, before the response is sent. Dependencies with yield end
+    after the response is sent, too late to commit a write.
+    """
+    read_only = request.method in READ_ONLY_METHODS
+    if not (read_only and get_settings().db_unit_of_work):
+        yield
+        return
+    db.info["unit_of_work"] = True
+    try:
+        async with db.begin():
+            await db.connection(
+                execution_options={
+                    "isolation_level": "REPEATABLE READ",
+                    "postgresql_readonly": True,
+                }
+            )
+            yield
+    finally:
+        db.info.pop("unit_of_work", None)
+
+
+async def enter_request_session(
+    stack: AsyncExitStack, request: Request
+) -> AsyncSession:
+    """
+    Enters the session of the request and its unit of work, on the
+    replica that `replica_set` routes it to, if any is available, or
+    else on the primary. A replica that fails to begin the unit of work
+    is marked down, and the request goes to the next one.
+    """
+    while True:
+        replica = replica_set.route(request)
+        if replica is None:
+            session = await stack.enter_async_context(async_session())
+            await stack.enter_async_context(
+                request_transaction(session, request)
+            )
+            return session
+        session = async_session(bind=replica.engine)
+        session.info["replica"] = replica
+        try:
+            async with AsyncExitStack() as attempt:
+                await attempt.enter_async_context(session)
+                await attempt.enter_async_context(
+                    request_transaction(session, request)
+                )
+                stack.push_async_exit(attempt.pop_all())
+                return session
+        except Exception as error:
+            # The driver's errors to connect are not wrapped in DBAPIError.
+            replica_set.mark_down(replica, str(error).splitlines()[0])
+
+
+async def get_db(request: Request):
+    async with AsyncExitStack() as stack:
+        session = await enter_request_session(stack, request)
+        try:
+            yield session
+        except exc.DBAPIError as error:
+            replica = session.info.get("replica")
+            if replica is not None and error.connection_invalidated:
+                replica_set.mark_down(replica, str(error).splitlines()[0])
+            raise
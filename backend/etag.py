@@ -0,0 +1,35 @@
+import hashlib
+from typing import Any, Optional
+
+from fastapi.responses import Response
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Weak ETag of a response identified by the version markers in `parts`.
+    """
+    digest = hashlib.md5("|".join(map(str, parts)).encode()).hexdigest()
+    return 'W/"%s"' % digest
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether the If-None-Match header holds the ETag, using the weak
+    comparison that RFC 7232 prescribes for If-None-Match.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == opaque:
+            return True
+    return False
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
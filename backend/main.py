@@ -1,15 +1,24 @@
+import asyncio
 import logging
+import time
 from os import getenv
 
 from fastapi import Depends, FastAPI, HTTPException, Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi_jwt_auth.exceptions import AuthJWTException
+from starlette.datastructures import MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
 
-from backend import deps
+from backend import db, deps, metrics
+from backend.config import get_settings
 from backend.restaurants import restaurants_router
+from backend.restaurants.cache import detail_cache
 from backend.reviews import reviews_router
-from backend.users import users_router
+from backend.users import auth, users_router
+from backend.users.registry import scope_registry
+
+
+LOGGER = logging.getLogger()
 
 
 tags_metadata = [
@@ -35,6 +44,96 @@ tags_metadata = [
 ]
 
 
+class SQLTimingMiddleware:
+    """
+    Counts the statements each request executes, with `db.query_stats`,
+    and sends the totals in a `Server-Timing` header:
+
+        Server-Timing: db;dur=4.1;desc="3 statements, 5 round trips",
+                       app;dur=9.7
+
+    The header goes out with the response, so it misses the statements
+    run after it, like the COMMIT of the unit of work of a GET request.
+    The log line of a request over budget has them all.
+    """
+
+    def __init__(self, app, max_statements: int, max_ms: float):
+        self.app = app
+        self.max_statements = max_statements
+        self.max_ms = max_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = db.QueryStats()
+        token = db.query_stats.set(stats)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = (time.perf_counter() - start) * 1000
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    'db;dur=%.1f;desc="%d statements, %d round trips", '
+                    "app;dur=%.1f"
+                    % (
+                        stats.db_seconds * 1000,
+                        stats.statements,
+                        stats.round_trips,
+                        elapsed,
+                    ),
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            db.query_stats.reset(token)
+            elapsed = (time.perf_counter() - start) * 1000
+            if stats.statements > self.max_statements or elapsed > self.max_ms:
+                LOGGER.warning(
+                    "%s %s over budget: %d statements, %d round trips, "
+                    "%.1fms in the database, %.1fms in total",
+                    scope["method"],
+                    scope["path"],
+                    stats.statements,
+                    stats.round_trips,
+                    stats.db_seconds * 1000,
+                    elapsed,
+                )
+
+
+class ReplicaPinMiddleware:
+    """
+    Pins the clients that write to the primary database, with the cookie
+    of `db.ReplicaSet.pin_cookie`, so that they read their own writes.
+    It's set as the response starts, that is after the write committed.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] in db.READ_ONLY_METHODS + ("OPTIONS",)
+            or not db.replica_set
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_pin(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Set-Cookie", db.replica_set.pin_cookie())
+            await send(message)
+
+        await self.app(scope, receive, send_with_pin)
+
+
 app = FastAPI(
     title="Review Restaurants API Service",
     version="0.1.0",
@@ -54,6 +153,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+settings = get_settings()
+if settings.sql_timing:
+    app.add_middleware(
+        SQLTimingMiddleware,
+        max_statements=settings.sql_timing_max_statements,
+        max_ms=settings.sql_timing_max_ms,
+    )
+if settings.request_metrics:
+    app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(ReplicaPinMiddleware)
+
 
 @app.on_event("startup")
 def configure_logging():
@@ -66,6 +176,38 @@ def configure_logging():
     )
 
 
+@app.on_event("startup")
+async def load_security_scopes():
+    try:
+        async with db.async_session() as session:
+            async with session.begin():
+                await scope_registry.load(session)
+    except Exception:
+        # The first user write loads them instead.
+        LOGGER.exception("Failed to load the security scopes")
+
+
+@app.on_event("startup")
+async def monitor_replicas():
+    if db.replica_set:
+        interval = get_settings().db_replica_check_interval
+        app.state.replica_monitor = asyncio.create_task(
+            db.replica_set.monitor(interval)
+        )
+
+
+@app.on_event("shutdown")
+def stop_replica_monitor():
+    monitor = getattr(app.state, "replica_monitor", None)
+    if monitor is not None:
+        monitor.cancel()
+
+
+@app.on_event("shutdown")
+def shutdown_password_hasher():
+    auth.password_hasher.shutdown()
+
+
 @app.exception_handler(AuthJWTException)
 def authjwt_exception_handler(request: Request, exc: AuthJWTException):
     return JSONResponse(
@@ -85,6 +227,54 @@ def main():
     return {"status": "ok"}
 
 
+@app.get(
+    "/api/v1/cache/stats",
+    summary="Counters of the response caches.",
+    description='Requires security scope "metrics:read".',
+)
+def cache_stats(
+    Authorize: auth.AuthJWTScoped = Depends(),
+    _token: str = Depends(auth.oauth2_access_scheme),
+):
+    Authorize.jwt_required("metrics:read")
+    return {detail_cache.namespace: detail_cache.info()}
+
+
+@app.get(
+    "/api/v1/db/pool",
+    summary="Connection pool usage and checkout wait times.",
+    description='Requires security scope "metrics:read".',
+)
+def db_pool_status(
+    Authorize: auth.AuthJWTScoped = Depends(),
+    _token: str = Depends(auth.oauth2_access_scheme),
+):
+    Authorize.jwt_required("metrics:read")
+    status = db.pool_status(db.engine)
+    if db.replica_set:
+        status["replicas"] = [
+            replica.status() for replica in db.replica_set.replicas
+        ]
+    return status
+
+
+@app.get(
+    "/metrics",
+    summary="Metrics in the Prometheus text format.",
+    description='Requires security scope "metrics:read".',
+    response_class=Response,
+)
+async def get_metrics(
+    Authorize: auth.AuthJWTScoped = Depends(),
+    _token: str = Depends(auth.oauth2_access_scheme),
+):
+    Authorize.jwt_required("metrics:read")
+    return Response(
+        metrics.render(db.engine, [detail_cache], auth.password_hasher),
+        media_type=metrics.CONTENT_TYPE,
+    )
+
+
 # --------------------------------------
 # Catch all get requests intended to hit
 # the API but without endpoint defined.
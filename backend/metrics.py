@@ -0,0 +1,278 @@
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from backend.cache import MemoryCache, ResponseCache
+from backend.db import PoolStats, pool_status
+from backend.users.auth import PasswordHasher
+
+
+# Prometheus text exposition format, served by `main.metrics`.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """
+    Counts of observations per bucket, plus their sum. The counts are
+    per bucket, `_histogram` makes them cumulative as Prometheus expects.
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class RequestMetrics:
+    """
+    Counters of the HTTP requests, updated by `MetricsMiddleware`. They
+    are only touched from the event loop, so they need no lock, and a
+    request costs two clock reads and a few dict lookups.
+
+    Requests are labelled with the path of their route, not the path of
+    the URL, to keep the number of series bounded.
+    """
+
+    # Upper bounds, in seconds, of the latency histogram buckets.
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self.in_flight = 0
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self._routes: Dict = {}
+
+    def route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._routes.get(endpoint)
+        if path is None:
+            for route in scope["app"].router.routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    path = route.path
+                    break
+            else:
+                path = "unmatched"
+            self._routes[endpoint] = path
+        return path
+
+    def observe(self, method: str, route: str, status: int, seconds: float):
+        key = (method, route, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        histogram = self.latency.get((method, route))
+        if histogram is None:
+            histogram = self.latency[(method, route)] = Histogram(
+                self.buckets
+            )
+        histogram.observe(seconds)
+
+    def clear(self):
+        self.in_flight = 0
+        self.requests.clear()
+        self.latency.clear()
+
+
+request_metrics = RequestMetrics()
+
+
+class MetricsMiddleware:
+    """
+    Records the count, status and latency of each request, and the number
+    of requests in flight, in `request_metrics`.
+    """
+
+    def __init__(self, app, metrics: RequestMetrics = request_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.metrics.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.in_flight -= 1
+            # The router adds the endpoint to the scope of the request.
+            self.metrics.observe(
+                scope["method"],
+                self.metrics.route(scope),
+                status,
+                time.perf_counter() - start,
+            )
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ""
+    pairs = (
+        '%s="%s"'
+        % (
+            name,
+            str(value)
+            .replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n"),
+        )
+        for name, value in labels.items()
+    )
+    return "{%s}" % ",".join(pairs)
+
+
+def _metric(lines: List[str], name: str, kind: str, help: str):
+    lines.append("# HELP %s %s" % (name, help))
+    lines.append("# TYPE %s %s" % (name, kind))
+
+
+def _histogram(
+    lines: List[str],
+    name: str,
+    buckets: Sequence[float],
+    counts: Sequence[int],
+    total: float,
+    **labels,
+):
+    cumulative = 0
+    for bound, count in zip([*map(str, buckets), "+Inf"], counts):
+        cumulative += count
+        lines.append(
+            "%s_bucket%s %d" % (name, _labels(**labels, le=bound), cumulative)
+        )
+    lines.append("%s_sum%s %s" % (name, _labels(**labels), repr(total)))
+    lines.append("%s_count%s %d" % (name, _labels(**labels), cumulative))
+
+
+def render_requests(lines: List[str], metrics: RequestMetrics):
+    _metric(
+        lines, "http_requests_in_flight", "gauge", "Requests being served."
+    )
+    lines.append("http_requests_in_flight %d" % metrics.in_flight)
+    _metric(lines, "http_requests_total", "counter", "Requests served.")
+    for (method, route, status), count in sorted(metrics.requests.items()):
+        lines.append(
+            "http_requests_total%s %d"
+            % (_labels(method=method, route=route, status=status), count)
+        )
+    _metric(
+        lines,
+        "http_request_duration_seconds",
+        "histogram",
+        "Time to serve a request.",
+    )
+    for (method, route), histogram in sorted(metrics.latency.items()):
+        _histogram(
+            lines,
+            "http_request_duration_seconds",
+            histogram.buckets,
+            histogram.counts,
+            histogram.sum,
+            method=method,
+            route=route,
+        )
+
+
+def render_pool(lines: List[str], status: Dict, stats: PoolStats):
+    for key, kind, help in (
+        ("size", "gauge", "Connections the pool keeps open."),
+        ("checked_out", "gauge", "Connections in use."),
+        ("checked_in", "gauge", "Idle connections in the pool."),
+        ("overflow", "gauge", "Connections open beyond the pool size."),
+        ("checkouts", "counter", "Connections checked out of the pool."),
+        ("timeouts", "counter", "Checkouts that timed out."),
+    ):
+        name = "db_pool_%s%s" % (key, "_total" if kind == "counter" else "")
+        _metric(lines, name, kind, help)
+        lines.append("%s %d" % (name, status[key]))
+    _metric(
+        lines,
+        "db_pool_wait_seconds",
+        "histogram",
+        "Time waited to check out a connection.",
+    )
+    _histogram(
+        lines,
+        "db_pool_wait_seconds",
+        stats.buckets,
+        stats.wait_buckets,
+        stats.wait_seconds_total,
+    )
+
+
+def render_caches(lines: List[str], caches: Iterable[ResponseCache]):
+    caches = list(caches)
+    for key, help in (
+        ("hits", "Lookups served from the cache."),
+        ("misses", "Lookups not found in the cache."),
+        ("invalidations", "Entries invalidated by writes."),
+        ("evictions", "Entries evicted to stay within the size."),
+        ("errors", "Failed operations of the cache backend."),
+    ):
+        name = "response_cache_%s_total" % key
+        _metric(lines, name, "counter", help)
+        for cache in caches:
+            count = getattr(cache.stats, key)
+            lines.append(
+                "%s%s %d" % (name, _labels(cache=cache.namespace), count)
+            )
+    _metric(
+        lines,
+        "response_cache_hit_ratio",
+        "gauge",
+        "Hits over lookups since the process started.",
+    )
+    for cache in caches:
+        lookups = cache.stats.hits + cache.stats.misses
+        ratio = cache.stats.hits / lookups if lookups else 0.0
+        lines.append(
+            "response_cache_hit_ratio%s %s"
+            % (_labels(cache=cache.namespace), repr(round(ratio, 6)))
+        )
+    _metric(lines, "response_cache_bytes", "gauge", "Size of the entries.")
+    for cache in caches:
+        if isinstance(cache, MemoryCache):
+            lines.append(
+                "response_cache_bytes%s %d"
+                % (_labels(cache=cache.namespace), cache.size)
+            )
+
+
+def render_password_hasher(lines: List[str], hasher: PasswordHasher):
+    for key, help in (
+        ("waiting", "Hashes queued for a slot of the executor."),
+        ("running", "Hashes submitted to the executor."),
+        ("max_pending", "Hashes the executor takes at once."),
+    ):
+        name = "password_hash_%s" % key
+        _metric(lines, name, "gauge", help)
+        lines.append("%s %d" % (name, getattr(hasher, key)))
+
+
+def render(
+    engine,
+    caches: Iterable[ResponseCache],
+    hasher: PasswordHasher,
+    metrics: RequestMetrics = request_metrics,
+) -> str:
+    lines: List[str] = []
+    render_requests(lines, metrics)
+    render_pool(lines, pool_status(engine), engine.sync_engine.pool.stats)
+    render_caches(lines, caches)
+    render_password_hasher(lines, hasher)
+    lines.append("")
+    return "\n".join(lines)
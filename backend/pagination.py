@@ -0,0 +1,155 @@
+import base64
+import binascii
+import json
+from enum import Enum
+from typing import Any, Callable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.future import select
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+
+class InvalidCursorException(Exception):
+    pass
+
+
+class CountMode(str, Enum):
+    exact = "exact"
+    estimate = "estimate"
+    none = "none"
+
+
+class explain(Executable, ClauseElement):
+    """
+    EXPLAIN (FORMAT JSON) of a select, compiled by the same compiler
+    so that bind parameters are processed as in the statement itself.
+    With `analyze` the statement is executed and the plan has timings.
+    """
+
+    inherit_cache = False
+
+    def __init__(self, statement, analyze: bool = False):
+        self.statement = statement
+        self.analyze = analyze
+
+
+@compiles(explain, "postgresql")
+def _compile_explain(element, compiler, **kwargs):
+    options = "ANALYZE, FORMAT JSON" if element.analyze else "FORMAT JSON"
+    statement = compiler.process(element.statement, **kwargs)
+    return f"EXPLAIN ({options}) {statement}"
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Turns the sort key of the last row of a page into an opaque,
+    URL safe cursor string that clients send back to get the next page.
+    """
+    raw = json.dumps([str(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: Callable[[str], Any]) -> List[Any]:
+    """
+    Reverts `encode_cursor`, converting each value of the sort key with
+    the corresponding callable in `types` (ie: Decimal, UUID).
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(cursor + padding)
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("Unexpected number of values.")
+        return [to_type(value) for to_type, value in zip(types, values)]
+    except (
+        binascii.Error,
+        UnicodeDecodeError,
+        ValueError,
+        TypeError,
+        ArithmeticError,
+    ):
+        raise InvalidCursorException("Invalid cursor '%s'." % cursor)
+
+
+async def count_rows(db: AsyncSession, stmt) -> int:
+    result = await db.execute(
+        select(func.count()).select_from(stmt.order_by(None).subquery())
+    )
+    return result.scalar_one()
+
+
+async def estimate_rows(db: AsyncSession, stmt) -> int:
+    """
+    Returns the number of rows the query planner expects `stmt` to
+    return. Cheap, but only as accurate as the table statistics.
+    """
+    result = await db.execute(explain(stmt.order_by(None)))
+    plan = result.scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def _page_items(result, rows: List, as_mappings: bool) -> List:
+    """
+    The items in the rows of a page, leaving out the total count column.
+    """
+    if not as_mappings:
+        return [row[0] for row in rows]
+    # The total count is the last column, zip() leaves it out.
+    keys = [key for key in result.keys() if key != "total_count"]
+    return [dict(zip(keys, row)) for row in rows]
+
+
+async def fetch_page(
+    db: AsyncSession,
+    stmt,
+    order_by: Tuple = (),
+    offset: int = 0,
+    limit: int = 10,
+    after=None,
+    count: CountMode = CountMode.exact,
+    as_mappings: bool = False,
+) -> Tuple[List, Optional[int]]:
+    """
+    Runs `stmt`, a select of a single entity with its filters applied,
+    and returns a page of items along with the total number of rows
+    matching the filters, according to `count`:
+
+     * exact: the total is computed with `count(*) OVER ()` in the
+       same query as the page. Keyset pages (those with the `after`
+       condition) and pages past the end need a separate count.
+     * estimate: the total is the planner estimate (see estimate_rows).
+     * none: the total is not computed and None is returned instead.
+
+    With `as_mappings`, `stmt` selects columns instead, and the items are
+    dicts of them by name.
+
+    Must be called within a transaction.
+    """
+    page = stmt.order_by(*order_by).limit(limit)
+    if after is not None:
+        page = page.where(after)
+    else:
+        page = page.offset(offset)
+
+    if count == CountMode.exact and after is None:
+        result = await db.execute(
+            page.add_columns(func.count().over().label("total_count"))
+        )
+        rows = result.unique().all()
+        if rows:
+            return _page_items(result, rows, as_mappings), rows[0][-1]
+        if not offset:
+            return [], 0
+        return [], await count_rows(db, stmt)
+
+    result = await db.execute(page)
+    items = _page_items(result, result.unique().all(), as_mappings)
+    if count == CountMode.exact:
+        return items, await count_rows(db, stmt)
+    if count == CountMode.estimate:
+        return items, await estimate_rows(db, stmt)
+    return items, None
@@ -1,14 +1,27 @@
 import logging
-from typing import Optional
+from decimal import Decimal
+from typing import List, Optional
+from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
 from pydantic import UUID4
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.config import get_settings
 from backend.db import get_db
+from backend.etag import etag_matches, make_etag, not_modified
+from backend.pagination import (
+    CountMode,
+    InvalidCursorException,
+    decode_cursor,
+    encode_cursor,
+)
 from backend.restaurants import crud, models
-from backend.reviews.crud import (count_reviews, get_best_review,
-                                  get_last_review, get_worst_review)
+from backend.restaurants.cache import detail_cache
+from backend.restaurants.versions import get_restaurants_version
+from backend.responses import FastJSONResponse
 from backend.users import auth
 
 
@@ -17,19 +30,54 @@ router = APIRouter()
 LOGGER = logging.getLogger()
 
 
+def parse_cursor(cursor: Optional[str]):
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor, Decimal, UUID)
+    except InvalidCursorException as exc:
+        raise HTTPException(status_code=400, detail=exc.args)
+
+
+def next_cursor(restaurant_list: List, limit: int) -> Optional[str]:
+    if not restaurant_list or len(restaurant_list) < limit:
+        return None
+    return encode_cursor(*crud.ranking_key(restaurant_list[-1]))
+
+
+def listing_etag(version: int) -> str:
+    return make_etag("restaurants", version)
+
+
 @router.get("/api/v1/restaurants", summary="List all restaurants.")
 async def list_restaurants(
     offset: Optional[int] = 0,
     limit: Optional[int] = 10,
+    cursor: Optional[str] = None,
+    count: CountMode = CountMode.exact,
     db: AsyncSession = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+    response: Response = None,
 ):
+    after = parse_cursor(cursor)
+    version = await get_restaurants_version(db)
+    etag = listing_etag(version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    fast_json = get_settings().fast_json_responses
     try:
-        restaurant_list = await crud.list_restaurants(db, offset, limit)
-        restaurant_count = await crud.count_restaurants(db)
-        return {
+        restaurant_list, restaurant_count = await crud.list_restaurants(
+            db, offset, limit, after, count, fast_json, version
+        )
+        content = {
             'data': restaurant_list,
-            'count': restaurant_count
+            'count': restaurant_count,
+            'next_cursor': next_cursor(restaurant_list, limit),
         }
+        if fast_json:
+            return FastJSONResponse(content, headers=dict(response.headers))
+        return content
     except Exception as exc:
         raise HTTPException(status_code=405, detail=exc.args)
 
@@ -44,19 +92,45 @@ async def list_restaurants_in_area(
     name: Optional[str] = "",
     offset: Optional[int] = 0,
     limit: Optional[int] = 10,
+    cursor: Optional[str] = None,
+    count: CountMode = CountMode.exact,
+    ranked: Optional[bool] = False,
     db: AsyncSession = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+    response: Response = None,
 ):
+    after = parse_cursor(cursor)
+    ranked = bool(ranked and name)
+    version = await get_restaurants_version(db)
+    etag = listing_etag(version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    fast_json = get_settings().fast_json_responses
     try:
-        restaurant_list = await crud.find_restaurants(
-            db, country, postcode, name, offset, limit
+        restaurant_list, restaurant_count = await crud.find_restaurants(
+            db,
+            country,
+            postcode,
+            name,
+            offset,
+            limit,
+            after,
+            count,
+            ranked,
+            fast_json,
+            version,
         )
-        restaurant_count = await crud.count_restaurants(
-            db, country, postcode, name
-        )
-        return {
+        content = {
             'data': restaurant_list,
-            'count': restaurant_count
+            'count': restaurant_count,
+            'next_cursor': (
+                None if ranked else next_cursor(restaurant_list, limit)
+            ),
         }
+        if fast_json:
+            return FastJSONResponse(content, headers=dict(response.headers))
+        return content
     except Exception as exc:
         raise HTTPException(status_code=405, detail=exc.args)
 
@@ -83,40 +157,26 @@ async def get_restaurant_by_id(
     Authorize: auth.AuthJWTScoped = Depends(),
     db: AsyncSession = Depends(get_db),
     _token: str = Depends(auth.oauth2_access_scheme),
+    if_none_match: Optional[str] = Header(None),
 ):
     Authorize.jwt_required("users:me")
 
-    db_restaurant = await crud.get_restaurant_by_id(db, restaurant_id)
-    if db_restaurant is None:
-        raise HTTPException(status_code=404, detail="Restaurant not found")
-
-    rev_count = await count_reviews(db, restaurant_id)
-    best_rev = None
-    worst_rev = None
-    last_rev = None
-
-    if rev_count > 0:
-        last_rev = await get_last_review(db, restaurant_id)
-        if rev_count > 1:
-            best_rev = await get_best_review(db, restaurant_id)
-            worst_rev = await get_worst_review(db, restaurant_id)
-
-        if last_rev and best_rev and last_rev.id == best_rev.id:
-            last_rev = None
-
-        if last_rev and worst_rev and last_rev.id == worst_rev.id:
-            last_rev = None
-
-        if best_rev and worst_rev and best_rev.id == worst_rev.id:
-            worst_rev = None
-
-    return {
-        "data": db_restaurant,
-        "review_count": rev_count,
-        "best_review": best_rev,
-        "worst_review": worst_rev,
-        "last_review": last_rev
-    }
+    body = await detail_cache.get(str(restaurant_id))
+    if body is None:
+        # Before the query, so a write that invalidates the detail while
+        # it's read keeps the old one out of the cache.
+        generation = await detail_cache.generation(str(restaurant_id))
+        detail = await crud.get_restaurant_detail(db, restaurant_id)
+        if detail is None:
+            raise HTTPException(status_code=404, detail="Restaurant not found")
+        body = JSONResponse(jsonable_encoder(detail)).body
+        await detail_cache.set(str(restaurant_id), body, generation)
+    etag = make_etag(body)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    return Response(
+        body, media_type="application/json", headers={"ETag": etag}
+    )
 
 
 @router.put(
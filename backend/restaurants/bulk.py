@@ -0,0 +1,296 @@
+import json
+from datetime import datetime, timezone
+from enum import Enum
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, TextIO, Tuple
+from uuid import NAMESPACE_URL, UUID, uuid5
+
+from pydantic import ValidationError
+from sqlalchemy import text, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from backend.db import transaction
+from backend.restaurants import dbrel, models
+from backend.restaurants.cache import detail_cache
+from backend.restaurants.versions import bump_restaurants_version
+
+
+class ImportFormat(str, Enum):
+    auto = "auto"
+    json = "json"  # A JSON array of restaurants.
+    ndjson = "ndjson"  # One restaurant per line.
+
+
+class LoadMethod(str, Enum):
+    insert = "insert"  # Multi-row INSERT statements.
+    copy = "copy"  # COPY, through a staging table when upserting.
+
+
+# Columns of a restaurant that an import writes, in this order.
+COLUMNS = [
+    "id",
+    *models.InputRestaurant.__fields__,
+    "disabled",
+    "avg_rating",
+    "created_at",
+]
+
+# Postgres takes at most 32767 parameters per statement.
+MAX_INSERT_ROWS = 32767 // len(COLUMNS)
+
+# Columns that an upsert overwrites. The rating stays as it is.
+UPSERT_COLUMNS = [*models.InputRestaurant.__fields__, "created_at"]
+
+# Columns that identify a restaurant without an id, see restaurant_id.
+KEY_COLUMNS = ["country", "postal_code", "name", "address"]
+
+# Maximum length of the string columns. COPY aborts the whole batch on a
+# value too long, so they are checked on validation.
+MAX_LENGTHS = {
+    column.name: column.type.length
+    for column in dbrel.Restaurant.__table__.columns
+    if getattr(column.type, "length", None)
+}
+
+_decoder = json.JSONDecoder()
+
+
+def iter_json_array(fp: TextIO, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """
+    Yields the items of the JSON array in `fp` one by one, reading it in
+    chunks, so that the file is never held in memory as a whole.
+    """
+    buffer, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = fp.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    def expect(chars: str) -> str:
+        nonlocal pos
+        skip_whitespace()
+        if pos == len(buffer) or buffer[pos] not in chars:
+            found = buffer[pos : pos + 1] or "end of file"
+            raise ValueError("Expected one of %r, found %r" % (chars, found))
+        pos += 1
+        return buffer[pos - 1]
+
+    expect("[")
+    skip_whitespace()
+    if buffer[pos : pos + 1] == "]":
+        return
+    while True:
+        skip_whitespace()
+        while True:
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+                break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+        pos = end
+        yield item
+        if expect(",]") == "]":
+            return
+
+
+def iter_ndjson(fp: TextIO) -> Iterator[Any]:
+    for line in fp:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_items(fp: TextIO, fmt: ImportFormat = ImportFormat.auto):
+    if fmt == ImportFormat.auto:
+        name = getattr(fp, "name", "")
+        if str(name).endswith((".ndjson", ".jsonl")):
+            fmt = ImportFormat.ndjson
+        else:
+            fmt = ImportFormat.json
+    if fmt == ImportFormat.ndjson:
+        return iter_ndjson(fp)
+    return iter_json_array(fp)
+
+
+def restaurant_id(item: Dict[str, Any], restaurant: models.InputRestaurant):
+    """
+    The id of the item if it has one, or else one derived from the name
+    and the location of the restaurant, so that importing the same file
+    twice upserts the same rows. Either is a version 4 UUID, as the API
+    expects.
+    """
+    if item.get("id"):
+        uuid = UUID(str(item["id"]))
+        if uuid.version != 4:
+            raise ValueError("id %s is not a version 4 UUID" % uuid)
+        return uuid
+    return derived_id(restaurant.dict())
+
+
+def derived_id(values: Dict[str, Any]) -> UUID:
+    key = "|".join(values[column] for column in KEY_COLUMNS)
+    derived = uuid5(NAMESPACE_URL, "restaurant:" + key)
+    return UUID(bytes=derived.bytes, version=4)
+
+
+def check_lengths(values: Dict[str, Any]):
+    for column, length in MAX_LENGTHS.items():
+        value = values.get(column)
+        if isinstance(value, str) and len(value) > length:
+            raise ValueError(
+                "%s is longer than %d characters" % (column, length)
+            )
+
+
+def validate_batch(
+    items: Iterable[Dict[str, Any]], first: int = 0
+) -> Tuple[List[Dict[str, Any]], List[Tuple[int, str]]]:
+    """
+    Validates the items with `InputRestaurant`. Returns the rows ready to
+    be written and the (position, error) of each invalid item, counting
+    positions from `first`.
+    """
+    rows, errors = [], []
+    now = datetime.now(timezone.utc)
+    for position, item in enumerate(items, first):
+        try:
+            restaurant = models.InputRestaurant(**item)
+            check_lengths(restaurant.dict())
+            rows.append(
+                {
+                    "id": restaurant_id(item, restaurant),
+                    **restaurant.dict(),
+                    "disabled": False,
+                    "avg_rating": 0.0,
+                    "created_at": now,
+                }
+            )
+        except (TypeError, ValueError, ValidationError) as exc:
+            errors.append((position, str(exc).replace("\n", " ")))
+    return rows, errors
+
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _insert_statement(upsert: bool):
+    stmt = insert(dbrel.Restaurant)
+    if not upsert:
+        return stmt.on_conflict_do_nothing(index_elements=["id"])
+    return stmt.on_conflict_do_update(
+        index_elements=["id"],
+        set_={column: stmt.excluded[column] for column in UPSERT_COLUMNS},
+    )
+
+
+async def copy_rows(
+    db: AsyncSession,
+    table: str,
+    rows: List[Dict],
+    columns: List[str] = COLUMNS,
+):
+    """
+    Writes the rows to the table with COPY, in the transaction of the
+    session. Defaults to the columns of the restaurants.
+    """
+    conn = await db.connection()
+    raw_connection = await conn.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(
+        table,
+        records=[tuple(row[column] for column in columns) for row in rows],
+        columns=columns,
+    )
+
+
+async def _adopt_existing_ids(db: AsyncSession, rows: List[Dict[str, Any]]):
+    """
+    Gives the rows with a derived id the id of the restaurant with the
+    same name and location already in the table, if any, so that an
+    upsert updates the restaurants added with random ids, by the API or
+    by imports before ids were derived, instead of adding them again.
+    """
+    derived = {
+        tuple(row[column] for column in KEY_COLUMNS): row
+        for row in rows
+        if row["id"] == derived_id(row)
+    }
+    Restaurant = dbrel.Restaurant
+    columns = [getattr(Restaurant, column) for column in KEY_COLUMNS]
+    for keys in batched(derived, 32767 // len(KEY_COLUMNS)):
+        result = await db.execute(
+            select(Restaurant.id, *columns).where(tuple_(*columns).in_(keys))
+        )
+        for restaurant_id, *key in result:
+            derived[tuple(key)]["id"] = restaurant_id
+
+
+async def load_batch(
+    db: AsyncSession,
+    rows: List[Dict[str, Any]],
+    method: LoadMethod = LoadMethod.insert,
+    upsert: bool = False,
+) -> None:
+    """
+    Writes the rows in one transaction. Without `upsert` the rows whose
+    id already exists are skipped by the INSERT method, and make COPY
+    fail.
+    """
+    if not rows:
+        return
+    table = dbrel.Restaurant.__tablename__
+    async with transaction(db):
+        if upsert:
+            await _adopt_existing_ids(db, rows)
+        # A batch can't upsert the same row twice, the last one wins.
+        rows = list({row["id"]: row for row in rows}.values())
+        if method == LoadMethod.insert:
+            stmt = _insert_statement(upsert)
+            for chunk in batched(rows, MAX_INSERT_ROWS):
+                await db.execute(stmt.values(chunk))
+        elif not upsert:
+            await copy_rows(db, table, rows)
+        else:
+            await db.execute(
+                text(
+                    "CREATE TEMP TABLE restaurants_import "
+                    "(LIKE %s INCLUDING DEFAULTS) ON COMMIT DROP" % table
+                )
+            )
+            await copy_rows(db, "restaurants_import", rows)
+            columns = ", ".join(COLUMNS)
+            updates = ", ".join(
+                "%s = EXCLUDED.%s" % (column, column)
+                for column in UPSERT_COLUMNS
+            )
+            await db.execute(
+                text(
+                    "INSERT INTO %s (%s) SELECT %s FROM restaurants_import "
+                    "ON CONFLICT (id) DO UPDATE SET %s"
+                    % (table, columns, columns, updates)
+                )
+            )
+        await bump_restaurants_version(db)
+    if upsert:
+        # Too many rows to invalidate one by one.
+        await detail_cache.invalidate_all()
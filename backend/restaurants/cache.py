@@ -0,0 +1,7 @@
+from backend.cache import make_cache
+
+
+# Serialized responses of `GET /api/v1/restaurant/{id}`, by restaurant id.
+# Invalidated when the restaurant is updated or deleted, and when it gets
+# new reviews.
+detail_cache = make_cache("restaurant-detail")
@@ -1,20 +1,37 @@
 import logging
-from typing import List
+from decimal import Decimal
+from typing import List, Optional, Tuple
 from uuid import uuid4
 
 from pydantic import UUID4
-from sqlalchemy import and_, delete, func, update
+from sqlalchemy import and_, delete, func, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
 
-from backend.restaurants import dbrel, models
+from backend.db import transaction
+from backend.pagination import (
+    CountMode,
+    count_rows,
+    estimate_rows,
+    fetch_page,
+)
+from backend.restaurants import dbrel, models, search
+from backend.restaurants.cache import detail_cache
+from backend.restaurants.leaderboards import (
+    Area,
+    leaderboards,
+    update_leaderboards,
+)
+from backend.restaurants.versions import bump_restaurants_version
+from backend.reviews import dbrel as dbrel_reviews
 
 
 LOGGER = logging.getLogger()
 
 
 async def get_restaurant_by_id(db: AsyncSession, restaurant_id: uuid4):
-    async with db.begin():
+    async with transaction(db):
         result = await db.execute(
             (
                 select(dbrel.Restaurant).where(
@@ -29,17 +46,206 @@ async def get_restaurant_by_id(db: AsyncSession, restaurant_id: uuid4):
         return first
 
 
-async def list_restaurants(
-    db: AsyncSession, offset: int, limit: int
-) -> List[dbrel.Restaurant]:
-    async with db.begin():
+def dedupe_highlights(review_count: int, best_rev, worst_rev, last_rev):
+    """
+    Applies the rules of the restaurant detail page to the best, the worst
+    and the last review: with a single review only the last one is shown,
+    and the same review is never shown twice.
+    """
+    if review_count == 0:
+        return None, None, None
+
+    if review_count == 1:
+        best_rev = None
+        worst_rev = None
+
+    if last_rev and best_rev and last_rev.id == best_rev.id:
+        last_rev = None
+
+    if last_rev and worst_rev and last_rev.id == worst_rev.id:
+        last_rev = None
+
+    if best_rev and worst_rev and best_rev.id == worst_rev.id:
+        worst_rev = None
+
+    return best_rev, worst_rev, last_rev
+
+
+async def get_restaurant_detail(db: AsyncSession, restaurant_id: uuid4):
+    """
+    Fetches the restaurant, its number of reviews and its best, worst and
+    last review in a single statement. The highlighted reviews are joined
+    by primary key from the restaurant's review statistics, so the cost
+    does not depend on the number of reviews. Returns None if the
+    restaurant does not exist.
+    """
+    Restaurant = dbrel.Restaurant
+    Stats = dbrel_reviews.ReviewStats
+    best_rev = aliased(dbrel_reviews.Review, name="best_review")
+    worst_rev = aliased(dbrel_reviews.Review, name="worst_review")
+    last_rev = aliased(dbrel_reviews.Review, name="last_review")
+
+    async with transaction(db):
         result = await db.execute(
-            select(dbrel.Restaurant)
-            .offset(offset)
-            .limit(limit)
-            .order_by(dbrel.Restaurant.avg_rating.desc())
+            select(
+                Restaurant,
+                func.coalesce(Stats.review_count, 0),
+                best_rev,
+                worst_rev,
+                last_rev,
+            )
+            .select_from(Restaurant)
+            .outerjoin(Stats, Stats.restaurant_id == Restaurant.id)
+            .outerjoin(best_rev, best_rev.id == Stats.best_review_id)
+            .outerjoin(worst_rev, worst_rev.id == Stats.worst_review_id)
+            .outerjoin(last_rev, last_rev.id == Stats.last_review_id)
+            .where(Restaurant.id == restaurant_id)
+        )
+        row = result.first()
+
+    if row is None:
+        return None
+
+    restaurant, rev_count, best, worst, last = row
+    best, worst, last = dedupe_highlights(rev_count, best, worst, last)
+    return {
+        "data": restaurant,
+        "review_count": rev_count,
+        "best_review": best,
+        "worst_review": worst,
+        "last_review": last,
+    }
+
+
+def ranking():
+    """
+    Order of the restaurant listings, the unrated restaurants last. The
+    `id` breaks ties between restaurants with the same rating so that
+    pages are stable.
+    """
+    return (dbrel.rating_rank.desc(), dbrel.Restaurant.id.desc())
+
+
+def ranking_key(restaurant) -> Tuple[Decimal, UUID4]:
+    """
+    Keyset of a restaurant, or of a row mapping of the restaurants table.
+    """
+    if isinstance(restaurant, dict):
+        return (
+            dbrel.rating_rank_of(restaurant["avg_rating"]),
+            restaurant["id"],
+        )
+    return (dbrel.rating_rank_of(restaurant.avg_rating), restaurant.id)
+
+
+def _restaurants(as_mappings: bool = False):
+    """
+    Select of the restaurants, as entities or as their plain columns.
+    """
+    if as_mappings:
+        return select(*dbrel.Restaurant.__table__.columns)
+    return select(dbrel.Restaurant)
+
+
+def _after(after: Optional[Tuple]):
+    """
+    Keyset condition to get the restaurants that follow the one with the
+    given `ranking_key`, or None when paging by offset.
+    """
+    if after is None:
+        return None
+    key = tuple_(dbrel.rating_rank, dbrel.Restaurant.id)
+    return key < tuple(after)
+
+
+def _area_filter(country: str, postcode: str, name: str = ""):
+    area = and_(
+        dbrel.Restaurant.country == country,
+        dbrel.Restaurant.postal_code == postcode,
+    )
+    if name:
+        return and_(area, search.name_filter(name))
+    return area
+
+
+async def _leaderboard_page(
+    db: AsyncSession,
+    version: int,
+    area: Area,
+    offset: int,
+    limit: int,
+    after: Optional[Tuple],
+    count: CountMode,
+) -> Optional[Tuple[List[dict], Optional[int]]]:
+    """
+    The page of the listing of the area, or of all the restaurants when
+    `area` is None, from its leaderboard at `version`, loading it if
+    needed. Returns None when the page goes past the leaderboard.
+    """
+    if offset < 0 or limit < 0:
+        return None
+    if after is None and offset + limit > leaderboards.size:
+        return None
+    stmt = _restaurants(as_mappings=True)
+    if area is not None:
+        stmt = stmt.where(_area_filter(*area))
+
+    board = leaderboards.get(version, area)
+    if board is None:
+        result = await db.execute(
+            stmt.order_by(*ranking()).limit(leaderboards.size)
+        )
+        rows = [dict(row) for row in result.mappings()]
+        board = leaderboards.add(version, area, rows)
+
+    start = offset if after is None else board.index_after(after)
+    if not board.covers(start, limit):
+        return None
+    items = board.rows[start : start + limit]
+
+    if count == CountMode.none:
+        return items, None
+    if board.count is not None:
+        return items, board.count
+    if count == CountMode.estimate:
+        return items, await estimate_rows(db, stmt)
+    total = await count_rows(db, stmt)
+    if board.version == version:
+        board.count = total
+    return items, total
+
+
+async def list_restaurants(
+    db: AsyncSession,
+    offset: int,
+    limit: int,
+    after: Optional[Tuple] = None,
+    count: CountMode = CountMode.exact,
+    as_mappings: bool = False,
+    version: Optional[int] = None,
+) -> Tuple[List[dbrel.Restaurant], Optional[int]]:
+    """
+    Lists the restaurants from the best rated. Given the `version` of the
+    listings, the first pages come from the leaderboards, as row mappings
+    whatever `as_mappings`.
+    """
+    async with transaction(db):
+        if version is not None and leaderboards.enabled:
+            page = await _leaderboard_page(
+                db, version, None, offset, limit, after, count
+            )
+            if page is not None:
+                return page
+        return await fetch_page(
+            db,
+            _restaurants(as_mappings),
+            order_by=ranking(),
+            offset=offset,
+            limit=limit,
+            after=_after(after),
+            count=count,
+            as_mappings=as_mappings,
         )
-        return [item for item, in result.fetchall()]
 
 
 async def find_restaurants(
@@ -49,22 +255,43 @@ async def find_restaurants(
     name: str = "",
     offset: int = 0,
     limit: int = 10,
-):
-    async with db.begin():
-        results = await db.execute(
-            select(dbrel.Restaurant)
-            .where(
-                and_(
-                    dbrel.Restaurant.country == country,
-                    dbrel.Restaurant.postal_code == postcode,
-                    dbrel.Restaurant.name.ilike(f"%{name}%"),
-                )
+    after: Optional[Tuple] = None,
+    count: CountMode = CountMode.exact,
+    ranked: bool = False,
+    as_mappings: bool = False,
+    version: Optional[int] = None,
+) -> Tuple[List[dbrel.Restaurant], Optional[int]]:
+    """
+    Lists the restaurants of the area whose name contains `name`. With
+    `ranked`, the best name matches come first, and `after` is ignored
+    because the keyset only follows the rating order. As in
+    `list_restaurants`, the first pages of the area listing without a
+    name come from its leaderboard when the `version` is given.
+    """
+    async with transaction(db):
+        if version is not None and leaderboards.enabled and not name:
+            page = await _leaderboard_page(
+                db, version, (country, postcode), offset, limit, after, count
             )
-            .offset(offset)
-            .limit(limit)
-            .order_by(dbrel.Restaurant.avg_rating.desc())
+            if page is not None:
+                return page
+        order_by = ranking()
+        if ranked and name:
+            use_trigram = await search.trigram_available(db)
+            order_by = search.name_ranking(name, use_trigram) + order_by
+            after = None
+        return await fetch_page(
+            db,
+            _restaurants(as_mappings).where(
+                _area_filter(country, postcode, name)
+            ),
+            order_by=order_by,
+            offset=offset,
+            limit=limit,
+            after=_after(after),
+            count=count,
+            as_mappings=as_mappings,
         )
-        return [item for item, in results.fetchall()]
 
 
 async def count_restaurants(
@@ -73,15 +300,11 @@ async def count_restaurants(
     postcode: str = "",
     name: str = "",
 ):
-    async with db.begin():
+    async with transaction(db):
         if len(country) and len(postcode):
             result = await db.execute(
                 select(func.count(dbrel.Restaurant.id)).where(
-                    and_(
-                        dbrel.Restaurant.country == country,
-                        dbrel.Restaurant.postal_code == postcode,
-                        dbrel.Restaurant.name.ilike(f"%{name}%"),
-                    )
+                    _area_filter(country, postcode, name)
                 )
             )
             return result.scalars().one()
@@ -93,11 +316,13 @@ async def count_restaurants(
 async def create_restaurant(
     db: AsyncSession, restaurant: models.InputRestaurant
 ):
-    async with db.begin():
+    async with transaction(db):
         db_restaurant = dbrel.Restaurant(
             **restaurant.dict(), disabled=False, avg_rating=0.0
         )
         db.add(db_restaurant)
+        await db.flush()
+        await bump_restaurants_version(db)
     await db.commit()
     await db.refresh(db_restaurant)
     return db_restaurant
@@ -108,20 +333,38 @@ async def update_restaurant(
     restaurant_id: UUID4,
     restaurant: models.InputExtendedRestaurant,
 ):
-    async with db.begin():
+    Restaurant = dbrel.Restaurant
+    async with transaction(db):
+        # The area before the update, in case the restaurant moves.
+        area = await db.execute(
+            select(Restaurant.country, Restaurant.postal_code).where(
+                Restaurant.id == restaurant_id
+            )
+        )
+        previous_area = area.one_or_none()
         result = await db.execute(
-            update(dbrel.Restaurant)
-            .where(dbrel.Restaurant.id == restaurant_id)
+            update(Restaurant)
+            .where(Restaurant.id == restaurant_id)
             .values(**restaurant.dict())
         )
+        version = await bump_restaurants_version(db)
+    await detail_cache.invalidate(str(restaurant_id))
+    await update_leaderboards(
+        db,
+        version,
+        [restaurant_id],
+        tuple(previous_area) if previous_area else None,
+    )
     if result.rowcount > 0:
         return await get_restaurant_by_id(db, restaurant_id)
     return None
 
 
 async def delete_restaurant(db: AsyncSession, restaurant_id: uuid4):
-    async with db.begin():
+    async with transaction(db):
         result = await db.execute(
             delete(dbrel.Restaurant).where(dbrel.Restaurant.id == restaurant_id)
         )
-        return result.rowcount
+        await bump_restaurants_version(db)
+    await detail_cache.invalidate(str(restaurant_id))
+    return result.rowcount
@@ -1,7 +1,24 @@
 from datetime import datetime
+from decimal import Decimal
+from typing import Optional
 from uuid import uuid4
 
-from sqlalchemy import Boolean, Column, DateTime, Numeric, String
+from sqlalchemy import (
+    DDL,
+    BigInteger,
+    Boolean,
+    CheckConstraint,
+    Column,
+    DateTime,
+    Index,
+    Numeric,
+    String,
+    Table,
+    event,
+    func,
+    literal_column,
+    true,
+)
 from sqlalchemy_utils import UUIDType
 
 from backend.db import Base
@@ -25,3 +42,72 @@ class Restaurant(Base):
         default=datetime.utcnow,
         onupdate=datetime.utcnow,
     )
+
+
+# Rank of a restaurant in the listings, its avg_rating, with the unrated
+# ones (NULL) ranked last as if rated -1. The ORDER BY, the keyset
+# conditions and the indexes share the expression, the -1 a literal so
+# the planner matches the queries with the indexes.
+UNRATED_RANK = Decimal(-1)
+rating_rank = func.coalesce(Restaurant.avg_rating, literal_column("-1"))
+
+
+def rating_rank_of(avg_rating: Optional[Decimal]) -> Decimal:
+    """Value of `rating_rank` for a restaurant's avg_rating."""
+    return UNRATED_RANK if avg_rating is None else avg_rating
+
+
+# Serve the listings ordered by (rating_rank, id), with and without the
+# area filter, for both offset and keyset pages.
+Index("ix_restaurants_rank_id", rating_rank, Restaurant.id)
+Index(
+    "ix_restaurants_area_rank_id",
+    Restaurant.country,
+    Restaurant.postal_code,
+    rating_rank,
+    Restaurant.id,
+)
+
+
+# GIN trigram index of the name search, created along with the table
+# where the pg_trgm extension is available, as its migration does.
+event.listen(
+    Restaurant.__table__,
+    "after_create",
+    DDL(
+        """
+        DO $$
+        BEGIN
+            IF EXISTS (
+                SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'
+            ) THEN
+                CREATE EXTENSION IF NOT EXISTS pg_trgm;
+                CREATE INDEX IF NOT EXISTS ix_restaurants_name_trgm
+                ON restaurants USING gin (name gin_trgm_ops);
+            END IF;
+        END
+        $$
+        """
+    ).execute_if(dialect="postgresql"),
+)
+
+
+# Incremented by every write that changes the restaurant listings, in
+# its transaction, that includes new reviews because of the avg_rating.
+# Its single row holds the version marker of the listings' ETags. A
+# table, unlike a sequence, changes on the read replicas with the
+# transactions that write it, so a replica reports the version of its
+# snapshot.
+restaurants_version = Table(
+    "restaurants_version",
+    Base.metadata,
+    Column("id", Boolean, primary_key=True, server_default=true()),
+    Column("version", BigInteger, nullable=False),
+    CheckConstraint("id", name="restaurants_version_single_row"),
+)
+
+event.listen(
+    restaurants_version,
+    "after_create",
+    DDL("INSERT INTO restaurants_version (version) VALUES (0)"),
+)
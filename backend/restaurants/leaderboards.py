@@ -0,0 +1,198 @@
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pydantic import UUID4
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from backend.config import get_settings
+from backend.db import transaction
+from backend.restaurants import dbrel
+
+
+Area = Optional[Tuple[str, str]]
+
+
+def _key(row: Dict):
+    return (dbrel.rating_rank_of(row["avg_rating"]), row["id"])
+
+
+def _area(row: Dict) -> Area:
+    return (row["country"], row["postal_code"])
+
+
+class Leaderboard:
+    """
+    The best restaurants of an area, or of all of them, as row mappings
+    of the restaurants table in the order of `crud.ranking`. It is the
+    first page of `size` rows of the listing at `version`, or the whole
+    listing when `complete`.
+    """
+
+    def __init__(self, version: int, rows: List[Dict], size: int):
+        self.version = version
+        self.rows = rows
+        self.size = size
+        self.complete = len(rows) < size
+        # Number of restaurants in the listing, computed on first use.
+        self.count: Optional[int] = len(rows) if self.complete else None
+
+    def index_after(self, key: Tuple) -> int:
+        """
+        Position of the first row ranked after `key`, a `ranking_key`.
+        """
+        low, high = 0, len(self.rows)
+        while low < high:
+            middle = (low + high) // 2
+            if _key(self.rows[middle]) >= tuple(key):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def covers(self, start: int, limit: int) -> bool:
+        return self.complete or start + limit <= len(self.rows)
+
+    def remove(self, restaurant_id) -> bool:
+        for index, row in enumerate(self.rows):
+            if row["id"] == restaurant_id:
+                del self.rows[index]
+                return True
+        return False
+
+    def insert(self, row: Dict):
+        index = self.index_after(_key(row))
+        # Past the last row of a partial board there may be others first.
+        if index == len(self.rows) and not self.complete:
+            return
+        self.rows.insert(index, row)
+        if len(self.rows) > self.size:
+            self.rows.pop()
+            self.complete = False
+
+
+class Leaderboards:
+    """
+    In-memory leaderboards of the restaurant listings: the global one and
+    those of the last `max_areas` areas (country and postal code) listed.
+    `crud.list_restaurants` and `crud.find_restaurants` serve the pages
+    within the first `size` rows from them, without a query.
+
+    A board is valid for a single version of the listings, see
+    `versions.py`. The writes that change ratings apply their change to
+    the boards of the version before theirs with `apply`, and every other
+    write leaves the boards stale, so they are loaded again when listed.
+    """
+
+    def __init__(self, size: int, max_areas: int):
+        self.size = size
+        self.max_areas = max_areas
+        self._boards: "OrderedDict[Area, Leaderboard]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def clear(self):
+        self._boards.clear()
+
+    def get(self, version: int, area: Area) -> Optional[Leaderboard]:
+        board = self._boards.get(area)
+        if board is None or board.version != version:
+            return None
+        self._boards.move_to_end(area)
+        return board
+
+    def add(self, version: int, area: Area, rows: List[Dict]) -> Leaderboard:
+        """
+        Adds the board of the first rows of the listing of the area, read
+        at `version`. It doesn't replace a board of a later version, read
+        from a more recent snapshot (ie: on a lagging replica).
+        """
+        board = Leaderboard(version, rows, self.size)
+        current = self._boards.get(area)
+        if current is not None and current.version > version:
+            return board
+        self._boards[area] = board
+        self._boards.move_to_end(area)
+        while len(self._boards) > self.max_areas + 1:
+            self._boards.popitem(last=False)
+        return board
+
+    def follows(self, version: int) -> bool:
+        """
+        Whether a write numbered `version` can update some board, that is
+        one of the version right before it.
+        """
+        return any(
+            board.version == version - 1 for board in self._boards.values()
+        )
+
+    def apply(
+        self,
+        version: int,
+        restaurant_ids: Iterable,
+        rows: List[Dict],
+        previous_area: Area = None,
+    ):
+        """
+        Applies a write numbered `version` to the boards of the version
+        before it, and drops the others. `rows` are the rows after the
+        write of the restaurants in `restaurant_ids` that still exist.
+        Pass the `previous_area` of a restaurant that may have moved, so
+        the boards adjust their counts.
+        """
+        restaurant_ids = set(restaurant_ids)
+        areas = {_area(row) for row in rows}
+        for area, board in list(self._boards.items()):
+            if board.version != version - 1:
+                del self._boards[area]
+                continue
+            for restaurant_id in restaurant_ids:
+                board.remove(restaurant_id)
+            for row in rows:
+                if area is None or area == _area(row):
+                    board.insert(row)
+            if board.count is not None and previous_area is not None:
+                if area == previous_area and area not in areas:
+                    board.count -= 1
+                elif area != previous_area and area in areas:
+                    board.count += 1
+            board.version = version
+            if not board.complete and len(board.rows) <= self.size // 2:
+                # Too few rows left to serve the first pages.
+                del self._boards[area]
+
+
+def make_leaderboards() -> Leaderboards:
+    settings = get_settings()
+    return Leaderboards(
+        settings.leaderboard_size, settings.leaderboard_max_areas
+    )
+
+
+leaderboards = make_leaderboards()
+
+
+async def update_leaderboards(
+    db: AsyncSession,
+    version: int,
+    restaurant_ids: List[UUID4],
+    previous_area: Area = None,
+):
+    """
+    Applies the write numbered `version` of the restaurants to the
+    leaderboards, reading their new rows if a leaderboard follows it.
+    """
+    if not leaderboards.follows(version):
+        # No leaderboard to update, this only drops the stale ones.
+        leaderboards.apply(version, restaurant_ids, [])
+        return
+    async with transaction(db):
+        result = await db.execute(
+            select(*dbrel.Restaurant.__table__.columns).where(
+                dbrel.Restaurant.id.in_(restaurant_ids)
+            )
+        )
+        rows = [dict(row) for row in result.mappings()]
+    leaderboards.apply(version, restaurant_ids, rows, previous_area)
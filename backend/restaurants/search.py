@@ -0,0 +1,69 @@
+import logging
+
+from sqlalchemy import case, column, func, table
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from backend.restaurants import dbrel
+
+
+LOGGER = logging.getLogger()
+
+TRIGRAM_EXTENSION = "pg_trgm"
+
+pg_extension = table("pg_extension", column("extname"))
+
+# Whether the database has the pg_trgm extension, checked once per process.
+_trigram_available = None
+
+
+async def trigram_available(db: AsyncSession) -> bool:
+    """
+    Tells whether the pg_trgm extension is installed. When it is, the
+    GIN trigram index on restaurants.name serves the ILIKE substring
+    filter, and `similarity` ranks the results. When it is not, the
+    search still works, unindexed. Must be called within a transaction.
+    """
+    global _trigram_available
+    if _trigram_available is None:
+        result = await db.execute(
+            select(func.count())
+            .select_from(pg_extension)
+            .where(pg_extension.c.extname == TRIGRAM_EXTENSION)
+        )
+        _trigram_available = result.scalar_one() > 0
+        if not _trigram_available:
+            LOGGER.warning(
+                "Extension '%s' is not installed, restaurant name search "
+                "falls back to unindexed ILIKE.",
+                TRIGRAM_EXTENSION,
+            )
+    return _trigram_available
+
+
+def escape_like(value: str, escape: str = "\\") -> str:
+    """
+    Escapes the LIKE wildcards in `value` so that it matches literally.
+    """
+    for char in (escape, "%", "_"):
+        value = value.replace(char, escape + char)
+    return value
+
+
+def name_filter(name: str):
+    """
+    Case insensitive substring match of the restaurant name.
+    """
+    return dbrel.Restaurant.name.ilike(f"%{escape_like(name)}%", escape="\\")
+
+
+def name_ranking(name: str, use_trigram: bool):
+    """
+    Order by relevance of the restaurant name to the searched `name`:
+    trigram similarity when pg_trgm is available, or names that start
+    with `name` before the rest otherwise.
+    """
+    if use_trigram:
+        return (func.similarity(dbrel.Restaurant.name, name).desc(),)
+    prefix = dbrel.Restaurant.name.ilike(f"{escape_like(name)}%", escape="\\")
+    return (case((prefix, 0), else_=1),)
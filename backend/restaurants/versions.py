@@ -0,0 +1,35 @@
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from backend.db import transaction
+from backend.restaurants import dbrel
+
+
+async def get_restaurants_version(db: AsyncSession) -> int:
+    """
+    Returns the current version of the restaurant listings, 0 before the
+    first write.
+    """
+    async with transaction(db):
+        result = await db.execute(
+            select(dbrel.restaurants_version.c.version)
+        )
+        return result.scalar_one()
+
+
+async def bump_restaurants_version(db: AsyncSession) -> int:
+    """
+    Advances the version of the restaurant listings and returns the new
+    one. Call it last in the transaction of the write, so that the
+    version commits with it: the row stays locked until the commit, and
+    concurrent writes wait on it only that long. Each gets the version
+    following the previous one, in the order they commit.
+    """
+    version = dbrel.restaurants_version.c.version
+    result = await db.execute(
+        update(dbrel.restaurants_version)
+        .values(version=version + 1)
+        .returning(version)
+    )
+    return result.scalar_one()
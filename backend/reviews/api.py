@@ -1,12 +1,24 @@
 import logging
 from os import stat
-from typing import Optional
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import UUID4
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    Header,
+    HTTPException,
+    Response,
+    status,
+)
+from pydantic import UUID4, ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.config import get_settings
 from backend.db import get_db
+from backend.etag import etag_matches, make_etag, not_modified
+from backend.pagination import CountMode
+from backend.responses import FastJSONResponse
 from backend.reviews import crud, models
 from backend.users import auth
 from backend.users.crud import get_user
@@ -16,6 +28,8 @@ router = APIRouter()
 
 LOGGER = logging.getLogger()
 
+MAX_BATCH_REVIEWS = 5000
+
 
 @router.get(
     "/api/v1/reviews/{restaurant_id}",
@@ -26,23 +40,44 @@ async def list_reviews(
     rating: Optional[int] = 0,
     offset: Optional[int] = 0,
     limit: Optional[int] = 10,
+    count: CountMode = CountMode.exact,
     Authorize: auth.AuthJWTScoped = Depends(),
     db: AsyncSession = Depends(get_db),
     _token: str = Depends(auth.oauth2_access_scheme),
+    if_none_match: Optional[str] = Header(None),
+    response: Response = None,
 ):
+    etag = make_etag(
+        "reviews", *await crud.get_reviews_version(db, restaurant_id)
+    )
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    fast_json = get_settings().fast_json_responses
     try:
-        review_list = await crud.list_reviews(
-            db, restaurant_id, rating, offset, limit
+        review_list, review_count = await crud.list_reviews(
+            db, restaurant_id, rating, offset, limit, count, fast_json
         )
-        review_count = await crud.count_reviews(db, restaurant_id, rating)
-        return {
+        content = {
             'data': review_list,
             'count': review_count
         }
+        if fast_json:
+            return FastJSONResponse(content, headers=dict(response.headers))
+        return content
     except Exception as exc:
         raise HTTPException(status_code=405, detail=exc.args)
 
 
+async def get_user_id(db: AsyncSession, Authorize: auth.AuthJWTScoped):
+    user_id = Authorize.get_jwt_user_id()
+    if user_id is None:
+        username = Authorize.get_jwt_subject()
+        user = await get_user(db, username=username, with_scopes=False)
+        user_id = user.id
+    return user_id
+
+
 @router.post(
     "/api/v1/review/{restaurant_id}",
     summary="Create a review for the given restaurant ID.",
@@ -55,6 +90,52 @@ async def create_review(
     Authorize: auth.AuthJWTScoped = Depends(),
 ):
     Authorize.jwt_required("users:me")
-    username = Authorize.get_jwt_subject()
-    user = await get_user(db, username=username)
-    return await crud.create_review(db, restaurant_id, user.id, review)
+    user_id = await get_user_id(db, Authorize)
+    return await crud.create_review(db, restaurant_id, user_id, review)
+
+
+@router.post(
+    "/api/v1/reviews",
+    summary=(
+        "Create a batch of reviews. Each review is validated on its own, "
+        "the errors of the invalid ones are returned with their index."
+    ),
+)
+async def create_reviews(
+    reviews: List[Any] = Body(..., max_items=MAX_BATCH_REVIEWS),
+    db: AsyncSession = Depends(get_db),
+    Authorize: auth.AuthJWTScoped = Depends(),
+):
+    Authorize.jwt_required("users:me")
+    user_id = await get_user_id(db, Authorize)
+
+    valid, errors = [], []
+    for index, item in enumerate(reviews):
+        try:
+            valid.append((index, models.InputBatchReview.parse_obj(item)))
+        except ValidationError as exc:
+            errors.append({"index": index, "detail": exc.errors()})
+
+    created = []
+    try:
+        db_reviews = await crud.create_reviews(
+            db, user_id, [review for _, review in valid]
+        )
+    except crud.UserNotFoundException as exc:
+        errors.extend(
+            {"index": index, "detail": exc.args[0]} for index, _ in valid
+        )
+        db_reviews = []
+    for (index, review), db_review in zip(valid, db_reviews):
+        if db_review is None:
+            errors.append(
+                {
+                    "index": index,
+                    "detail": "Restaurant '%s' not found."
+                    % review.restaurant_id,
+                }
+            )
+        else:
+            created.append(db_review)
+    errors.sort(key=lambda error: error["index"])
+    return {"data": created, "errors": errors}
@@ -1,84 +1,103 @@
 import logging
-from typing import List
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from uuid import uuid4
 
 from pydantic import UUID4
-from sqlalchemy import and_, delete, func, update
+from sqlalchemy import Numeric, and_, case, cast, delete, func, update
+from sqlalchemy.dialects.postgresql import (
+    aggregate_order_by,
+    array_agg,
+    insert,
+)
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm.exc import NoResultFound
 
+from backend.db import transaction
+from backend.pagination import CountMode, fetch_page
 from backend.restaurants import dbrel as dbrel_restaurants
+from backend.restaurants.cache import detail_cache
+from backend.restaurants.leaderboards import update_leaderboards
+from backend.restaurants.versions import bump_restaurants_version
 from backend.reviews import dbrel, models
+from backend.users import dbrel as dbrel_users
+from backend.utils import sa_orm_object_as_dict
 
 
 LOGGER = logging.getLogger()
 
 
+class UserNotFoundException(Exception):
+    pass
+
+
+def _review_filter(restaurant_id: str, rating: int = 0):
+    if 0 < rating < 6:
+        return and_(
+            dbrel.Review.restaurant_id == restaurant_id,
+            dbrel.Review.rating == rating
+        )
+    return dbrel.Review.restaurant_id == restaurant_id
+
+
+async def _count_reviews(
+    db: AsyncSession, restaurant_id: str, rating: int = 0
+) -> int:
+    if 0 < rating < 6:
+        column = dbrel.ReviewStats.rating_column(rating)
+    else:
+        column = dbrel.ReviewStats.review_count
+    result = await db.execute(
+        select(column).where(dbrel.ReviewStats.restaurant_id == restaurant_id)
+    )
+    return result.scalar_one_or_none() or 0
+
+
 async def list_reviews(
     db: AsyncSession,
     restaurant_id: str,
     rating: int = 0,
     offset: int = 0,
-    limit: int = 10
-):
-    async with db.begin():
-        if 0 < rating < 6:
-            results = await db.execute(
-                select(dbrel.Review)
-                .where(
-                    and_(
-                        dbrel.Review.restaurant_id == restaurant_id,
-                        dbrel.Review.rating == rating
-                    )
-                )
-                .offset(offset)
-                .limit(limit)
-            )
-            return [item for item, in results.fetchall()]
-        else:
-            results = await db.execute(
-                select(dbrel.Review)
-                .where(dbrel.Review.restaurant_id == restaurant_id)
-                .offset(offset)
-                .limit(limit)
-            )
-            return [item for item, in results.fetchall()]
+    limit: int = 10,
+    count: CountMode = CountMode.exact,
+    as_mappings: bool = False,
+) -> Tuple[List[dbrel.Review], Optional[int]]:
+    if as_mappings:
+        stmt = select(*dbrel.Review.__table__.columns)
+    else:
+        stmt = select(dbrel.Review)
+    async with transaction(db):
+        review_list, _ = await fetch_page(
+            db,
+            stmt.where(_review_filter(restaurant_id, rating)),
+            order_by=(dbrel.Review.created_at.desc(), dbrel.Review.id.desc()),
+            offset=offset,
+            limit=limit,
+            count=CountMode.none,
+            as_mappings=as_mappings,
+        )
+        if count == CountMode.none:
+            return review_list, None
+        # The review statistics are exact and cheaper than any estimate.
+        return review_list, await _count_reviews(db, restaurant_id, rating)
 
 
 async def count_reviews(db: AsyncSession, restaurant_id: str, rating: int = 0):
-    async with db.begin():
-        if 0 < rating < 6:
-            result = await db.execute(
-                select(func.count(dbrel.Review.id))
-                .where(
-                    and_(
-                        dbrel.Review.restaurant_id == restaurant_id,
-                        dbrel.Review.rating == rating
-                    )
-                )
-            )
-            try:
-                return result.scalars().one()
-            except NoResultFound:
-                return 0
-        else:
-            result = await db.execute(
-                select(func.count(dbrel.Review.id))
-                .where(dbrel.Review.restaurant_id == restaurant_id)
-            )
-            try:
-                return result.scalars().one()
-            except NoResultFound:
-                return 0
+    async with transaction(db):
+        return await _count_reviews(db, restaurant_id, rating)
 
 
 async def get_best_review(db: AsyncSession, restaurant_id: str):
-    async with db.begin():
+    async with transaction(db):
         result = await db.execute(
             select(dbrel.Review)
             .where(dbrel.Review.restaurant_id == restaurant_id)
-            .order_by(dbrel.Review.rating.desc())
+            .order_by(
+                dbrel.Review.rating.desc(),
+                dbrel.Review.created_at.desc(),
+                dbrel.Review.id.desc(),
+            )
         )
         first_result = result.first()
         if first_result is None:
@@ -88,11 +107,15 @@ async def get_best_review(db: AsyncSession, restaurant_id: str):
 
 
 async def get_worst_review(db: AsyncSession, restaurant_id: str):
-    async with db.begin():
+    async with transaction(db):
         result = await db.execute(
             select(dbrel.Review)
             .where(dbrel.Review.restaurant_id == restaurant_id)
-            .order_by(dbrel.Review.rating)
+            .order_by(
+                dbrel.Review.rating,
+                dbrel.Review.created_at.desc(),
+                dbrel.Review.id.desc(),
+            )
         )
         first_result = result.first()
         if first_result is None:
@@ -102,11 +125,11 @@ async def get_worst_review(db: AsyncSession, restaurant_id: str):
 
 
 async def get_last_review(db: AsyncSession, restaurant_id: str):
-    async with db.begin():
+    async with transaction(db):
         result = await db.execute(
             select(dbrel.Review)
             .where(dbrel.Review.restaurant_id == restaurant_id)
-            .order_by(dbrel.Review.created_at.desc())
+            .order_by(dbrel.Review.created_at.desc(), dbrel.Review.id.desc())
         )
         first_result = result.first()
         if first_result is None:
@@ -115,45 +138,349 @@ async def get_last_review(db: AsyncSession, restaurant_id: str):
         return first
 
 
+def _review_stats_upsert(values: List[Dict[str, Any]]):
+    """
+    Upsert that adds the reviews summarized in each of the `values` to
+    the statistics of its restaurant: review_count and rating_1..5 are
+    the number of reviews added, the best, worst and last review are the
+    ones among them. The rows are sorted by restaurant, so that
+    concurrent upserts lock the rows in the same order.
+    A newer review wins ties for the best and the worst review, matching
+    the order used by `get_best_review` and `get_worst_review`.
+    """
+    Stats = dbrel.ReviewStats
+    stmt = insert(Stats).values(
+        sorted(values, key=lambda row: str(row["restaurant_id"]))
+    )
+    excluded = stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[Stats.restaurant_id],
+        set_={
+            "review_count": Stats.review_count + excluded.review_count,
+            **{
+                column.key: column + excluded[column.key]
+                for column in map(Stats.rating_column, range(1, 6))
+            },
+            "best_review_id": case(
+                (
+                    func.coalesce(Stats.best_rating, 0)
+                    <= excluded.best_rating,
+                    excluded.best_review_id,
+                ),
+                else_=Stats.best_review_id,
+            ),
+            "best_rating": func.greatest(
+                Stats.best_rating, excluded.best_rating
+            ),
+            "worst_review_id": case(
+                (
+                    func.coalesce(Stats.worst_rating, 6)
+                    >= excluded.worst_rating,
+                    excluded.worst_review_id,
+                ),
+                else_=Stats.worst_review_id,
+            ),
+            "worst_rating": func.least(
+                Stats.worst_rating, excluded.worst_rating
+            ),
+            "last_review_id": excluded.last_review_id,
+        },
+    ).returning(Stats.review_count)
+
+
+def _summarize_reviews(reviews: List[dbrel.Review]) -> List[Dict[str, Any]]:
+    """
+    Summarizes the reviews, in the order they were written, into a row
+    of review statistics per restaurant for `_review_stats_upsert`.
+    """
+    summaries = {}
+    for review in reviews:
+        summary = summaries.setdefault(
+            review.restaurant_id,
+            {
+                "restaurant_id": review.restaurant_id,
+                "review_count": 0,
+                **{
+                    column.key: 0
+                    for column in map(
+                        dbrel.ReviewStats.rating_column, range(1, 6)
+                    )
+                },
+                "best_rating": 0,
+                "worst_rating": 6,
+            },
+        )
+        summary["review_count"] += 1
+        summary[dbrel.ReviewStats.rating_column(review.rating).key] += 1
+        if review.rating >= summary["best_rating"]:
+            summary["best_review_id"] = review.id
+            summary["best_rating"] = review.rating
+        if review.rating <= summary["worst_rating"]:
+            summary["worst_review_id"] = review.id
+            summary["worst_rating"] = review.rating
+        summary["last_review_id"] = review.id
+    return list(summaries.values())
+
+
+async def update_review_stats(db: AsyncSession, db_review: dbrel.Review):
+    """
+    Adds the review to the statistics of its restaurant with a single
+    upsert, so that concurrent reviews of the same restaurant serialize
+    on the statistics row instead of overwriting each other.
+    Returns the review count of the restaurant after the update.
+    """
+    result = await db.execute(
+        _review_stats_upsert(_summarize_reviews([db_review]))
+    )
+    return result.scalar_one()
+
+
+def average_rating():
+    """
+    SQL expression of the average rating computed from the running
+    counts of the review statistics: sum(stars * count) / review_count.
+    """
+    Stats = dbrel.ReviewStats
+    rating_sum = Stats.rating_1
+    for rating in range(2, 6):
+        rating_sum = rating_sum + rating * Stats.rating_column(rating)
+    return cast(rating_sum, Numeric) / func.nullif(Stats.review_count, 0)
+
+
+async def update_avg_ratings(
+    db: AsyncSession, restaurant_ids: Iterable[UUID4]
+):
+    """
+    Sets the avg_rating of the restaurants from their review statistics
+    in one UPDATE, without reading the restaurants. Called after the
+    statistics are updated in the same transaction, that holds the lock
+    on their rows: concurrent reviews of the restaurants wait on it and
+    then see each other's counts, so no update is lost.
+    """
+    Restaurant = dbrel_restaurants.Restaurant
+    Stats = dbrel.ReviewStats
+    await db.execute(
+        update(Restaurant)
+        .where(Restaurant.id.in_(list(restaurant_ids)))
+        .values(
+            avg_rating=select(average_rating())
+            .where(Stats.restaurant_id == Restaurant.id)
+            .scalar_subquery()
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def update_avg_rating(db: AsyncSession, restaurant_id: UUID4):
+    await update_avg_ratings(db, [restaurant_id])
+
+
+async def rebuild_review_stats(
+    db: AsyncSession, restaurant_id: Optional[UUID4] = None
+) -> int:
+    """
+    Recomputes the review statistics of one restaurant, or of all of
+    them, from the reviews table. Returns the number of rows written.
+    """
+    Review = dbrel.Review
+    Stats = dbrel.ReviewStats
+    aggregates = (
+        select(
+            Review.restaurant_id,
+            func.count(Review.id),
+            *[
+                func.count(Review.id).filter(Review.rating == rating)
+                for rating in range(1, 6)
+            ],
+            array_agg(
+                aggregate_order_by(
+                    Review.id,
+                    Review.rating.desc(),
+                    Review.created_at.desc(),
+                    Review.id.desc(),
+                )
+            )[1],
+            func.max(Review.rating),
+            array_agg(
+                aggregate_order_by(
+                    Review.id,
+                    Review.rating,
+                    Review.created_at.desc(),
+                    Review.id.desc(),
+                )
+            )[1],
+            func.min(Review.rating),
+            array_agg(
+                aggregate_order_by(
+                    Review.id, Review.created_at.desc(), Review.id.desc()
+                )
+            )[1],
+        )
+        .group_by(Review.restaurant_id)
+    )
+    clear = delete(Stats)
+    if restaurant_id is not None:
+        aggregates = aggregates.where(Review.restaurant_id == restaurant_id)
+        clear = clear.where(Stats.restaurant_id == restaurant_id)
+
+    async with transaction(db):
+        await db.execute(clear)
+        result = await db.execute(
+            insert(Stats).from_select(
+                [
+                    Stats.restaurant_id,
+                    Stats.review_count,
+                    *map(Stats.rating_column, range(1, 6)),
+                    Stats.best_review_id,
+                    Stats.best_rating,
+                    Stats.worst_review_id,
+                    Stats.worst_rating,
+                    Stats.last_review_id,
+                ],
+                aggregates,
+            )
+        )
+        rowcount = result.rowcount
+
+        # Realign the avg_rating of the restaurants with their stats.
+        Restaurant = dbrel_restaurants.Restaurant
+        rebuilt = select(Stats.restaurant_id)
+        if restaurant_id is not None:
+            rebuilt = rebuilt.where(Stats.restaurant_id == restaurant_id)
+        await db.execute(
+            update(Restaurant)
+            .where(Restaurant.id.in_(rebuilt))
+            .values(
+                avg_rating=select(average_rating())
+                .where(Stats.restaurant_id == Restaurant.id)
+                .scalar_subquery()
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await bump_restaurants_version(db)
+    if restaurant_id is not None:
+        await detail_cache.invalidate(str(restaurant_id))
+    else:
+        await detail_cache.invalidate_all()
+    return rowcount
+
+
 async def create_review(
     db: AsyncSession,
     restaurant_id: int,
     user_id: int,
     review: models.InputReview
 ):
-    async with db.begin():
+    try:
+        async with transaction(db):
+            # Add the review, and flush it before the statistics refer to it.
+            db_review = dbrel.Review(
+                **review.dict(),
+                id=uuid4(),
+                restaurant_id=restaurant_id,
+                user_id=user_id,
+            )
+            db.add(db_review)
+            await db.flush()
+
+            await update_review_stats(db, db_review)
+            await update_avg_rating(db, restaurant_id)
+            version = await bump_restaurants_version(db)
+    except IntegrityError:
+        return None  # Can't add a review for a non-existing restaurant.
+
+    await db.commit()
+    await detail_cache.invalidate(str(restaurant_id))
+    await update_leaderboards(db, version, [restaurant_id])
+    await db.refresh(db_review)
+    return db_review
+
+
+# Postgres takes at most 32767 parameters per statement.
+MAX_INSERT_REVIEWS = 32767 // len(dbrel.Review.__table__.columns)
+
+
+async def get_reviews_version(db: AsyncSession, restaurant_id: UUID4):
+    """
+    Version marker of the reviews of the restaurant, for the ETags of
+    their listings: reviews are only ever added, and each one changes
+    the review count and the last review of the restaurant.
+    """
+    Stats = dbrel.ReviewStats
+    async with transaction(db):
         result = await db.execute(
-            select(dbrel_restaurants.Restaurant)
-            .where(dbrel_restaurants.Restaurant.id == restaurant_id)
+            select(Stats.review_count, Stats.last_review_id).where(
+                Stats.restaurant_id == restaurant_id
+            )
         )
-        first_result = result.first()
-        if first_result is None:
-            return None  # Can't add a review for a non-existing restaurant.
-        (db_restaurant,) = first_result
+        return tuple(result.one_or_none() or (0, None))
 
-        # Add the review.
-        db_review = dbrel.Review(
-            **review.dict(), restaurant_id=restaurant_id, user_id=user_id
-        )
-        db.add(db_review)
 
-        # Read total number of reviews.
+async def create_reviews(
+    db: AsyncSession,
+    user_id: UUID4,
+    reviews: List[models.InputBatchReview],
+) -> List[Optional[dbrel.Review]]:
+    """
+    Adds the reviews in one transaction, with multi-row INSERTs, and
+    updates the review statistics and the avg_rating of each restaurant
+    reviewed once for the whole batch.
+    Returns the created reviews in the order of `reviews`, with None in
+    place of those for restaurants that don't exist. Raises
+    UserNotFoundException if the user doesn't exist (ie: was deleted).
+
+    The reviews are a microsecond apart, in the order of `reviews`, so
+    that the last one is the last review, as for `rebuild_review_stats`.
+    """
+    Restaurant = dbrel_restaurants.Restaurant
+    User = dbrel_users.User
+    restaurant_ids = {review.restaurant_id for review in reviews}
+    async with transaction(db):
+        # FOR KEY SHARE: the rows can't be deleted until the reviews that
+        # refer to them are committed.
         result = await db.execute(
-            select(func.count(dbrel.Review.id))
-            .where(dbrel.Review.restaurant_id == restaurant_id)
+            select(User.id)
+            .where(User.id == user_id)
+            .with_for_update(read=True, key_share=True)
         )
-        total_reviews = result.scalars().one()
-
-        # Update restaurant's avg_rating.
-        curr_avg = db_restaurant.avg_rating
-        # avg_new = curr_avg + ( (rev_avg - curr_avg) / (total_reviews + 1) )
-        avg_new = curr_avg + ((review.rating - curr_avg) / (total_reviews + 1))
+        if result.first() is None:
+            raise UserNotFoundException("User '%s' not found." % user_id)
         result = await db.execute(
-            update(dbrel_restaurants.Restaurant)
-            .where(dbrel_restaurants.Restaurant.id == restaurant_id)
-            .values({ 'avg_rating': avg_new })
+            select(Restaurant.id)
+            .where(Restaurant.id.in_(restaurant_ids))
+            .order_by(Restaurant.id)  # Locked in the same order by all.
+            .with_for_update(read=True, key_share=True)
         )
+        existing = set(result.scalars())
 
+        now = datetime.now(timezone.utc)
+        db_reviews = [
+            dbrel.Review(
+                id=uuid4(),
+                user_id=user_id,
+                created_at=now + timedelta(microseconds=position),
+                **review.dict(),
+            )
+            if review.restaurant_id in existing
+            else None
+            for position, review in enumerate(reviews)
+        ]
+        created = [review for review in db_reviews if review is not None]
+        if created:
+            for start in range(0, len(created), MAX_INSERT_REVIEWS):
+                chunk = created[start : start + MAX_INSERT_REVIEWS]
+                await db.execute(
+                    insert(dbrel.Review).values(
+                        [sa_orm_object_as_dict(review) for review in chunk]
+                    )
+                )
+            stats = _summarize_reviews(created)
+            await db.execute(_review_stats_upsert(stats))
+            await update_avg_ratings(db, existing)
+            version = await bump_restaurants_version(db)
     await db.commit()
-    await db.refresh(db_review)
-    return db_review
+    for restaurant_id in existing:
+        await detail_cache.invalidate(str(restaurant_id))
+    if existing:
+        await update_leaderboards(db, version, list(existing))
+    return db_reviews
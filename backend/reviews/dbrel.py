@@ -1,7 +1,7 @@
 from datetime import datetime
 from uuid import uuid4
 
-from sqlalchemy import Column, DateTime, Integer, String
+from sqlalchemy import Column, DateTime, Index, Integer, String
 from sqlalchemy.sql.schema import ForeignKey
 from sqlalchemy_utils import UUIDType
 
@@ -21,3 +21,64 @@ class Review(Base):
     )
     review = Column(String(1024))
     rating = Column(Integer)
+
+    __table_args__ = (
+        # Listing of the reviews of a restaurant, newest first, and its
+        # last review.
+        Index(
+            "ix_reviews_restaurant_id_created_at",
+            restaurant_id,
+            created_at.desc(),
+            id.desc(),
+        ),
+        # Listing filtered by rating, and best and worst review. It holds
+        # every column the review stats rebuild reads, so that one is
+        # served by an index only scan.
+        Index(
+            "ix_reviews_restaurant_id_rating_created_at",
+            restaurant_id,
+            rating,
+            created_at.desc(),
+            id.desc(),
+        ),
+        # Foreign key lookups when deleting users.
+        Index("ix_reviews_user_id", user_id),
+    )
+
+
+class ReviewStats(Base):
+    """
+    Review statistics of a restaurant, maintained by `crud.create_review`
+    in the same transaction that adds the review, and rebuilt from the
+    reviews table with `python -m backend.scripts.rebuild_review_stats`.
+    """
+
+    __tablename__ = "review_stats"
+
+    restaurant_id = Column(
+        UUIDType,
+        ForeignKey("restaurants.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    review_count = Column(Integer, nullable=False, default=0)
+    # Histogram: number of reviews with 1, 2, 3, 4 and 5 stars.
+    rating_1 = Column(Integer, nullable=False, default=0)
+    rating_2 = Column(Integer, nullable=False, default=0)
+    rating_3 = Column(Integer, nullable=False, default=0)
+    rating_4 = Column(Integer, nullable=False, default=0)
+    rating_5 = Column(Integer, nullable=False, default=0)
+    best_review_id = Column(
+        UUIDType, ForeignKey("reviews.id", ondelete="SET NULL")
+    )
+    best_rating = Column(Integer)
+    worst_review_id = Column(
+        UUIDType, ForeignKey("reviews.id", ondelete="SET NULL")
+    )
+    worst_rating = Column(Integer)
+    last_review_id = Column(
+        UUIDType, ForeignKey("reviews.id", ondelete="SET NULL")
+    )
+
+    @classmethod
+    def rating_column(cls, rating: int):
+        return getattr(cls, f"rating_{rating}")
@@ -18,6 +18,10 @@ class InputReview(BaseModel):
     _rating_within_range = get_validator("rating", val_func=is_between_1and5)
 
 
+class InputBatchReview(InputReview):
+    restaurant_id: UUID4
+
+
 class Review(InputReview):
     id: UUID4
     restaurant_id: UUID4
@@ -0,0 +1,393 @@
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from hashlib import md5
+from itertools import accumulate, chain
+from typing import Dict, Iterator, List, Tuple
+from uuid import UUID
+
+from sqlalchemy import text
+
+from backend import db
+from backend.config import get_settings
+from backend.restaurants.bulk import COLUMNS, batched, copy_rows
+from backend.reviews.crud import rebuild_review_stats
+from backend.users import models
+from backend.users.auth import get_password_hash
+from backend.users.crud import create_security_scopes
+from backend.users.registry import scope_registry
+
+
+# The restaurants are spread over the first countries of the list.
+COUNTRIES = (
+    "DE US FR GB IT ES NL BE AT CH PL SE DK NO PT IE CZ FI GR HU "
+    "JP CA AU MX BR AR IN TR KR NZ"
+).split()
+
+ADJECTIVES = (
+    "Golden Little Old Blue Green Royal Happy Red Silver Hidden Rustic "
+    "Urban Lucky Sunny Wild"
+).split()
+
+NOUNS = (
+    "Fork Spoon Kitchen Table Garden Oven Lantern Harbour Mill Barrel "
+    "Olive Dragon Anchor Bistro"
+).split()
+
+CUISINES = (
+    "Bavarian Italian Thai Mexican Japanese Indian Greek Turkish French "
+    "Vietnamese Lebanese Spanish"
+).split()
+
+USERNAME_PREFIX = "gen-user-"
+
+REVIEWS = {
+    1: "Disappointing, the food was cold and the service slow.",
+    2: "Not great, the dishes lacked flavour.",
+    3: "Decent food, nothing special.",
+    4: "Very good food and friendly staff.",
+    5: "Excellent, one of the best meals I have had.",
+}
+
+USER_COLUMNS = ["id", "username", "hashed_password", "disabled"]
+USER_SCOPE_COLUMNS = ["user_id", "security_scope_id"]
+REVIEW_COLUMNS = [
+    "id",
+    "restaurant_id",
+    "user_id",
+    "created_at",
+    "review",
+    "rating",
+]
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description=(
+            "Generate a synthetic dataset of users, restaurants and reviews "
+            "and write it to the database with COPY."
+        )
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--restaurants", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument(
+        "--reviews",
+        type=float,
+        default=10,
+        help="Average number of reviews per restaurant.",
+    )
+    parser.add_argument(
+        "--review-skew",
+        type=float,
+        default=1.5,
+        help=(
+            "Shape of the Pareto distribution of the reviews per "
+            "restaurant, above 1. The lower, the more skewed."
+        ),
+    )
+    parser.add_argument(
+        "--countries",
+        type=int,
+        default=10,
+        help="At most %d." % len(COUNTRIES),
+    )
+    parser.add_argument(
+        "--postcodes", type=int, default=1000, help="Postcodes per country."
+    )
+    parser.add_argument(
+        "--area-skew",
+        type=float,
+        default=1.0,
+        help=(
+            "Exponent of the Zipf distribution of the restaurants over "
+            "countries and postcodes, 0 spreads them evenly."
+        ),
+    )
+    parser.add_argument(
+        "--days",
+        type=int,
+        default=3 * 365,
+        help="Restaurants and reviews are created within the last days.",
+    )
+    parser.add_argument("--password", default="secret")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=50_000,
+        help="Rows written per COPY and transaction.",
+    )
+    parser.add_argument(
+        "--truncate",
+        action="store_true",
+        help=(
+            "Delete every restaurant and review, and the users of a "
+            "previous run, before generating."
+        ),
+    )
+    return parser.parse_args(args)
+
+
+class DatasetGenerator:
+    """
+    Rows of a synthetic dataset, the same ones for the same seed and
+    arguments, but for the times, relative to the day of the run.
+
+    Restaurants are spread over the postcodes of a few countries with a
+    Zipf distribution, so that a few areas are crowded and most have a
+    handful of restaurants. The number of reviews of a restaurant
+    follows a Pareto distribution: most have a few or none, some have
+    thousands. Each restaurant has a quality, around which its ratings
+    vary.
+    """
+
+    def __init__(
+        self,
+        seed: int = 0,
+        restaurants: int = 1_000_000,
+        users: int = 100_000,
+        reviews: float = 10,
+        review_skew: float = 1.5,
+        countries: int = 10,
+        postcodes: int = 1000,
+        area_skew: float = 1.0,
+        days: int = 3 * 365,
+    ):
+        if review_skew <= 1:
+            raise ValueError("The review skew must be above 1.")
+        if not 0 < countries <= len(COUNTRIES):
+            raise ValueError("Between 1 and %d countries." % len(COUNTRIES))
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.restaurant_count = restaurants
+        self.user_count = users
+        self.reviews_per_restaurant = reviews
+        self.review_skew = review_skew
+        self.days = days
+        self.end = datetime.now(timezone.utc).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        self.start = self.end - timedelta(days=days)
+
+        # Country i and postcode j weigh 1 / (i + 1)^s * 1 / (j + 1)^s.
+        self.areas = [
+            (country, "%05d" % (10000 + postcode))
+            for country in COUNTRIES[:countries]
+            for postcode in range(postcodes)
+        ]
+        weights = [
+            ((i + 1) * (j + 1)) ** -area_skew
+            for i in range(countries)
+            for j in range(postcodes)
+        ]
+        self.area_weights = list(accumulate(weights))
+
+    def uuid(self, kind: str, index: int) -> UUID:
+        key = "%d:%s:%d" % (self.seed, kind, index)
+        return UUID(bytes=md5(key.encode()).digest(), version=4)
+
+    def username(self, index: int) -> str:
+        return "%s%d" % (USERNAME_PREFIX, index)
+
+    def users(self, hashed_password: str) -> Iterator[Dict]:
+        # Hashed once: bcrypt takes too long to hash each password.
+        for index in range(self.user_count):
+            yield {
+                "id": self.uuid("user", index),
+                "username": self.username(index),
+                "hashed_password": hashed_password,
+                "disabled": False,
+            }
+
+    def restaurants(self) -> Iterator[Tuple[Dict, float]]:
+        """Yields each restaurant with its quality."""
+        rng = self.rng
+        for index in range(self.restaurant_count):
+            country, postal_code = rng.choices(
+                self.areas, cum_weights=self.area_weights
+            )[0]
+            cuisine = rng.choice(CUISINES)
+            restaurant = {
+                "id": self.uuid("restaurant", index),
+                "name": "%s %s %d"
+                % (rng.choice(ADJECTIVES), rng.choice(NOUNS), index),
+                "description": "%s cuisine." % cuisine,
+                "country": country,
+                "postal_code": postal_code,
+                "address": "%s Street %d"
+                % (rng.choice(NOUNS), rng.randint(1, 200)),
+                "webpage": "https://restaurant-%d.example.com/" % index,
+                "phone_number": "+%010d" % rng.randrange(10 ** 10),
+                "disabled": False,
+                "avg_rating": 0,
+                "created_at": self.start
+                + timedelta(seconds=rng.uniform(0, self.days * 86400)),
+            }
+            yield restaurant, rng.triangular(1, 5, 4)
+
+    def review_count(self, rng: random.Random) -> int:
+        # Pareto shifted to start at 0 (Lomax), of mean 1 / (alpha - 1).
+        alpha = self.review_skew
+        count = rng.paretovariate(alpha) - 1
+        count *= self.reviews_per_restaurant * (alpha - 1)
+        # Rounded up or down at random, to keep the average.
+        return int(count + rng.random())
+
+    def reviews(self, restaurant: Dict, quality: float) -> Iterator[Dict]:
+        # A generator of its own, seeded by the id of the restaurant, so
+        # the reviews don't depend on when they are drawn (ie: on the
+        # batch size).
+        rng = random.Random(restaurant["id"].int)
+        opened = restaurant["created_at"]
+        seconds = (self.end - opened).total_seconds()
+        for index in range(self.review_count(rng)):
+            rating = min(max(round(rng.gauss(quality, 1.0)), 1), 5)
+            yield {
+                "id": self.uuid("review:%s" % restaurant["id"], index),
+                "restaurant_id": restaurant["id"],
+                "user_id": self.uuid("user", rng.randrange(self.user_count)),
+                "created_at": opened
+                + timedelta(seconds=rng.uniform(0, seconds)),
+                "review": REVIEWS[rating],
+                "rating": rating,
+            }
+
+
+async def truncate(session):
+    params = {"pattern": USERNAME_PREFIX + "%"}
+    async with session.begin():
+        await session.execute(
+            text("TRUNCATE review_stats, reviews, restaurants")
+        )
+        await session.execute(
+            text(
+                "DELETE FROM user_security_scopes WHERE user_id IN "
+                "(SELECT id FROM users WHERE username LIKE :pattern)"
+            ),
+            params,
+        )
+        await session.execute(
+            text("DELETE FROM users WHERE username LIKE :pattern"), params
+        )
+
+
+async def copy_batches(
+    session, table: str, rows: Iterator[Dict], columns: List[str], size
+) -> int:
+    count = 0
+    for batch in batched(rows, size):
+        async with session.begin():
+            await copy_rows(session, table, batch, columns)
+        count += len(batch)
+    return count
+
+
+async def generate_dataset(
+    generator: DatasetGenerator,
+    password: str = "secret",
+    batch_size: int = 50_000,
+):
+    """
+    Writes the users of the generator, with the "users:me" scope, and
+    its restaurants with their reviews. Then rebuilds the review stats
+    and the average ratings, and analyzes the tables.
+    """
+    start = time.perf_counter()
+    async with db.async_session() as session:
+        scopes = get_settings().security_scopes
+        await create_security_scopes(
+            session,
+            [
+                models.SecurityScopeCreate(name=name, description=description)
+                for name, description in scopes.items()
+            ],
+        )
+        async with session.begin():
+            (scope,) = await scope_registry.get(session, ["users:me"])
+
+        hashed_password = get_password_hash(password)
+        users = await copy_batches(
+            session,
+            "users",
+            generator.users(hashed_password),
+            USER_COLUMNS,
+            batch_size,
+        )
+        await copy_batches(
+            session,
+            "user_security_scopes",
+            (
+                {"user_id": user["id"], "security_scope_id": scope.id}
+                for user in generator.users(hashed_password)
+            ),
+            USER_SCOPE_COLUMNS,
+            batch_size,
+        )
+        elapsed = time.perf_counter() - start
+        print("Generated %d users in %.1fs" % (users, elapsed))
+
+        restaurants = reviews = 0
+        for batch in batched(generator.restaurants(), batch_size):
+            restaurants += await copy_batches(
+                session,
+                "restaurants",
+                (restaurant for restaurant, _ in batch),
+                COLUMNS,
+                batch_size,
+            )
+            reviews += await copy_batches(
+                session,
+                "reviews",
+                chain.from_iterable(
+                    generator.reviews(restaurant, quality)
+                    for restaurant, quality in batch
+                ),
+                REVIEW_COLUMNS,
+                batch_size,
+            )
+            elapsed = time.perf_counter() - start
+            print(
+                "Generated %d restaurants and %d reviews in %.1fs"
+                % (restaurants, reviews, elapsed)
+            )
+
+        await rebuild_review_stats(session)
+        async with session.begin():
+            for table in ("users", "restaurants", "reviews", "review_stats"):
+                await session.execute(text("ANALYZE %s" % table))
+        print(
+            "Rebuilt the review stats and analyzed the tables in %.1fs"
+            % (time.perf_counter() - start)
+        )
+        await session.close()
+    return users, restaurants, reviews
+
+
+async def main(args):
+    generator = DatasetGenerator(
+        args.seed,
+        args.restaurants,
+        args.users,
+        args.reviews,
+        args.review_skew,
+        args.countries,
+        args.postcodes,
+        args.area_skew,
+        args.days,
+    )
+    if args.truncate:
+        async with db.async_session() as session:
+            await truncate(session)
+    await generate_dataset(generator, args.password, args.batch_size)
+
+
+def run():
+    args = parse_args()
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(main(args))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+from backend import db
+from backend.restaurants.bulk import (
+    ImportFormat,
+    LoadMethod,
+    batched,
+    iter_items,
+    load_batch,
+    validate_batch,
+)
+
+
+LOGGER = logging.getLogger()
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description="Import restaurants from a JSON or NDJSON file."
+    )
+    parser.add_argument(
+        "path", help="File to import, or '-' to read from the stdin."
+    )
+    parser.add_argument(
+        "--format",
+        type=ImportFormat,
+        choices=list(ImportFormat),
+        default=ImportFormat.auto,
+        help="Default: NDJSON for .ndjson and .jsonl files, else JSON.",
+    )
+    parser.add_argument(
+        "--method",
+        type=LoadMethod,
+        choices=list(LoadMethod),
+        default=LoadMethod.copy,
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=5000,
+        help="Restaurants validated and written per transaction.",
+    )
+    parser.add_argument(
+        "--upsert",
+        action="store_true",
+        help="Update the restaurants that already exist.",
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="Don't report the progress."
+    )
+    return parser.parse_args(args)
+
+
+async def import_restaurants(
+    fp,
+    fmt: ImportFormat = ImportFormat.auto,
+    method: LoadMethod = LoadMethod.copy,
+    batch_size: int = 5000,
+    upsert: bool = False,
+    quiet: bool = False,
+):
+    """
+    Streams the restaurants in `fp` to the database in batches of
+    `batch_size`, each validated and written in a transaction of its
+    own. Invalid restaurants are reported and skipped.
+    Returns the number of restaurants written and of invalid ones.
+    """
+    start = time.perf_counter()
+    written = invalid = position = 0
+    async with db.async_session() as session:
+        for batch in batched(iter_items(fp, fmt), batch_size):
+            rows, errors = validate_batch(batch, position)
+            position += len(batch)
+            for item_position, error in errors:
+                print("Skipped item %d: %s" % (item_position, error))
+            await load_batch(session, rows, method, upsert)
+            written += len(rows)
+            invalid += len(errors)
+            if not quiet:
+                elapsed = time.perf_counter() - start
+                print(
+                    "Imported %d restaurants (%d invalid) in %.1fs, %d/s"
+                    % (written, invalid, elapsed, written / elapsed)
+                )
+        await session.close()
+    return written, invalid
+
+
+def run():
+    args = parse_args()
+    fp = sys.stdin if args.path == "-" else open(args.path)
+    with fp:
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(
+            import_restaurants(
+                fp,
+                args.format,
+                args.method,
+                args.batch_size,
+                args.upsert,
+                args.quiet,
+            )
+        )
+
+
+if __name__ == "__main__":
+    run()
@@ -1,11 +1,8 @@
 import asyncio
-import json
 import logging
 import os.path
 
-from backend import db
-from backend.restaurants import models
-from backend.restaurants.crud import create_restaurant
+from backend.scripts.import_restaurants import import_restaurants
 
 
 LOGGER = logging.getLogger()
@@ -13,12 +10,8 @@ LOGGER = logging.getLogger()
 
 async def populate_restaurants():
     datafile = os.path.join(os.path.dirname(__file__), "restaurants.json")
-    restaurant_list = json.loads(open(datafile).read())
-    for item in restaurant_list:
-        async with db.async_session() as session:
-            input_rest = models.InputRestaurant(**item)
-            await create_restaurant(session, input_rest)
-            print("Created restaurant %s" % item['name'])
+    with open(datafile) as fp:
+        await import_restaurants(fp, upsert=True)
 
 
 def run():
@@ -27,4 +20,4 @@ def run():
 
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
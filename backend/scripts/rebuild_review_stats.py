@@ -0,0 +1,45 @@
+import argparse
+import asyncio
+import logging
+from uuid import UUID
+
+from backend import db
+from backend.reviews.crud import rebuild_review_stats
+
+
+LOGGER = logging.getLogger()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Rebuild the review statistics from the reviews table."
+    )
+    parser.add_argument(
+        "restaurant_ids",
+        metavar="restaurant_id",
+        nargs="*",
+        type=UUID,
+        help="Rebuild only these restaurants (default: all of them).",
+    )
+    return parser.parse_args()
+
+
+async def rebuild(restaurant_ids):
+    async with db.async_session() as session:
+        if not restaurant_ids:
+            count = await rebuild_review_stats(session)
+            print("Rebuilt review stats of %d restaurants" % count)
+        for restaurant_id in restaurant_ids:
+            await rebuild_review_stats(session, restaurant_id)
+            print("Rebuilt review stats of restaurant %s" % restaurant_id)
+        await session.close()
+
+
+def run():
+    args = parse_args()
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(rebuild(args.restaurant_ids))
+
+
+if __name__ == "__main__":
+    run()
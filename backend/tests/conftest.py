@@ -10,14 +10,27 @@ from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.future import select
 from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
 
-from backend.db import Base, get_db
+from backend.db import (
+    Base,
+    get_db,
+    instrument_engine,
+    request_transaction,
+)
 from backend.main import app
+from backend.restaurants.crud import create_restaurant
+from backend.restaurants.leaderboards import leaderboards
+from backend.restaurants.models import InputRestaurant
+from backend.reviews.crud import create_review
+from backend.reviews.models import InputReview
 from backend.users import dbrel as dbrel_users
 from backend.users.auth import get_password_hash
 
 
-engine = create_async_engine(getenv("DATABASE_TEST_URI"))
+USER_ID = "5333fe2a-947f-41ad-ab4b-420eceab1113"  # user_a in the fixtures.
+
+engine = instrument_engine(create_async_engine(getenv("DATABASE_TEST_URI")))
 
 TestSessionLocal = sessionmaker(
     autocommit=False,
@@ -28,10 +41,11 @@ TestSessionLocal = sessionmaker(
 )
 
 
-async def override_get_db():
+async def override_get_db(request: Request):
     try:
         db = TestSessionLocal()
-        yield db
+        async with request_transaction(db, request):
+            yield db
     finally:
         await db.close()
 
@@ -49,6 +63,8 @@ async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
+    # The new database starts the listings' versions over.
+    leaderboards.clear()
     await load_users()
 
 
@@ -110,6 +126,45 @@ async def load_users():
         await db.close()
 
 
+def auth_headers(*scopes: str, username: str = "sadmin"):
+    token = AuthJWT().create_access_token(
+        subject=username, user_claims={"scopes": list(scopes)}
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def with_session(crud_func, *args):
+    """
+    Runs the CRUD function in a session of its own, as each request does.
+    """
+    async with TestSessionLocal() as db:
+        return await crud_func(db, *args)
+
+
+async def add_restaurant():
+    return await with_session(
+        create_restaurant,
+        InputRestaurant(
+            name="Gasthof Hotel Zur Post",
+            description="Bavarian cuisine.",
+            country="DE",
+            postal_code="82211",
+            address="Andechsstrasse 1",
+            webpage="https://post-herrsching.de/",
+            phone_number="08152 - 396 27 0",
+        ),
+    )
+
+
+async def add_review(restaurant_id, rating: int):
+    return await with_session(
+        create_review,
+        restaurant_id,
+        USER_ID,
+        InputReview(review=f"{rating} stars", rating=rating),
+    )
+
+
 @pytest.fixture
 async def access_token():
     await load_users()
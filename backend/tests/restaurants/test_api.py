@@ -0,0 +1,172 @@
+import pytest
+from httpx import AsyncClient
+from starlette import status
+
+from backend.config import get_settings
+from backend.main import app
+from backend.restaurants import crud
+from backend.restaurants.cache import detail_cache
+from backend.tests.conftest import add_restaurant, add_review, auth_headers
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_restaurant_detail_cache_is_invalidated(init_db) -> None:
+    restaurant = await add_restaurant()
+    url = f"/api/v1/restaurant/{restaurant.id}"
+    headers = auth_headers("users:me", "users:write")
+    stats = detail_cache.stats
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        first = await ac.get(url, headers=headers)
+        hits = stats.hits
+        second = await ac.get(url, headers=headers)
+        assert first.status_code == second.status_code == status.HTTP_200_OK
+        assert second.json() == first.json()
+        assert stats.hits == hits + 1
+
+        await ac.post(
+            f"/api/v1/review/{restaurant.id}",
+            json={"review": "Tasty", "rating": 4},
+            headers=headers,
+        )
+        response = await ac.get(url, headers=headers)
+        assert response.json()["review_count"] == 1
+        assert response.json()["data"]["avg_rating"] == 4.0
+
+        await ac.put(
+            url,
+            json={**first.json()["data"], "name": "Zur Post"},
+            headers=headers,
+        )
+        response = await ac.get(url, headers=headers)
+        assert response.json()["data"]["name"] == "Zur Post"
+
+    # Restaurants with reviews can't be deleted, take another one.
+    restaurant = await add_restaurant()
+    url = f"/api/v1/restaurant/{restaurant.id}"
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get(url, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        await ac.delete(url, headers=headers)
+        response = await ac.get(url, headers=headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+async def test_restaurant_detail_read_before_a_write_is_not_cached(
+    init_db, monkeypatch
+) -> None:
+    restaurant = await add_restaurant()
+    url = f"/api/v1/restaurant/{restaurant.id}"
+    headers = auth_headers("users:me")
+    get_restaurant_detail = crud.get_restaurant_detail
+
+    async def read_then_write(db, restaurant_id):
+        detail = await get_restaurant_detail(db, restaurant_id)
+        # A review is added once the miss read the old detail.
+        await add_review(restaurant.id, 4)
+        await detail_cache.invalidate(str(restaurant_id))
+        return detail
+
+    monkeypatch.setattr(crud, "get_restaurant_detail", read_then_write)
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get(url, headers=headers)
+        assert response.json()["review_count"] == 0
+        monkeypatch.undo()
+
+        response = await ac.get(url, headers=headers)
+        assert response.json()["review_count"] == 1
+
+    assert await detail_cache.get(str(restaurant.id)) is not None
+
+
+async def test_first_write_changes_the_listings_etag(init_db) -> None:
+    # The version sequence of the new database was never used.
+    headers = auth_headers("users:me")
+    url = "/api/v1/restaurants"
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get(url, headers=headers)
+        etag = response.headers["ETag"]
+
+        await add_restaurant()
+        response = await ac.get(
+            url, headers={**headers, "If-None-Match": etag}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"] != etag
+
+
+async def test_restaurant_listings_answer_not_modified(init_db) -> None:
+    restaurant = await add_restaurant()
+    headers = auth_headers("users:me", "users:write")
+    urls = [
+        "/api/v1/restaurants",
+        "/api/v1/restaurants/DE/82211",
+        f"/api/v1/restaurant/{restaurant.id}",
+    ]
+
+    async def get_all(etags=None):
+        responses = []
+        for url in urls:
+            extra = {"If-None-Match": etags[url]} if etags else {}
+            responses.append(await ac.get(url, headers={**headers, **extra}))
+        return responses
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        responses = await get_all()
+        assert all(r.status_code == status.HTTP_200_OK for r in responses)
+        etags = {url: r.headers["ETag"] for url, r in zip(urls, responses)}
+        assert all(etag.startswith('W/"') for etag in etags.values())
+
+        responses = await get_all(etags)
+        assert all(
+            r.status_code == status.HTTP_304_NOT_MODIFIED for r in responses
+        )
+        assert [r.headers["ETag"] for r in responses] == list(etags.values())
+
+        # A review changes the rating, so all of them.
+        await ac.post(
+            f"/api/v1/review/{restaurant.id}",
+            json={"review": "Tasty", "rating": 4},
+            headers=headers,
+        )
+        responses = await get_all(etags)
+        assert all(r.status_code == status.HTTP_200_OK for r in responses)
+        etags = {url: r.headers["ETag"] for url, r in zip(urls, responses)}
+
+        # So does an update.
+        await ac.put(
+            urls[2],
+            json={**responses[2].json()["data"], "name": "Zur Post"},
+            headers=headers,
+        )
+        responses = await get_all(etags)
+        assert all(r.status_code == status.HTTP_200_OK for r in responses)
+
+
+async def test_fast_json_lists_match_the_orm_lists(
+    init_db, monkeypatch
+) -> None:
+    restaurants = [await add_restaurant() for _ in range(3)]
+    await add_review(restaurants[0].id, 4)
+    await add_review(restaurants[0].id, 5)
+    headers = auth_headers("users:me")
+    urls = [
+        "/api/v1/restaurants?limit=2",
+        "/api/v1/restaurants/DE/82211?name=post",
+        f"/api/v1/reviews/{restaurants[0].id}",
+    ]
+
+    settings = get_settings()
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        orm = [await ac.get(url, headers=headers) for url in urls]
+        monkeypatch.setattr(settings, "fast_json_responses", True)
+        fast = [await ac.get(url, headers=headers) for url in urls]
+
+    for orm_response, fast_response in zip(orm, fast):
+        assert fast_response.status_code == status.HTTP_200_OK
+        assert fast_response.headers["ETag"] == orm_response.headers["ETag"]
+        assert fast_response.json() == orm_response.json()
+    assert orm[0].json()["data"][0]["avg_rating"] == 4.5
+    assert orm[0].json()["next_cursor"] is not None
@@ -0,0 +1,115 @@
+import io
+import json
+
+import pytest
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from backend.restaurants import bulk, dbrel
+from backend.restaurants.cache import detail_cache
+from backend.restaurants.crud import create_restaurant
+from backend.restaurants.models import InputRestaurant
+from backend.tests.conftest import TestSessionLocal
+
+
+ITEMS = [
+    {
+        "name": "Gasthof Hotel Zur Post",
+        "description": "Bavarian cuisine, [beer] and \"more\".",
+        "country": "DE",
+        "postal_code": "82211",
+        "address": "Andechsstrasse 1",
+        "webpage": "https://post-herrsching.de/",
+        "phone_number": "08152 - 396 27 0",
+    },
+    {
+        "name": "Casa Lucio",
+        "description": "Huevos rotos.",
+        "country": "ES",
+        "postal_code": "28005",
+        "address": "Calle Cava Baja 35",
+        "webpage": "https://casalucio.es/",
+        "phone_number": "913 65 32 52",
+    },
+]
+
+
+def test_iter_json_array_reads_items_across_chunks() -> None:
+    fp = io.StringIO(json.dumps(ITEMS, indent=4))
+    assert list(bulk.iter_json_array(fp, chunk_size=7)) == ITEMS
+    assert list(bulk.iter_json_array(io.StringIO(" [ ] "))) == []
+
+
+def test_iter_json_array_rejects_other_documents() -> None:
+    with pytest.raises(ValueError):
+        list(bulk.iter_json_array(io.StringIO(json.dumps(ITEMS[0]))))
+    with pytest.raises(ValueError):
+        list(bulk.iter_json_array(io.StringIO(json.dumps(ITEMS)[:-1])))
+
+
+def test_iter_items_reads_ndjson() -> None:
+    fp = io.StringIO("\n".join(map(json.dumps, ITEMS)) + "\n\n")
+    assert list(bulk.iter_items(fp, bulk.ImportFormat.ndjson)) == ITEMS
+
+
+def test_validate_batch_reports_invalid_items() -> None:
+    invalid = {**ITEMS[1], "country": "Spain"}
+    too_long = {**ITEMS[1], "name": "x" * 51}
+    rows, errors = bulk.validate_batch(
+        [ITEMS[0], invalid, {}, too_long], first=10
+    )
+    assert [row["name"] for row in rows] == [ITEMS[0]["name"]]
+    assert [position for position, _ in errors] == [11, 12, 13]
+    assert errors[-1][1] == "name is longer than 50 characters"
+    # Ids are derived from the restaurant, so imports are repeatable.
+    again, _ = bulk.validate_batch([ITEMS[0]])
+    assert again[0]["id"] == rows[0]["id"]
+    assert rows[0]["id"].version == 4
+
+
+async def count_restaurants(db):
+    async with db.begin():
+        result = await db.execute(select(func.count(dbrel.Restaurant.id)))
+        return result.scalar_one()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("method", list(bulk.LoadMethod))
+async def test_load_batch_upserts(init_db, method) -> None:
+    rows, _ = bulk.validate_batch(ITEMS)
+    renamed, _ = bulk.validate_batch([{**ITEMS[0], "webpage": "https://x"}])
+    async with TestSessionLocal() as db:
+        await bulk.load_batch(db, rows, method)
+        await bulk.load_batch(db, renamed + renamed, method, upsert=True)
+        assert await count_restaurants(db) == 2
+        async with db.begin():
+            result = await db.execute(
+                select(dbrel.Restaurant.webpage).where(
+                    dbrel.Restaurant.id == rows[0]["id"]
+                )
+            )
+            assert result.scalar_one() == "https://x"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("method", list(bulk.LoadMethod))
+async def test_load_batch_upserts_restaurants_with_random_ids(
+    init_db, method
+) -> None:
+    async with TestSessionLocal() as db:
+        existing = await create_restaurant(db, InputRestaurant(**ITEMS[0]))
+    rows, _ = bulk.validate_batch([{**ITEMS[0], "webpage": "https://x"}])
+    assert rows[0]["id"] != existing.id
+    await detail_cache.set(str(existing.id), b"{}")
+
+    async with TestSessionLocal() as db:
+        await bulk.load_batch(db, rows, method, upsert=True)
+        assert await count_restaurants(db) == 1
+        assert await detail_cache.get(str(existing.id)) is None
+        async with db.begin():
+            result = await db.execute(
+                select(dbrel.Restaurant.webpage).where(
+                    dbrel.Restaurant.id == existing.id
+                )
+            )
+            assert result.scalar_one() == "https://x"
@@ -0,0 +1,27 @@
+from types import SimpleNamespace
+
+from backend.restaurants.crud import dedupe_highlights
+
+
+def review(review_id: int):
+    return SimpleNamespace(id=review_id)
+
+
+def test_dedupe_highlights_without_reviews() -> None:
+    assert dedupe_highlights(0, None, None, None) == (None, None, None)
+
+
+def test_dedupe_highlights_with_one_review_keeps_last_only() -> None:
+    rev = review(1)
+    assert dedupe_highlights(1, rev, rev, rev) == (None, None, rev)
+
+
+def test_dedupe_highlights_drops_last_when_best_or_worst() -> None:
+    best, worst = review(1), review(2)
+    assert dedupe_highlights(2, best, worst, best) == (best, worst, None)
+    assert dedupe_highlights(2, best, worst, worst) == (best, worst, None)
+
+
+def test_dedupe_highlights_drops_worst_when_same_as_best() -> None:
+    best, last = review(1), review(2)
+    assert dedupe_highlights(3, best, best, last) == (best, None, last)
@@ -0,0 +1,231 @@
+from decimal import Decimal
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event, insert
+from sqlalchemy.exc import IntegrityError
+from starlette import status
+
+from backend import db
+from backend.main import app
+from backend.restaurants import dbrel
+from backend.restaurants.leaderboards import Leaderboards, leaderboards
+from backend.restaurants.versions import get_restaurants_version
+from backend.tests.conftest import (
+    add_restaurant,
+    add_review,
+    auth_headers,
+    engine,
+    with_session,
+)
+
+
+pytestmark = pytest.mark.asyncio
+
+
+def row(rating: str, area=("DE", "82211")):
+    country, postal_code = area
+    return {
+        "id": uuid4(),
+        "avg_rating": Decimal(rating),
+        "country": country,
+        "postal_code": postal_code,
+    }
+
+
+def ratings(board):
+    return [str(row["avg_rating"]) for row in board.rows]
+
+
+def test_leaderboards_apply_writes_in_order() -> None:
+    boards = Leaderboards(size=4, max_areas=1)
+    rows = [row("4.5"), row("4.0"), row("3.5"), row("3.0")]
+    board = boards.add(1, None, list(rows))
+    assert not board.complete and board.count is None
+
+    # A new rating moves the restaurant up, the others keep their place.
+    changed = {**rows[3], "avg_rating": Decimal("5.0")}
+    boards.apply(2, [changed["id"]], [changed])
+    assert boards.get(2, None) is board
+    assert ratings(board) == ["5.0", "4.5", "4.0", "3.5"]
+    assert board.index_after((Decimal("4.5"), rows[0]["id"])) == 2
+
+    # Below the last row, the restaurant may not come next, so it's left
+    # out, and the board that lost too many rows is dropped.
+    changed = {**rows[0], "avg_rating": Decimal("1.0")}
+    boards.apply(3, [changed["id"]], [changed])
+    assert ratings(board) == ["5.0", "4.0", "3.5"]
+    assert boards.get(3, None) is board
+    changed = {**rows[1], "avg_rating": Decimal("1.0")}
+    boards.apply(4, [changed["id"]], [changed])
+    assert boards.get(4, None) is None
+
+    # A restaurant that moved counts in its new area only.
+    area_board = boards.add(4, ("DE", "82211"), list(rows))
+    area_board.count = 5
+    moved = {**rows[0], "country": "US", "postal_code": "10001"}
+    boards.apply(5, [moved["id"]], [moved], ("DE", "82211"))
+    assert area_board.count == 4
+    assert ratings(area_board) == ["4.0", "3.5", "3.0"]
+
+    # Boards that missed a version are dropped.
+    boards.apply(7, [moved["id"]], [moved])
+    assert boards.get(7, ("DE", "82211")) is None
+
+    # The least recently listed areas make room for the others.
+    boards.add(8, ("DE", "82211"), [])
+    boards.add(8, ("US", "10001"), [])
+    boards.add(8, None, [])
+    assert boards.get(8, ("DE", "82211")) is None
+    assert boards.get(8, ("US", "10001")).complete
+
+
+async def get_pages(ac: AsyncClient, urls):
+    headers = auth_headers("users:me")
+    pages = []
+    for url in urls:
+        response = await ac.get(url, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        pages.append(response.json())
+    return pages
+
+
+async def test_leaderboards_serve_the_listing_pages(
+    init_db, monkeypatch
+) -> None:
+    monkeypatch.setattr(leaderboards, "size", 4)
+    restaurants = [await add_restaurant() for _ in range(6)]
+    for restaurant, rating in zip(restaurants, [5, 3, 4, 1, 2]):
+        await add_review(restaurant.id, rating)
+    urls = [
+        "/api/v1/restaurants?limit=2",
+        "/api/v1/restaurants?offset=2&limit=2&count=estimate",
+        "/api/v1/restaurants?offset=3&limit=2",
+        "/api/v1/restaurants/DE/82211?limit=4&count=none",
+        "/api/v1/restaurants/DE/82211?limit=3",
+        "/api/v1/restaurants/US/10001",
+        "/api/v1/restaurants/DE/82211?name=post",
+    ]
+    writer = auth_headers("users:me", "users:write")
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        pages = await get_pages(ac, urls)
+        assert pages[0]["count"] == 6
+        cursor = pages[0]["next_cursor"]
+        urls.append(f"/api/v1/restaurants?limit=2&cursor={cursor}")
+
+        # Loaded, the first pages only read the version of the listings.
+        stats = db.QueryStats()
+        token = db.query_stats.set(stats)
+        try:
+            assert await get_pages(ac, urls[:1]) == pages[:1]
+        finally:
+            db.query_stats.reset(token)
+        assert stats.statements == 1
+
+        # Writes that change a rating update the leaderboards.
+        response = await ac.post(
+            f"/api/v1/review/{restaurants[3].id}",
+            json={"review": "Much better", "rating": 5},
+            headers=writer,
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        url = f"/api/v1/restaurant/{restaurants[1].id}"
+        response = await ac.get(url, headers=writer)
+        response = await ac.put(
+            url,
+            json={
+                **response.json()["data"],
+                "country": "US",
+                "postal_code": "10001",
+            },
+            headers=writer,
+        )
+        assert response.status_code == status.HTTP_200_OK
+        version = await with_session(get_restaurants_version)
+        assert leaderboards.get(version, None) is not None
+        assert leaderboards.get(version, ("DE", "82211")) is not None
+
+        pages = await get_pages(ac, urls)
+        assert pages[4]["count"] == 5
+        assert pages[5]["count"] == 1
+
+        # The same pages, from the queries.
+        monkeypatch.setattr(leaderboards, "size", 0)
+        queried = await get_pages(ac, urls)
+        # The planner estimate, the leaderboard gave the exact count.
+        queried[1]["count"] = pages[1]["count"]
+        assert queried == pages
+
+
+async def page_through(ac: AsyncClient, url: str):
+    pages = await get_pages(ac, [url])
+    while pages[-1]["next_cursor"]:
+        cursor = pages[-1]["next_cursor"]
+        pages += await get_pages(ac, [f"{url}&cursor={cursor}"])
+    return pages
+
+
+async def test_listings_rank_unrated_restaurants_last(
+    init_db, monkeypatch
+) -> None:
+    monkeypatch.setattr(leaderboards, "size", 4)
+    restaurants = [await add_restaurant() for _ in range(3)]
+    await add_review(restaurants[0].id, 4)
+    writer = auth_headers("users:me", "users:write")
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        # Updated without a rating, the restaurant has none.
+        url = f"/api/v1/restaurant/{restaurants[1].id}"
+        response = await ac.get(url, headers=writer)
+        data = {**response.json()["data"], "avg_rating": None}
+        response = await ac.put(url, json=data, headers=writer)
+        assert response.status_code == status.HTTP_200_OK
+        # A new rating, ranked among them in the leaderboards.
+        response = await ac.post(
+            f"/api/v1/review/{restaurants[2].id}",
+            json={"review": "Great", "rating": 5},
+            headers=writer,
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+
+        urls = [
+            "/api/v1/restaurants?limit=1",
+            "/api/v1/restaurants/DE/82211?limit=1",
+        ]
+        pages = [await page_through(ac, url) for url in urls]
+        listed = [page["data"][0] for page in pages[0][:3]]
+        assert [r["avg_rating"] for r in listed] == [5, 4, None]
+        assert pages[1] == pages[0]
+        version = await with_session(get_restaurants_version)
+        assert leaderboards.get(version, None) is not None
+
+        # The same pages, from the queries.
+        monkeypatch.setattr(leaderboards, "size", 0)
+        assert [await page_through(ac, url) for url in urls] == pages
+
+
+async def test_writes_bump_the_version_in_their_transaction(init_db) -> None:
+    commits = []
+
+    def record(conn):
+        commits.append(conn)
+
+    event.listen(engine.sync_engine, "commit", record)
+    try:
+        restaurant = await add_restaurant()
+        await add_review(restaurant.id, 4)
+    finally:
+        event.remove(engine.sync_engine, "commit", record)
+    assert len(commits) == 2
+    assert await with_session(get_restaurants_version) == 2
+
+    async def add_version(session):
+        async with session.begin():
+            await session.execute(
+                insert(dbrel.restaurants_version).values(version=0)
+            )
+
+    with pytest.raises(IntegrityError):
+        await with_session(add_version)
@@ -0,0 +1,95 @@
+import pytest
+from sqlalchemy import text
+
+from backend.restaurants import search
+from backend.restaurants.crud import create_restaurant, find_restaurants
+from backend.restaurants.models import InputRestaurant
+from backend.restaurants.search import escape_like
+from backend.tests.conftest import add_review, engine, with_session
+
+
+def test_escape_like_escapes_wildcards() -> None:
+    assert escape_like("100%_fun") == "100\\%\\_fun"
+    assert escape_like("back\\slash") == "back\\\\slash"
+    assert escape_like("Zur Post") == "Zur Post"
+
+
+async def add_restaurants(*names_and_ratings):
+    """
+    Adds restaurants in the same area, with a review of the given rating.
+    """
+    for name, rating in names_and_ratings:
+        restaurant = await with_session(
+            create_restaurant,
+            InputRestaurant(
+                name=name,
+                description="Bavarian cuisine.",
+                country="DE",
+                postal_code="82211",
+                address="Andechsstrasse 1",
+                webpage="",
+                phone_number="",
+            ),
+        )
+        await add_review(restaurant.id, rating)
+
+
+async def search_names(name: str, ranked: bool):
+    restaurants, count = await with_session(
+        find_restaurants, "DE", "82211", name, 0, 10, None, "exact", ranked
+    )
+    assert count == len(restaurants)
+    return [restaurant.name for restaurant in restaurants]
+
+
+@pytest.mark.asyncio
+async def test_ranked_search_puts_prefix_matches_first(
+    init_db, monkeypatch
+) -> None:
+    monkeypatch.setattr(search, "_trigram_available", False)
+    await add_restaurants(
+        ("Gasthof Hotel Zur Post", 5),
+        ("Post Office Diner", 4),
+        ("Post", 3),
+        ("Seehof", 5),
+    )
+
+    assert await search_names("post", ranked=False) == [
+        "Gasthof Hotel Zur Post",
+        "Post Office Diner",
+        "Post",
+    ]
+    assert await search_names("post", ranked=True) == [
+        "Post Office Diner",
+        "Post",
+        "Gasthof Hotel Zur Post",
+    ]
+    assert await search_names("50%", ranked=True) == []
+
+
+@pytest.mark.asyncio
+async def test_ranked_search_orders_by_trigram_similarity(
+    init_db, monkeypatch
+) -> None:
+    async with engine.connect() as conn:
+        available = await conn.scalar(
+            text(
+                "SELECT count(*) FROM pg_available_extensions "
+                "WHERE name = 'pg_trgm'"
+            )
+        )
+    if not available:
+        pytest.skip("The pg_trgm extension is not available.")
+    monkeypatch.setattr(search, "_trigram_available", None)
+    await add_restaurants(
+        ("Gasthof Hotel Zur Post", 5),
+        ("Post Office Diner", 4),
+        ("Post", 3),
+    )
+
+    assert await search_names("post", ranked=True) == [
+        "Post",
+        "Post Office Diner",
+        "Gasthof Hotel Zur Post",
+    ]
+    assert search._trigram_available
@@ -0,0 +1,179 @@
+import asyncio
+import uuid
+from decimal import ROUND_HALF_UP, Decimal
+
+import pytest
+from fastapi_jwt_auth import AuthJWT
+from httpx import AsyncClient
+from starlette import status
+
+from backend.main import app
+from backend.restaurants.crud import (
+    get_restaurant_by_id,
+    get_restaurant_detail,
+)
+from backend.reviews import crud
+from backend.tests.conftest import (
+    add_restaurant,
+    add_review,
+    auth_headers,
+    with_session,
+)
+
+
+pytestmark = pytest.mark.asyncio
+
+
+def user_a_headers():
+    return auth_headers("users:me", username="user_a")
+
+
+async def test_concurrent_reviews_keep_avg_rating_exact(init_db) -> None:
+    restaurant = await add_restaurant()
+
+    ratings = [5, 4, 4, 1, 3, 5, 2, 4] * 10
+    headers = user_a_headers()
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        responses = await asyncio.gather(
+            *[
+                ac.post(
+                    f"/api/v1/review/{restaurant.id}",
+                    json={"review": "Concurrent review", "rating": rating},
+                    headers=headers,
+                )
+                for rating in ratings
+            ]
+        )
+    assert all(
+        response.status_code == status.HTTP_201_CREATED
+        for response in responses
+    )
+
+    expected = (Decimal(sum(ratings)) / len(ratings)).quantize(
+        Decimal("0.1"), rounding=ROUND_HALF_UP
+    )
+    db_restaurant = await with_session(get_restaurant_by_id, restaurant.id)
+    assert db_restaurant.avg_rating == expected
+
+
+async def test_batch_of_reviews_reports_invalid_items(init_db) -> None:
+    first, second = await add_restaurant(), await add_restaurant()
+    await add_review(first.id, 3)
+
+    items = [
+        {"restaurant_id": str(first.id), "review": "Good", "rating": 4},
+        {"restaurant_id": str(first.id), "review": "Great", "rating": 5},
+        {"restaurant_id": str(first.id), "review": "", "rating": 2},
+        {"restaurant_id": str(uuid.uuid4()), "review": "Who?", "rating": 1},
+        {"restaurant_id": str(second.id), "review": "Bad", "rating": 1},
+        {"restaurant_id": str(second.id), "review": "Fine", "rating": 3},
+        "not a review",
+    ]
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.post(
+            "/api/v1/reviews", json=items, headers=user_a_headers()
+        )
+    assert response.status_code == status.HTTP_200_OK
+    result = response.json()
+    assert [review["review"] for review in result["data"]] == [
+        "Good",
+        "Great",
+        "Bad",
+        "Fine",
+    ]
+    assert [error["index"] for error in result["errors"]] == [2, 3, 6]
+
+    assert await with_session(crud.count_reviews, first.id) == 3
+    detail = await with_session(get_restaurant_detail, first.id)
+    assert str(detail["best_review"].id) == result["data"][1]["id"]
+    assert detail["last_review"] is None  # It is the best review.
+    assert detail["data"].avg_rating == Decimal("4.0")
+
+    detail = await with_session(get_restaurant_detail, second.id)
+    assert detail["review_count"] == 2
+    assert str(detail["worst_review"].id) == result["data"][2]["id"]
+    assert detail["data"].avg_rating == Decimal("2.0")
+
+
+async def test_batch_of_reviews_keeps_the_order_of_the_items(
+    init_db,
+) -> None:
+    restaurant = await add_restaurant()
+    ratings = [4, 4, 2, 2, 3]
+    items = [
+        {"restaurant_id": str(restaurant.id), "review": "Same", "rating": r}
+        for r in ratings
+    ]
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.post(
+            "/api/v1/reviews", json=items, headers=user_a_headers()
+        )
+        ids = [review["id"] for review in response.json()["data"]]
+        response = await ac.get(
+            f"/api/v1/reviews/{restaurant.id}", headers=user_a_headers()
+        )
+    assert [review["id"] for review in response.json()["data"]] == ids[::-1]
+
+    # The newest review wins the ties, as when the stats are rebuilt.
+    before = await with_session(get_restaurant_detail, restaurant.id)
+    assert await with_session(crud.rebuild_review_stats) == 1
+    after = await with_session(get_restaurant_detail, restaurant.id)
+    for key, index in [
+        ("best_review", 1),
+        ("worst_review", 3),
+        ("last_review", 4),
+    ]:
+        assert str(before[key].id) == str(after[key].id) == ids[index]
+
+
+async def test_batch_of_reviews_of_a_deleted_user(init_db) -> None:
+    restaurant = await add_restaurant()
+    token = AuthJWT().create_access_token(
+        subject="deleted",
+        user_claims={"scopes": ["users:me"], "uid": str(uuid.uuid4())},
+    )
+    items = [
+        {"restaurant_id": str(restaurant.id), "review": "Good", "rating": 4},
+        {"restaurant_id": str(restaurant.id), "review": "", "rating": 4},
+    ]
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.post(
+            "/api/v1/reviews",
+            json=items,
+            headers={"Authorization": f"Bearer {token}"},
+        )
+    assert response.status_code == status.HTTP_200_OK
+    result = response.json()
+    assert result["data"] == []
+    assert [error["index"] for error in result["errors"]] == [0, 1]
+    assert "not found" in result["errors"][0]["detail"]
+
+
+async def test_review_listing_answers_not_modified(init_db) -> None:
+    first, second = await add_restaurant(), await add_restaurant()
+    await add_review(first.id, 3)
+    url = f"/api/v1/reviews/{first.id}"
+    headers = user_a_headers()
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get(url, headers=headers)
+        etag = response.headers["ETag"]
+        response = await ac.get(
+            url, headers={**headers, "If-None-Match": etag}
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        # Reviews of other restaurants don't change the listing.
+        await add_review(second.id, 5)
+        response = await ac.get(
+            url, headers={**headers, "If-None-Match": etag}
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        await add_review(first.id, 5)
+        response = await ac.get(
+            url, headers={**headers, "If-None-Match": etag}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["count"] == 2
+        assert response.headers["ETag"] != etag
@@ -0,0 +1,85 @@
+import pytest
+from sqlalchemy import event
+
+from backend.restaurants.cache import detail_cache
+from backend.restaurants.crud import get_restaurant_detail
+from backend.reviews import crud
+from backend.reviews.models import InputBatchReview
+from backend.tests.conftest import (
+    USER_ID,
+    add_restaurant,
+    add_review,
+    engine,
+    with_session,
+)
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_create_review_updates_review_stats(init_db) -> None:
+    restaurant = await add_restaurant()
+    worst = await add_review(restaurant.id, 1)
+    best = await add_review(restaurant.id, 5)
+    last = await add_review(restaurant.id, 3)
+
+    assert await with_session(crud.count_reviews, restaurant.id) == 3
+    assert await with_session(crud.count_reviews, restaurant.id, 5) == 1
+    assert await with_session(crud.count_reviews, restaurant.id, 2) == 0
+
+    detail = await with_session(get_restaurant_detail, restaurant.id)
+    assert detail["review_count"] == 3
+    assert detail["best_review"].id == best.id
+    assert detail["worst_review"].id == worst.id
+    assert detail["last_review"].id == last.id
+
+
+async def test_rebuild_review_stats_matches_write_path(init_db) -> None:
+    restaurant = await add_restaurant()
+    for rating in (4, 2, 4, 5):
+        await add_review(restaurant.id, rating)
+
+    before = await with_session(get_restaurant_detail, restaurant.id)
+    await detail_cache.set(str(restaurant.id), b"{}")
+    assert await with_session(crud.rebuild_review_stats) == 1
+    assert await detail_cache.get(str(restaurant.id)) is None
+    after = await with_session(get_restaurant_detail, restaurant.id)
+
+    assert after["review_count"] == before["review_count"] == 4
+    for key in ("best_review", "worst_review", "last_review"):
+        assert getattr(after[key], "id", None) == getattr(
+            before[key], "id", None
+        )
+    assert after["best_review"].rating == 5
+    assert after["last_review"] is None  # It's the best review too.
+    assert after["data"].avg_rating == before["data"].avg_rating
+
+
+async def test_batch_of_reviews_locks_rows_for_key_share(init_db) -> None:
+    restaurants = [await add_restaurant() for _ in range(2)]
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        await with_session(
+            crud.create_reviews,
+            USER_ID,
+            [
+                InputBatchReview(
+                    restaurant_id=restaurant.id, review="Good", rating=4
+                )
+                for restaurant in restaurants
+            ],
+        )
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+    # The rows can't be deleted meanwhile, but other reviews can lock
+    # them too, and the restaurants are locked in a fixed order.
+    locks = [statement for statement in statements if " FOR " in statement]
+    assert len(locks) == 2
+    assert all(lock.rstrip().endswith("FOR KEY SHARE") for lock in locks)
+    assert "ORDER BY restaurants.id" in locks[1]
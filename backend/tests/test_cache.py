@@ -0,0 +1,149 @@
+import asyncio
+import fnmatch
+import time
+
+import pytest
+
+from backend.cache import MemoryCache, RedisCache
+
+
+pytestmark = pytest.mark.asyncio
+
+
+class RedisStandIn:
+    """The part of the `redis.asyncio.Redis` API used by `RedisCache`."""
+
+    def __init__(self):
+        self.data = {}
+        self.fail = False
+
+    async def get(self, key):
+        if self.fail:
+            raise ConnectionError("Redis is down")
+        return self.data.get(key)
+
+    async def mget(self, *keys):
+        return [await self.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def incr(self, key):
+        self.data[key] = self.data.get(key, 0) + 1
+        return self.data[key]
+
+    async def scan_iter(self, match):
+        for key in list(self.data):
+            if fnmatch.fnmatchcase(key, match):
+                yield key
+
+
+async def test_memory_cache_evicts_least_recently_used() -> None:
+    # Each entry takes 6 bytes: a 5 bytes key ("ns:" + 2) plus the value.
+    cache = MemoryCache("ns", max_bytes=13)
+    await cache.set("k1", b"1")
+    await cache.set("k2", b"2")
+    assert await cache.get("k1") == b"1"
+    await cache.set("k3", b"3")
+
+    assert await cache.get("k2") is None
+    assert await cache.get("k1") == b"1"
+    assert await cache.get("k3") == b"3"
+    assert cache.info() == {
+        "hits": 3,
+        "misses": 1,
+        "invalidations": 0,
+        "evictions": 1,
+        "errors": 0,
+        "entries": 2,
+        "bytes": 12,
+    }
+
+
+async def test_memory_cache_invalidate_and_ttl(monkeypatch) -> None:
+    cache = MemoryCache("ns", max_bytes=1024, ttl=10)
+    await cache.set("k1", b"1")
+    await cache.set("k2", b"2")
+    await cache.invalidate("k1")
+    assert await cache.get("k1") is None
+
+    now = time.monotonic()
+    monkeypatch.setattr("backend.cache.time.monotonic", lambda: now + 11)
+    assert await cache.get("k2") is None
+    assert cache.info()["bytes"] == 0
+
+
+async def test_redis_cache_misses_when_the_server_fails() -> None:
+    client = RedisStandIn()
+    cache = RedisCache("ns", client, ttl=60)
+    await cache.set("k1", b"1")
+    assert client.data == {"ns:k1": b"1"}
+    assert await cache.get("k1") == b"1"
+
+    client.fail = True
+    assert await cache.get("k1") is None
+    assert cache.info()["errors"] == 1
+
+    await cache.invalidate("k1")
+    assert "ns:k1" not in client.data
+
+
+async def test_cache_invalidates_all_the_keys_of_its_namespace() -> None:
+    client = RedisStandIn()
+    cache = RedisCache("ns", client)
+    await cache.set("k1", b"1")
+    await cache.set("k2", b"2")
+    client.data["other:k1"] = b"1"
+    await cache.invalidate_all()
+    assert [key for key in client.data if ":" in key] == ["other:k1"]
+
+    cache = MemoryCache("ns", max_bytes=1024)
+    await cache.set("k1", b"1")
+    await cache.invalidate_all()
+    assert await cache.get("k1") is None
+    assert cache.info()["bytes"] == 0
+
+
+async def test_cache_invalidates_again_after_replica_lag() -> None:
+    cache = MemoryCache("ns", max_bytes=1024)
+    cache.reinvalidate_after = 0.05
+    await cache.set("k1", b"1")
+    await cache.invalidate("k1")
+    assert await cache.get("k1") is None
+
+    # Filled by a read from a replica that had not replayed the write.
+    await cache.set("k1", b"stale")
+    await asyncio.sleep(0.1)
+    assert await cache.get("k1") is None
+    assert cache.stats.invalidations == 1
+
+
+async def test_cache_drops_a_fill_read_before_an_invalidation() -> None:
+    for cache in (
+        MemoryCache("ns", max_bytes=1024),
+        RedisCache("ns", RedisStandIn()),
+    ):
+        generation = await cache.generation("k1")
+        await cache.set("k1", b"1", generation)
+        assert await cache.get("k1") == b"1"
+
+        # A write invalidates the key while a miss reads it.
+        generation = await cache.generation("k1")
+        await cache.invalidate("k1")
+        await cache.set("k1", b"stale", generation)
+        assert await cache.get("k1") is None
+
+        generation = await cache.generation("k1")
+        await cache.invalidate_all()
+        await cache.set("k1", b"stale", generation)
+        assert await cache.get("k1") is None
+
+        # Other keys' invalidations don't drop it.
+        generation = await cache.generation("k1")
+        await cache.invalidate("k2")
+        await cache.set("k1", b"2", generation)
+        assert await cache.get("k1") == b"2"
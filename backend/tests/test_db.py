@@ -0,0 +1,92 @@
+import asyncio
+from os import getenv
+
+import pytest
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+from backend.config import get_settings
+from backend.db import (
+    create_engine,
+    pool_status,
+    request_transaction,
+    transaction,
+)
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_pool_records_checkout_waits(monkeypatch) -> None:
+    settings = get_settings()
+    monkeypatch.setattr(settings, "db_pool_size", 1)
+    monkeypatch.setattr(settings, "db_max_overflow", 0)
+    monkeypatch.setattr(settings, "db_pool_timeout", 0.2)
+    engine = create_engine(getenv("DATABASE_TEST_URI"))
+
+    async def query(seconds: float):
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT pg_sleep(:s)"), {"s": seconds})
+
+    try:
+        # The second query waits for the connection of the first one.
+        await asyncio.gather(query(0.1), query(0))
+        async with engine.connect():
+            status = pool_status(engine)
+            assert status["size"] == 1
+            assert status["checked_out"] == 1
+            assert status["overflow"] == 0
+            with pytest.raises(exc.TimeoutError):
+                await query(0)
+    finally:
+        await engine.dispose()
+
+    status = pool_status(engine)
+    assert status["checkouts"] == 3
+    assert status["timeouts"] == 1
+    assert status["wait_seconds_max"] >= 0.2
+    assert status["wait_seconds_total"] >= 0.3
+    assert sum(status["wait_buckets"].values()) == 4
+
+
+def make_request(method: str) -> Request:
+    return Request({"type": "http", "method": method, "headers": []})
+
+
+async def test_get_requests_share_one_read_only_transaction(
+    monkeypatch,
+) -> None:
+    settings = get_settings()
+    monkeypatch.setattr(settings, "db_pool_size", 1)
+    monkeypatch.setattr(settings, "db_max_overflow", 0)
+    engine = create_engine(getenv("DATABASE_TEST_URI"))
+    session_factory = sessionmaker(engine, class_=AsyncSession)
+
+    async def read(db: AsyncSession):
+        async with transaction(db):
+            result = await db.execute(
+                text(
+                    "SELECT current_setting('transaction_isolation'), "
+                    "current_setting('transaction_read_only'), "
+                    "txid_current_if_assigned(), now()"
+                )
+            )
+            return result.one()
+
+    try:
+        async with session_factory() as db:
+            async with request_transaction(db, make_request("GET")):
+                first, second = await read(db), await read(db)
+        assert first[:3] == ("repeatable read", "on", None)
+        assert first[3] == second[3]  # Same transaction.
+
+        # The pooled connection is back to read write for other requests.
+        async with session_factory() as db:
+            async with request_transaction(db, make_request("POST")):
+                first, second = await read(db), await read(db)
+        assert first[:2] == ("read committed", "off")
+        assert first[3] != second[3]
+    finally:
+        await engine.dispose()
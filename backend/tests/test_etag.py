@@ -0,0 +1,12 @@
+from backend.etag import etag_matches, make_etag
+
+
+def test_etag_matches_uses_weak_comparison() -> None:
+    etag = make_etag("restaurants", 42)
+    assert etag == make_etag("restaurants", 42) != make_etag("restaurants", 43)
+    assert etag_matches(etag, etag)
+    assert etag_matches(etag[2:], etag)
+    assert etag_matches('"other", ' + etag, etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches(make_etag("restaurants", 43), etag)
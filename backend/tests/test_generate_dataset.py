@@ -0,0 +1,72 @@
+from itertools import islice
+
+import pytest
+
+from backend.restaurants.bulk import COLUMNS
+from backend.scripts.generate_dataset import (
+    REVIEW_COLUMNS,
+    DatasetGenerator,
+)
+
+
+def sample(seed: int):
+    generator = DatasetGenerator(
+        seed, restaurants=200, users=50, countries=2, postcodes=10
+    )
+    restaurants = list(generator.restaurants())
+    reviews = [
+        list(generator.reviews(restaurant, quality))
+        for restaurant, quality in restaurants
+    ]
+    return generator, restaurants, reviews
+
+
+def test_generator_is_deterministic() -> None:
+    _, restaurants, reviews = sample(1)
+    assert sample(1)[1:] == (restaurants, reviews)
+    assert sample(2)[1] != restaurants
+
+
+def test_generator_reviews_do_not_depend_on_the_batches() -> None:
+    _, restaurants, reviews = sample(1)
+    # As generate_dataset draws them with a batch size of 1.
+    generator = DatasetGenerator(
+        1, restaurants=200, users=50, countries=2, postcodes=10
+    )
+    interleaved = [
+        list(generator.reviews(restaurant, quality))
+        for restaurant, quality in generator.restaurants()
+    ]
+    assert interleaved == reviews
+
+
+def test_generator_rows() -> None:
+    generator, restaurants, reviews = sample(1)
+    restaurant, _ = restaurants[0]
+    assert sorted(restaurant) == sorted(COLUMNS)
+    assert restaurant["id"].version == 4
+    assert {r["country"] for r, _ in restaurants} == {"DE", "US"}
+
+    users = {user["id"] for user in generator.users("hash")}
+    all_reviews = [review for batch in reviews for review in batch]
+    assert sorted(all_reviews[0]) == sorted(REVIEW_COLUMNS)
+    assert {review["user_id"] for review in all_reviews} <= users
+    assert all(1 <= review["rating"] <= 5 for review in all_reviews)
+    for (restaurant, _), batch in zip(restaurants, reviews):
+        for review in batch:
+            assert review["restaurant_id"] == restaurant["id"]
+            assert restaurant["created_at"] <= review["created_at"]
+
+    # Skewed: some restaurants have no reviews, a few many more than the
+    # average.
+    counts = sorted(map(len, reviews))
+    assert counts[0] == 0
+    assert counts[-1] > 5 * generator.reviews_per_restaurant
+
+
+def test_generator_checks_arguments() -> None:
+    with pytest.raises(ValueError):
+        DatasetGenerator(review_skew=1)
+    with pytest.raises(ValueError):
+        DatasetGenerator(countries=100)
+    assert len(list(islice(DatasetGenerator(users=3).users("hash"), 5))) == 3
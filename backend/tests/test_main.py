@@ -1,8 +1,11 @@
+import re
+
 import pytest
 from httpx import AsyncClient
 from starlette import status
 
-from backend.main import app
+from backend.main import SQLTimingMiddleware, app
+from backend.tests.conftest import add_restaurant, auth_headers
 
 
 pytestmark = pytest.mark.asyncio
@@ -13,3 +16,32 @@ async def test_main() -> None:
         response = await ac.get("/")
         assert response.status_code == status.HTTP_200_OK
         assert response.json() == {"status": "ok"}
+
+
+async def test_sql_timing_middleware(init_db, caplog) -> None:
+    restaurant = await add_restaurant()
+    timed_app = SQLTimingMiddleware(app, max_statements=0, max_ms=10000)
+    headers = auth_headers("users:me")
+    async with AsyncClient(app=timed_app, base_url="http://test") as ac:
+        response = await ac.get("/", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        timing = response.headers["server-timing"]
+        assert 'desc="0 statements, 0 round trips"' in timing
+        assert not caplog.records
+
+        url = f"/api/v1/restaurant/{restaurant.id}"
+        response = await ac.get(url, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        match = re.match(
+            r'db;dur=[\d.]+;desc="(\d+) statements, (\d+) round trips", '
+            r"app;dur=[\d.]+$",
+            response.headers["server-timing"],
+        )
+        statements, round_trips = map(int, match.groups())
+        assert statements >= 1
+        assert round_trips > statements
+
+    [record] = caplog.records
+    assert record.getMessage().startswith(
+        "GET %s over budget: %d statements" % (url, statements)
+    )
@@ -0,0 +1,65 @@
+import pytest
+from httpx import AsyncClient
+from starlette import status
+
+from backend.main import app
+from backend.metrics import request_metrics
+from backend.tests.conftest import add_restaurant, auth_headers
+
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.mark.parametrize(
+    "url", ["/metrics", "/api/v1/cache/stats", "/api/v1/db/pool"]
+)
+async def test_metrics_require_scope(url) -> None:
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get(url)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        response = await ac.get(url, headers=auth_headers("users:me"))
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        response = await ac.get(url, headers=auth_headers("metrics:read"))
+        assert response.status_code == status.HTTP_200_OK
+
+
+async def test_metrics_count_requests_per_route(init_db) -> None:
+    restaurant = await add_restaurant()
+    request_metrics.clear()
+    headers = auth_headers("users:me")
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        for _ in range(2):
+            response = await ac.get(
+                f"/api/v1/restaurant/{restaurant.id}", headers=headers
+            )
+            assert response.status_code == status.HTTP_200_OK
+        await ac.get("/api/v1/nowhere", headers=headers)
+
+        response = await ac.get(
+            "/metrics", headers=auth_headers("metrics:read")
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith(
+            "text/plain; version=0.0.4"
+        )
+
+    lines = response.text.splitlines()
+    labels = 'method="GET",route="/api/v1/restaurant/{restaurant_id}"'
+    assert f'http_requests_total{{{labels},status="200"}} 2' in lines
+    assert f'http_request_duration_seconds_count{{{labels}}} 2' in lines
+    bucket = f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}}'
+    assert f"{bucket} 2" in lines
+    assert (
+        'http_requests_total{method="GET",route="/api/{catchall:path}",'
+        'status="405"} 1'
+    ) in lines
+    # The request to /metrics is in flight while it renders.
+    assert "http_requests_in_flight 1" in lines
+    assert any(
+        line.startswith('response_cache_hit_ratio{cache="restaurant-detail"}')
+        for line in lines
+    )
+    assert "# TYPE db_pool_wait_seconds histogram" in lines
+    assert "password_hash_waiting 0" in lines
@@ -0,0 +1,28 @@
+from decimal import Decimal
+from uuid import UUID, uuid4
+
+import pytest
+
+from backend.pagination import (
+    InvalidCursorException,
+    decode_cursor,
+    encode_cursor,
+)
+
+
+def test_cursor_roundtrip() -> None:
+    restaurant_id = uuid4()
+    cursor = encode_cursor(Decimal("4.5"), restaurant_id)
+    assert decode_cursor(cursor, Decimal, UUID) == [
+        Decimal("4.5"),
+        restaurant_id,
+    ]
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    ["not-a-cursor", encode_cursor("4.5"), encode_cursor("four", uuid4())],
+)
+def test_decode_invalid_cursor(cursor) -> None:
+    with pytest.raises(InvalidCursorException):
+        decode_cursor(cursor, Decimal, UUID)
@@ -0,0 +1,141 @@
+from os import getenv
+
+import pytest
+from fastapi_jwt_auth import AuthJWT
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from starlette import status
+
+from backend import db
+from backend.db import Base, ReplicaSet, create_engine, get_db
+from backend.main import app
+from backend.restaurants.leaderboards import leaderboards
+from backend.tests.conftest import (
+    TestSessionLocal,
+    add_restaurant,
+    auth_headers,
+)
+
+
+pytestmark = [
+    pytest.mark.asyncio,
+    pytest.mark.skipif(
+        not getenv("DATABASE_TEST_REPLICA_URI"),
+        reason="DATABASE_TEST_REPLICA_URI is not set",
+    ),
+]
+
+
+@pytest.fixture
+async def replica_engine():
+    engine = create_engine(getenv("DATABASE_TEST_REPLICA_URI"))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(
+            text(
+                "INSERT INTO restaurants (id, name, country, postal_code, "
+                "avg_rating) VALUES (gen_random_uuid(), 'Replica', 'DE', "
+                "'82211', 0)"
+            )
+        )
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def use_replicas(monkeypatch):
+    """Serves the requests through `db.get_db`, on the test databases."""
+    monkeypatch.setattr(db, "async_session", TestSessionLocal)
+    monkeypatch.delitem(app.dependency_overrides, get_db)
+    # Unlike real ones, the test replicas have other rows than the primary
+    # at the same version, the leaderboards would mix them up.
+    monkeypatch.setattr(leaderboards, "size", 0)
+
+    def use(*engines, **kwargs):
+        replica_set = ReplicaSet(list(engines), **kwargs)
+        monkeypatch.setattr(db, "replica_set", replica_set)
+        return replica_set
+
+    return use
+
+
+async def listed_names(ac: AsyncClient, headers):
+    response = await ac.get("/api/v1/restaurants", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    return [restaurant["name"] for restaurant in response.json()["data"]]
+
+
+async def test_reads_go_to_replicas_but_after_a_write(
+    init_db, replica_engine, use_replicas
+) -> None:
+    await add_restaurant()
+    use_replicas(replica_engine, pin_seconds=60)
+    reader = auth_headers("users:me")
+    token = AuthJWT().create_access_token(
+        subject="writer", user_claims={"scopes": ["users:me", "users:write"]}
+    )
+    writer = {"Authorization": f"Bearer {token}"}
+
+    async with AsyncClient(app=app, base_url="http://test") as ac, \
+            AsyncClient(app=app, base_url="http://test") as other:
+        assert await listed_names(other, reader) == ["Replica"]
+        assert await listed_names(ac, writer) == ["Replica"]
+
+        response = await ac.post(
+            "/api/v1/restaurant",
+            headers=writer,
+            json={
+                "name": "New",
+                "description": "New restaurant.",
+                "country": "DE",
+                "postal_code": "82211",
+                "address": "Street 1",
+                "webpage": "",
+                "phone_number": "",
+            },
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert db.PIN_COOKIE in response.cookies
+
+        # The writer reads its own write from the primary, others don't.
+        names = await listed_names(ac, writer)
+        assert "New" in names and "Replica" not in names
+        assert await listed_names(other, reader) == ["Replica"]
+
+        # A client can't pin itself longer than a write does.
+        other.cookies[db.PIN_COOKIE] = "9999999999"
+        assert await listed_names(other, reader) == ["Replica"]
+
+
+async def test_failed_replicas_are_skipped(
+    init_db, replica_engine, use_replicas, monkeypatch
+) -> None:
+    await add_restaurant()
+    url = make_url(getenv("DATABASE_TEST_REPLICA_URI"))
+    missing = create_engine(url.set(database=url.database + "_missing"))
+    replica_set = use_replicas(missing, replica_engine)
+    headers = auth_headers("users:me")
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        assert await listed_names(ac, headers) == ["Replica"]
+        missing_replica, replica = replica_set.replicas
+        assert not missing_replica.available
+        assert replica.available
+
+        # With every replica down, the reads go to the primary.
+        replica_set.mark_down(replica, "test")
+        assert await listed_names(ac, headers) == ["Gasthof Hotel Zur Post"]
+
+    # The health check brings back the replicas that recovered.
+    await replica_set.check()
+    assert replica.available and replica.lag == 0
+    assert not missing_replica.available
+
+    # Without a WAL receiver, a standby can be behind with no WAL to
+    # replay.
+    monkeypatch.setattr(db, "REPLICA_LAG_SQL", "SELECT NULL")
+    await replica_set.check()
+    assert not replica.available and replica.lag is None
+    await missing.dispose()
@@ -1,4 +1,5 @@
 import pytest
+from fastapi_jwt_auth import AuthJWT
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
@@ -26,3 +27,15 @@ async def test_login_returns_401() -> None:
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
         data = response.json()
         assert data["detail"] == "Incorrect username or password"
+
+
+async def test_login_token_holds_user_id(init_db) -> None:
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        body = {"username": "user_a", "password": "secret"}
+        response = await ac.post("/api/v1/login", json=body)
+        assert response.status_code == status.HTTP_200_OK
+        access_token = response.json()["access_token"]
+
+    claims = AuthJWT().get_raw_jwt(access_token)
+    assert claims["sub"] == "user_a"
+    assert claims["uid"] == "5333fe2a-947f-41ad-ab4b-420eceab1113"
@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+import pytest
+from fastapi_jwt_auth import AuthJWT
+from starlette.requests import Request
+
+from backend.users import auth
+
+
+def test_verified_token_cache_evicts_least_recently_used() -> None:
+    cache = auth.VerifiedTokenCache(maxsize=2)
+    expires_at = time.time() + 60
+    cache.set(("a",), {"sub": "a"}, expires_at)
+    cache.set(("b",), {"sub": "b"}, expires_at)
+    assert cache.get(("a",)) == {"sub": "a"}
+    cache.set(("c",), {"sub": "c"}, expires_at)
+    assert cache.get(("b",)) is None
+    assert cache.get(("a",)) == {"sub": "a"}
+    assert cache.get(("c",)) == {"sub": "c"}
+
+
+def test_verified_token_cache_drops_expired_tokens() -> None:
+    cache = auth.VerifiedTokenCache(maxsize=2)
+    cache.set(("a",), {"sub": "a"}, time.time() - 1)
+    assert cache.get(("a",)) is None
+
+
+def test_token_is_verified_once(monkeypatch) -> None:
+    calls = []
+    verified_token = AuthJWT._verified_token
+
+    def counting_verified_token(self, encoded_token, issuer=None):
+        calls.append(encoded_token)
+        return verified_token(self, encoded_token, issuer)
+
+    monkeypatch.setattr(AuthJWT, "_verified_token", counting_verified_token)
+    auth.verified_tokens.clear()
+
+    token = AuthJWT().create_access_token(
+        subject="user_a", user_claims={"scopes": ["users:me"]}
+    )
+    for _ in range(2):
+        request = Request(
+            {
+                "type": "http",
+                "headers": [(b"authorization", f"Bearer {token}".encode())],
+            }
+        )
+        Authorize = auth.AuthJWTScoped(req=request)
+        Authorize.jwt_required()
+        Authorize.jwt_required("users:me")
+        assert Authorize.get_jwt_subject() == "user_a"
+
+    assert calls == [token]
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_caps_pending_calls() -> None:
+    hasher = auth.PasswordHasher("thread", workers=4, max_pending=2)
+    peak = []
+
+    def slow_identity(value):
+        peak.append(hasher.running)
+        time.sleep(0.01)
+        return value
+
+    try:
+        results = await asyncio.gather(
+            *[hasher.run(slow_identity, value) for value in range(6)]
+        )
+    finally:
+        hasher.shutdown()
+
+    assert results == list(range(6))
+    assert max(peak) <= 2
+    assert hasher.waiting == hasher.running == 0
@@ -0,0 +1,63 @@
+import pytest
+from sqlalchemy import event
+
+from backend.config import get_settings
+from backend.tests.conftest import engine, with_session
+from backend.users import crud, models
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def create_security_scopes():
+    await with_session(
+        crud.create_security_scopes,
+        [
+            models.SecurityScopeCreate(name=name, description=description)
+            for name, description in get_settings().security_scopes.items()
+        ],
+    )
+
+
+async def test_user_writes_take_scopes_from_registry(init_db) -> None:
+    await create_security_scopes()
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        user = await with_session(
+            crud.signup_user,
+            models.UserLogin(username="newbie", password="secret"),
+        )
+        admin = await with_session(
+            crud.create_or_update_user,
+            models.UserCreate(
+                username="newbie",
+                password="secret",
+                scopes=["users:me", "users:read", "no:such-scope"],
+            ),
+        )
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+    assert [scope.name for scope in user.scopes] == ["users:me"]
+    assert admin.id == user.id
+    assert sorted(scope.name for scope in admin.scopes) == [
+        "users:me",
+        "users:read",
+    ]
+    # Only the unknown scope made the registry read the table again, and
+    # only looking for it.
+    scope_reads = [
+        statement
+        for statement in statements
+        if statement.lstrip().startswith("SELECT")
+        and "FROM security_scopes" in statement
+        and "JOIN" not in statement
+    ]
+    assert len(scope_reads) == 1
+    assert "WHERE security_scopes.name IN" in scope_reads[0]
@@ -6,6 +6,7 @@ from pydantic import UUID4
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.db import get_db
+from backend.pagination import CountMode
 from backend.users import auth, crud, models
 
 
@@ -27,7 +28,7 @@ async def create_tokens(
 
     access_token = Authorize.create_access_token(
         subject=user_db.username,
-        user_claims={"scopes": [scope.name for scope in user_db.scopes]},
+        user_claims=auth.user_claims(user_db),
     )
     refresh_token = Authorize.create_refresh_token(subject=user_db.username)
     return {"access_token": access_token, "refresh_token": refresh_token}
@@ -110,7 +111,7 @@ async def refresh(
     new_access_token = Authorize.create_access_token(
         subject=user_db.username,
         fresh=True,
-        user_claims={"scopes": [scope.name for scope in user_db.scopes]},
+        user_claims=auth.user_claims(user_db),
     )
     return {"access_token": new_access_token}
 
@@ -166,14 +167,16 @@ async def create_or_update_user(
 async def list_users(
     offset: Optional[int] = 0,
     limit: Optional[int] = 100,
+    count: CountMode = CountMode.exact,
     Authorize: auth.AuthJWTScoped = Depends(),
     db: AsyncSession = Depends(get_db),
     _token: str = Depends(auth.oauth2_access_scheme),
 ):
     Authorize.jwt_required("users:read")
     try:
-        user_list = await crud.get_users(db, offset, limit)
-        user_count = await crud.get_count(db)
+        user_list, user_count = await crud.list_users(
+            db, offset, limit, count
+        )
         return {
             'data': user_list,
             'count': user_count
@@ -195,18 +198,19 @@ async def get_count(
 
 @router.get(
     "/api/v1/scopes",
-    response_model=List[models.SecurityScope],
+    response_model=List[models.SecurityScopeWithUserCount],
     summary="List of security scopes to associate to users.",
 )
 async def get_security_scopes(
     offset: int = 0,
     limit: int = 100,
+    user_count: bool = False,
     Authorize: auth.AuthJWTScoped = Depends(),
     db: AsyncSession = Depends(get_db),
     _token: str = Depends(auth.oauth2_access_scheme),
 ):
     Authorize.jwt_required("users:read")
-    return await crud.get_security_scopes(db, offset, limit)
+    return await crud.get_security_scopes(db, offset, limit, user_count)
 
 
 @router.get(
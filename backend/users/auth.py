@@ -1,3 +1,12 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+from uuid import UUID
+
 from fastapi import HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from fastapi_jwt_auth import AuthJWT
@@ -18,7 +27,82 @@ def get_config():
     return get_settings().jwt_auth_setting
 
 
+class VerifiedTokenCache:
+    """
+    Bounded LRU of the claims of recently verified tokens. An entry is
+    valid until the token expires, so a client sending the same token on
+    every request gets it decoded and its signature checked only once.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            claims, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return claims
+
+    def set(self, key: Tuple, claims: Dict, expires_at: float):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (claims, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+verified_tokens = VerifiedTokenCache(get_settings().jwt_cache_size)
+
+
 class AuthJWTScoped(AuthJWT):
+    """
+    FastAPI resolves `AuthJWTScoped = Depends()` once per request, so the
+    same instance serves `deps.check_jwt` and the endpoint. The claims
+    of the request's token are kept in the instance after the first
+    verification, and reused by every later scope check and claim read.
+    """
+
+    def _verified_token(
+        self, encoded_token: str, issuer: Optional[str] = None
+    ):
+        key = (encoded_token, issuer, self._secret_key)
+        per_request = self.__dict__.setdefault("_verified_claims", {})
+        claims = per_request.get(key)
+        if claims is None:
+            claims = verified_tokens.get(key)
+        if claims is None:
+            claims = super()._verified_token(encoded_token, issuer)
+            if "exp" in claims:
+                leeway = self._decode_leeway
+                if isinstance(leeway, timedelta):
+                    leeway = leeway.total_seconds()
+                verified_tokens.set(key, claims, claims["exp"] + leeway)
+        per_request[key] = claims
+        return claims
+
+    def get_jwt_user_id(self) -> Optional[UUID]:
+        """
+        Returns the id of the user in the "uid" claim of the access token,
+        or None if the token was issued before the claim existed.
+        """
+        raw_jwt = self.get_raw_jwt()
+        user_id = raw_jwt.get("uid") if raw_jwt else None
+        return UUID(user_id) if user_id else None
+
     def jwt_required(self, *required_scopes: "unicode", **kwargs):
         """
         Overrides `jwt_required` to check for scopes in user claims.
@@ -39,9 +123,103 @@ class AuthJWTScoped(AuthJWT):
             )
 
 
+def user_claims(user) -> Dict:
+    """
+    Claims of the access tokens of the given user: the names of its
+    security scopes, and its id so that endpoints don't need to look the
+    user up by the token's subject.
+    """
+    return {
+        "scopes": [scope.name for scope in user.scopes],
+        "uid": str(user.id),
+    }
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+
+class PasswordHasher:
+    """
+    Runs the bcrypt hashing and verification in a bounded pool, so that
+    they don't block the event loop. At most `max_pending` calls are
+    submitted to the pool at once, the rest wait their turn in the loop,
+    and `waiting` tells how many of them there are.
+    """
+
+    EXECUTORS = {
+        "thread": ThreadPoolExecutor,
+        "process": ProcessPoolExecutor,
+    }
+
+    def __init__(self, executor: str, workers: int, max_pending: int):
+        if executor != "inline" and executor not in self.EXECUTORS:
+            raise ValueError(f"Unknown password hash executor '{executor}'.")
+        self.executor = executor
+        self.workers = workers
+        self.max_pending = max_pending
+        self.waiting = 0
+        self.running = 0
+        self._pool = None
+        self._slots = None
+        self._slots_loop = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = self.EXECUTORS[self.executor](self.workers)
+        return self._pool
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # The semaphore belongs to the event loop it is created in.
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_pending)
+            self._slots_loop = loop
+        return self._slots
+
+    async def run(self, func, *args):
+        if self.executor == "inline":
+            return func(*args)
+
+        slots = self._get_slots()
+        self.waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_pool(), func, *args)
+        finally:
+            self.running -= 1
+            slots.release()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+        self._slots_loop = None
+
+
+password_hasher = PasswordHasher(
+    get_settings().password_hash_executor,
+    get_settings().password_hash_workers,
+    get_settings().password_hash_max_pending,
+)
+
+
+async def verify_password_async(
+    plain_password: str, hashed_password: str
+) -> bool:
+    return await password_hasher.run(
+        verify_password, plain_password, hashed_password
+    )
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hasher.run(get_password_hash, password)
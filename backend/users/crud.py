@@ -1,5 +1,5 @@
 import logging
-from typing import List
+from typing import List, Optional, Tuple
 
 from pydantic import UUID4
 from sqlalchemy import func
@@ -7,12 +7,15 @@ from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import raiseload, selectinload, with_expression
 from sqlalchemy.orm.exc import NoResultFound
 
+from backend.db import transaction
+from backend.pagination import CountMode, fetch_page
 from backend.utils import sa_orm_object_as_dict
 from backend.users import dbrel, models
-from backend.users.auth import get_password_hash, verify_password
+from backend.users.auth import get_password_hash_async, verify_password_async
+from backend.users.registry import scope_registry
 
 
 LOGGER = logging.getLogger()
@@ -26,7 +29,7 @@ async def authenticate_user(db: AsyncSession, user: models.UserLogin):
     db_user = await get_user(db, user.username)
     if not db_user:
         return None
-    if not verify_password(
+    if not await verify_password_async(
         user.password.get_secret_value(), db_user.hashed_password
     ):
         return None
@@ -34,10 +37,12 @@ async def authenticate_user(db: AsyncSession, user: models.UserLogin):
 
 
 async def create_or_update_user(db: AsyncSession, user: models.UserCreate):
-    hashed_password = get_password_hash(user.password.get_secret_value())
+    hashed_password = await get_password_hash_async(
+        user.password.get_secret_value()
+    )
     db_user = await get_user(db, user.username)
     try:
-        async with db.begin():
+        async with transaction(db):
             if not db_user:
                 db_user = dbrel.User(
                     username=user.username,
@@ -48,18 +53,12 @@ async def create_or_update_user(db: AsyncSession, user: models.UserCreate):
                 db_user.hashed_password = hashed_password
                 db_user.disabled = db_user.disabled
 
-            scopes_result = await db.stream(select(dbrel.SecurityScope))
-            user_scopes = [
-                scope
-                async for scope, in scopes_result
-                if scope.name in user.scopes
-            ]
-            db_user.scopes = user_scopes
+            db_user.scopes = await scope_registry.get(db, user.scopes)
             db.add(db_user)
         await db.commit()
-        await db.refresh(db_user)
-        return db_user
+        return await get_user_by_id(db, db_user.id)
     except IntegrityError:
+        scope_registry.clear()  # In case it refers to a deleted scope.
         LOGGER.exception(
             "Failed to create user '%s' that already exists!", user.username
         )
@@ -67,34 +66,33 @@ async def create_or_update_user(db: AsyncSession, user: models.UserCreate):
 
 
 async def signup_user(db: AsyncSession, user: models.UserLogin):
-    db_user = await get_user(db, user.username)
+    db_user = await get_user(db, user.username, with_scopes=False)
     if db_user != None:
         raise UserDoesExistException(
             "Username '%s' already exist." % user.username
         )
 
-    hashed_password = get_password_hash(user.password.get_secret_value())
+    hashed_password = await get_password_hash_async(
+        user.password.get_secret_value()
+    )
     try:
-        async with db.begin():
+        async with transaction(db):
             db_user = dbrel.User(
                 username=user.username,
                 hashed_password=hashed_password,
                 disabled=False,
             )
-            scopes_result = await db.stream(
-                select(dbrel.SecurityScope).where(
-                    dbrel.SecurityScope.name == "users:me"
-                )
-            )
-            (scope,) = await scopes_result.one()
-            db_user.scopes = [scope]
+            scopes = await scope_registry.get(db, ["users:me"])
+            if not scopes:
+                raise NoResultFound("Security scope 'users:me' not found.")
+            db_user.scopes = scopes
             db.add(db_user)
 
         await db.commit()
-        await db.refresh(db_user)
-        return db_user
+        return await get_user_by_id(db, db_user.id)
 
     except IntegrityError as exc:
+        scope_registry.clear()
         LOGGER.exception(
             "IntegrityError: Failed to create user '%s'", user.username
         )
@@ -102,16 +100,25 @@ async def signup_user(db: AsyncSession, user: models.UserLogin):
 
 
 async def get_count(db: AsyncSession):
-    async with db.begin():
+    async with transaction(db):
         result = await db.execute(select(func.count(dbrel.User.id)))
         return result.scalars().one()
 
 
-async def get_user(db: AsyncSession, username: str):
-    async with db.begin():
+def _user_loader(with_scopes: bool):
+    """
+    Loading strategy of `User.scopes`, which is never loaded implicitly.
+    """
+    if with_scopes:
+        return selectinload(dbrel.User.scopes)
+    return raiseload(dbrel.User.scopes)
+
+
+async def get_user(db: AsyncSession, username: str, with_scopes: bool = True):
+    async with transaction(db):
         result = await db.execute(
             select(dbrel.User)
-            .options(selectinload(dbrel.User.scopes))
+            .options(_user_loader(with_scopes))
             .where(dbrel.User.username == username)
         )
         try:
@@ -122,7 +129,7 @@ async def get_user(db: AsyncSession, username: str):
 
 
 async def get_user_by_id(db: AsyncSession, user_id: UUID4):
-    async with db.begin():
+    async with transaction(db):
         result = await db.execute(
             select(dbrel.User)
             .options(selectinload(dbrel.User.scopes))
@@ -135,25 +142,31 @@ async def get_user_by_id(db: AsyncSession, user_id: UUID4):
             return None
 
 
-async def get_users(
+async def list_users(
     db: AsyncSession,
     offset: int = 0,
     limit: int = 100,
-):
-    async with db.begin():
-        result = await db.stream(
-            select(dbrel.User)
-            .options(selectinload(dbrel.User.scopes))
-            .offset(offset)
-            .limit(limit)
+    count: CountMode = CountMode.exact,
+) -> Tuple[List[dbrel.User], Optional[int]]:
+    async with transaction(db):
+        return await fetch_page(
+            db,
+            select(dbrel.User).options(selectinload(dbrel.User.scopes)),
+            order_by=(dbrel.User.username,),
+            offset=offset,
+            limit=limit,
+            count=count,
         )
-        return [item async for item, in result.unique()]
 
 
 async def delete_user(db: AsyncSession, user_id: UUID4):
-    async with db.begin():
+    async with transaction(db):
+        # Scopes are loaded to delete the user's rows in the association
+        # table, and to return them.
         result = await db.execute(
-            select(dbrel.User).where(dbrel.User.id == user_id)
+            select(dbrel.User)
+            .options(selectinload(dbrel.User.scopes))
+            .where(dbrel.User.id == user_id)
         )
         try:
             (user,) = result.one()
@@ -168,7 +181,7 @@ async def create_security_scopes(
     db: AsyncSession, scopes: List[models.SecurityScopeCreate]
 ):
     try:
-        async with db.begin():
+        async with transaction(db):
             db_scopes = [
                 dbrel.SecurityScope(
                     name=scope.name,
@@ -177,7 +190,7 @@ async def create_security_scopes(
                 for scope in scopes
             ]
             values = [
-                sa_orm_object_as_dict(db_scope, ["id"])
+                sa_orm_object_as_dict(db_scope, ["id", "user_count"])
                 for db_scope in db_scopes
             ]
             result = await db.execute(
@@ -186,6 +199,8 @@ async def create_security_scopes(
                 .on_conflict_do_nothing()
             )
         await db.commit()
+        async with transaction(db):
+            await scope_registry.load(db)
         return result
     except IntegrityError:
         LOGGER.exception(
@@ -195,13 +210,30 @@ async def create_security_scopes(
 
 
 async def get_security_scopes(
-    db: AsyncSession, offset: int = 0, limit: int = 100
+    db: AsyncSession,
+    offset: int = 0,
+    limit: int = 100,
+    with_user_count: bool = False,
 ):
-    async with db.begin():
-        result = await db.stream(
-            select(dbrel.SecurityScope)
-            .options(selectinload(dbrel.SecurityScope.users))
-            .offset(offset)
-            .limit(limit)
+    """
+    Lists the security scopes without their users. With `with_user_count`
+    each scope gets the number of users it's associated to in
+    `SecurityScope.user_count`, counted in the same query.
+    """
+    stmt = select(dbrel.SecurityScope).offset(offset).limit(limit)
+    if with_user_count:
+        user_count = (
+            select(func.count())
+            .select_from(dbrel.association_table)
+            .where(
+                dbrel.association_table.c.security_scope_id
+                == dbrel.SecurityScope.id
+            )
+            .scalar_subquery()
+        )
+        stmt = stmt.options(
+            with_expression(dbrel.SecurityScope.user_count, user_count)
         )
-        return [item async for item, in result]
+    async with transaction(db):
+        result = await db.execute(stmt)
+        return result.scalars().all()
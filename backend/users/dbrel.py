@@ -1,7 +1,7 @@
 from uuid import uuid4
 
 from sqlalchemy import Boolean, Column, ForeignKey, String, Table
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import query_expression, relationship
 from sqlalchemy_utils import UUIDType
 
 from backend.db import Base
@@ -24,11 +24,12 @@ class User(Base):
     username = Column(String, unique=True)
     hashed_password = Column(String)
     disabled = Column(Boolean)
+    # Never loaded implicitly, queries state whether they need the scopes.
     scopes = relationship(
         "SecurityScope",
         secondary=association_table,
         back_populates="users",
-        lazy="selectin",
+        lazy="raise",
     )
 
 
@@ -42,5 +43,7 @@ class SecurityScope(Base):
         "User",
         secondary=association_table,
         back_populates="scopes",
-        lazy="selectin",
+        lazy="raise",
     )
+    # Only loaded by `crud.get_security_scopes(with_user_count=True)`.
+    user_count = query_expression()
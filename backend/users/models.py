@@ -31,6 +31,10 @@ class SecurityScope(SecurityScopeBase):
         orm_mode = True
 
 
+class SecurityScopeWithUserCount(SecurityScope):
+    user_count: Optional[int] = None
+
+
 class UserBase(BaseModel):
     username: str
     disabled: Optional[bool] = False
@@ -0,0 +1,77 @@
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import make_transient_to_detached
+
+from backend.users import dbrel, models
+
+
+class SecurityScopeRegistry:
+    """
+    In-memory copy of the `security_scopes` table, that is a handful of
+    rows seeded from `Settings.security_scopes`. The user write paths
+    take the scopes from it instead of querying the table every time.
+
+    Loaded at startup, or by the first write that needs it, and loaded
+    again after `crud.create_security_scopes`. Scopes that are not found
+    are looked up on their own, in case another process added them.
+    """
+
+    def __init__(self):
+        self._scopes: Optional[Dict[str, models.SecurityScope]] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._scopes is not None
+
+    def clear(self):
+        self._scopes = None
+
+    async def load(self, db: AsyncSession):
+        result = await db.execute(select(dbrel.SecurityScope))
+        self._scopes = {
+            scope.name: models.SecurityScope.from_orm(scope)
+            for scope in result.scalars()
+        }
+
+    async def load_missing(self, db: AsyncSession, names: Iterable[str]):
+        """
+        Loads the scopes with the given names, in case another process
+        added them, without reading the rest of the table again.
+        """
+        result = await db.execute(
+            select(dbrel.SecurityScope).where(
+                dbrel.SecurityScope.name.in_(list(names))
+            )
+        )
+        for scope in result.scalars():
+            self._scopes[scope.name] = models.SecurityScope.from_orm(scope)
+
+    async def get(
+        self, db: AsyncSession, names: Iterable[str]
+    ) -> List[dbrel.SecurityScope]:
+        """
+        Returns the scopes with the given names attached to the session,
+        without querying the database when they are all known. Names of
+        scopes that don't exist are ignored.
+        """
+        names = set(names)
+        if not self.loaded:
+            await self.load(db)
+        elif not names.issubset(self._scopes):
+            await self.load_missing(db, names.difference(self._scopes))
+        return [
+            await self._attach(db, scope)
+            for name, scope in self._scopes.items()
+            if name in names
+        ]
+
+    async def _attach(self, db: AsyncSession, scope: models.SecurityScope):
+        db_scope = dbrel.SecurityScope(**scope.dict())
+        make_transient_to_detached(db_scope)
+        # Returns the instance of the session if it already has the scope.
+        return await db.merge(db_scope, load=False)
+
+
+scope_registry = SecurityScopeRegistry()
@@ -0,0 +1,37 @@
+"""Added restaurant ranking indexes
+
+Revision ID: 3f1d2a9c4b6e
+Revises: 87975efcb357
+Create Date: 2026-10-18 10:02:11.482310
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "3f1d2a9c4b6e"
+down_revision = "87975efcb357"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_restaurants_avg_rating_id",
+        "restaurants",
+        ["avg_rating", "id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_restaurants_area_avg_rating_id",
+        "restaurants",
+        ["country", "postal_code", "avg_rating", "id"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index(
+        "ix_restaurants_area_avg_rating_id", table_name="restaurants"
+    )
+    op.drop_index("ix_restaurants_avg_rating_id", table_name="restaurants")
@@ -0,0 +1,139 @@
+"""Added Review and ReviewStats models
+
+Revision ID: 5a7e0c3d8f21
+Revises: 3f1d2a9c4b6e
+Create Date: 2026-10-18 10:41:37.902145
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlalchemy_utils
+
+
+# revision identifiers, used by Alembic.
+revision = "5a7e0c3d8f21"
+down_revision = "3f1d2a9c4b6e"
+branch_labels = None
+depends_on = None
+
+
+# Statistics of the reviews already in the table, as the stats rebuild
+# command (backend.scripts.rebuild_review_stats) computes them.
+BACKFILL_REVIEW_STATS = """
+INSERT INTO review_stats (
+    restaurant_id, review_count,
+    rating_1, rating_2, rating_3, rating_4, rating_5,
+    best_review_id, best_rating, worst_review_id, worst_rating,
+    last_review_id
+)
+SELECT
+    restaurant_id,
+    count(id),
+    count(id) FILTER (WHERE rating = 1),
+    count(id) FILTER (WHERE rating = 2),
+    count(id) FILTER (WHERE rating = 3),
+    count(id) FILTER (WHERE rating = 4),
+    count(id) FILTER (WHERE rating = 5),
+    (array_agg(id ORDER BY rating DESC, created_at DESC, id DESC))[1],
+    max(rating),
+    (array_agg(id ORDER BY rating, created_at DESC, id DESC))[1],
+    min(rating),
+    (array_agg(id ORDER BY created_at DESC, id DESC))[1]
+FROM reviews
+WHERE restaurant_id IS NOT NULL
+GROUP BY restaurant_id
+"""
+
+
+# Marks the reviews table this revision created, the only one it drops.
+REVIEWS_COMMENT = "Created by revision %s." % revision
+
+
+def create_reviews_table():
+    op.create_table(
+        "reviews",
+        sa.Column(
+            "id", sqlalchemy_utils.types.uuid.UUIDType(), nullable=False
+        ),
+        sa.Column(
+            "restaurant_id",
+            sqlalchemy_utils.types.uuid.UUIDType(),
+            nullable=True,
+        ),
+        sa.Column(
+            "user_id", sqlalchemy_utils.types.uuid.UUIDType(), nullable=True
+        ),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("review", sa.String(length=1024), nullable=True),
+        sa.Column("rating", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["restaurant_id"],
+            ["restaurants.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["users.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        comment=REVIEWS_COMMENT,
+    )
+
+
+def upgrade():
+    # No earlier migration created the reviews table, the databases that
+    # served reviews got theirs outside of the migrations.
+    if not sa.inspect(op.get_bind()).has_table("reviews"):
+        create_reviews_table()
+    op.create_table(
+        "review_stats",
+        sa.Column(
+            "restaurant_id",
+            sqlalchemy_utils.types.uuid.UUIDType(),
+            nullable=False,
+        ),
+        sa.Column("review_count", sa.Integer(), nullable=False),
+        sa.Column("rating_1", sa.Integer(), nullable=False),
+        sa.Column("rating_2", sa.Integer(), nullable=False),
+        sa.Column("rating_3", sa.Integer(), nullable=False),
+        sa.Column("rating_4", sa.Integer(), nullable=False),
+        sa.Column("rating_5", sa.Integer(), nullable=False),
+        sa.Column(
+            "best_review_id",
+            sqlalchemy_utils.types.uuid.UUIDType(),
+            nullable=True,
+        ),
+        sa.Column("best_rating", sa.Integer(), nullable=True),
+        sa.Column(
+            "worst_review_id",
+            sqlalchemy_utils.types.uuid.UUIDType(),
+            nullable=True,
+        ),
+        sa.Column("worst_rating", sa.Integer(), nullable=True),
+        sa.Column(
+            "last_review_id",
+            sqlalchemy_utils.types.uuid.UUIDType(),
+            nullable=True,
+        ),
+        sa.ForeignKeyConstraint(
+            ["restaurant_id"], ["restaurants.id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(
+            ["best_review_id"], ["reviews.id"], ondelete="SET NULL"
+        ),
+        sa.ForeignKeyConstraint(
+            ["worst_review_id"], ["reviews.id"], ondelete="SET NULL"
+        ),
+        sa.ForeignKeyConstraint(
+            ["last_review_id"], ["reviews.id"], ondelete="SET NULL"
+        ),
+        sa.PrimaryKeyConstraint("restaurant_id"),
+    )
+    op.execute(BACKFILL_REVIEW_STATS)
+
+
+def downgrade():
+    op.drop_table("review_stats")
+    # A reviews table created outside of the migrations is left as is.
+    comment = sa.inspect(op.get_bind()).get_table_comment("reviews")
+    if comment["text"] == REVIEWS_COMMENT:
+        op.drop_table("reviews")
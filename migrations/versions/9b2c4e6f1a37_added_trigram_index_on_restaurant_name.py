@@ -0,0 +1,50 @@
+"""Added trigram index on restaurant name
+
+Revision ID: 9b2c4e6f1a37
+Revises: 5a7e0c3d8f21
+Create Date: 2026-10-18 11:20:05.316724
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "9b2c4e6f1a37"
+down_revision = "5a7e0c3d8f21"
+branch_labels = None
+depends_on = None
+
+LOGGER = logging.getLogger("alembic")
+
+
+def upgrade():
+    bind = op.get_bind()
+    available = bind.execute(
+        sa.text(
+            "SELECT count(*) FROM pg_available_extensions "
+            "WHERE name = 'pg_trgm'"
+        )
+    ).scalar()
+    if not available:
+        LOGGER.warning(
+            "Extension pg_trgm is not available, skipping the trigram "
+            "index on restaurants.name. Name search will not be indexed."
+        )
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        "ix_restaurants_name_trgm",
+        "restaurants",
+        ["name"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"name": "gin_trgm_ops"},
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_restaurants_name_trgm")
@@ -0,0 +1,40 @@
+"""Added a single row key to the restaurants version
+
+Revision ID: a7d4c2e9f1b3
+Revises: f3a9d1c7b5e2
+Create Date: 2026-10-18 21:04:19.118240
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a7d4c2e9f1b3"
+down_revision = "f3a9d1c7b5e2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the latest version, were there more rows.
+    op.execute(
+        "DELETE FROM restaurants_version WHERE version < "
+        "(SELECT max(version) FROM restaurants_version)"
+    )
+    op.add_column(
+        "restaurants_version",
+        sa.Column(
+            "id", sa.Boolean(), server_default=sa.true(), nullable=False
+        ),
+    )
+    op.create_primary_key(
+        "restaurants_version_pkey", "restaurants_version", ["id"]
+    )
+    op.create_check_constraint(
+        "restaurants_version_single_row", "restaurants_version", "id"
+    )
+
+
+def downgrade():
+    op.drop_column("restaurants_version", "id")
@@ -0,0 +1,47 @@
+"""Added review indexes
+
+Revision ID: c41f7b2d9e05
+Revises: 9b2c4e6f1a37
+Create Date: 2026-10-18 11:52:48.770413
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c41f7b2d9e05"
+down_revision = "9b2c4e6f1a37"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_reviews_restaurant_id_created_at",
+        "reviews",
+        ["restaurant_id", sa.text("created_at DESC"), sa.text("id DESC")],
+        unique=False,
+    )
+    op.create_index(
+        "ix_reviews_restaurant_id_rating_created_at",
+        "reviews",
+        [
+            "restaurant_id",
+            "rating",
+            sa.text("created_at DESC"),
+            sa.text("id DESC"),
+        ],
+        unique=False,
+    )
+    op.create_index(
+        "ix_reviews_user_id", "reviews", ["user_id"], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index("ix_reviews_user_id", table_name="reviews")
+    op.drop_index(
+        "ix_reviews_restaurant_id_rating_created_at", table_name="reviews"
+    )
+    op.drop_index("ix_reviews_restaurant_id_created_at", table_name="reviews")
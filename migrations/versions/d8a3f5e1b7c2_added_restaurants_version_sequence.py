@@ -0,0 +1,24 @@
+"""Added restaurants version sequence
+
+Revision ID: d8a3f5e1b7c2
+Revises: c41f7b2d9e05
+Create Date: 2026-10-18 15:04:21.318907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d8a3f5e1b7c2"
+down_revision = "c41f7b2d9e05"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(sa.schema.CreateSequence(sa.Sequence("restaurants_version")))
+
+
+def downgrade():
+    op.execute(sa.schema.DropSequence(sa.Sequence("restaurants_version")))
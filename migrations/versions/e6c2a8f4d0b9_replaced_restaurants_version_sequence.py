@@ -0,0 +1,46 @@
+"""Replaced restaurants version sequence with a table
+
+Revision ID: e6c2a8f4d0b9
+Revises: d8a3f5e1b7c2
+Create Date: 2026-10-18 18:12:47.503116
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e6c2a8f4d0b9"
+down_revision = "d8a3f5e1b7c2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Standbys only see the sequence's WAL records, logged ahead of its
+    # values, a table row changes with the transactions that update it.
+    op.execute(
+        "ALTER SEQUENCE restaurants_version RENAME TO restaurants_version_old"
+    )
+    op.create_table(
+        "restaurants_version",
+        sa.Column("version", sa.BigInteger(), nullable=False),
+    )
+    op.execute(
+        "INSERT INTO restaurants_version (version) "
+        "SELECT CASE WHEN is_called THEN last_value ELSE 0 END "
+        "FROM restaurants_version_old"
+    )
+    op.execute("DROP SEQUENCE restaurants_version_old")
+
+
+def downgrade():
+    op.execute("CREATE SEQUENCE restaurants_version_new")
+    op.execute(
+        "SELECT setval('restaurants_version_new', version) "
+        "FROM restaurants_version WHERE version > 0"
+    )
+    op.drop_table("restaurants_version")
+    op.execute(
+        "ALTER SEQUENCE restaurants_version_new RENAME TO restaurants_version"
+    )
@@ -0,0 +1,55 @@
+"""Ranked unrated restaurants last
+
+Revision ID: f3a9d1c7b5e2
+Revises: e6c2a8f4d0b9
+Create Date: 2026-10-18 21:36:02.915447
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f3a9d1c7b5e2"
+down_revision = "e6c2a8f4d0b9"
+branch_labels = None
+depends_on = None
+
+# The rank of dbrel.rating_rank, NULL ratings last.
+RATING_RANK = sa.text("coalesce(avg_rating, -1)")
+
+
+def upgrade():
+    op.create_index(
+        "ix_restaurants_rank_id",
+        "restaurants",
+        [RATING_RANK, "id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_restaurants_area_rank_id",
+        "restaurants",
+        ["country", "postal_code", RATING_RANK, "id"],
+        unique=False,
+    )
+    op.drop_index(
+        "ix_restaurants_area_avg_rating_id", table_name="restaurants"
+    )
+    op.drop_index("ix_restaurants_avg_rating_id", table_name="restaurants")
+
+
+def downgrade():
+    op.create_index(
+        "ix_restaurants_avg_rating_id",
+        "restaurants",
+        ["avg_rating", "id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_restaurants_area_avg_rating_id",
+        "restaurants",
+        ["country", "postal_code", "avg_rating", "id"],
+        unique=False,
+    )
+    op.drop_index("ix_restaurants_area_rank_id", table_name="restaurants")
+    op.drop_index("ix_restaurants_rank_id", table_name="restaurants")